@@ -0,0 +1,354 @@
+"""Autoplay: a solver that plays both roles, for checking that levels can be won.
+
+Guard poses are a closed-form function of their clocks, and a guard's clock
+only stops while P2 holds one of its switches. Once P2's moves are fixed,
+every guard's pose at every future tick is known. For each leg (P1 to the
+key, then to the chest) the solver tries each P2 plan (stay put, or walk
+to a real switch and hold it), lays the guards' future poses out as a
+Timeline, and runs A* over (P1 position, tick) through states no guard
+sees. Moves follow Player.update exactly (5 px per axis per tick, an axis
+that hits a wall doesn't move), and the heuristic is a walk-distance map
+of the level's walls. P2 never steps on a trap switch.
+
+The plans drive Game through a ScriptedInput, the same held-key interface
+a player's keyboard feeds. If P1 strays from the plan, the leg is replanned.
+
+Usage:
+    python autoplay.py                      # every level in levels/
+    python autoplay.py 2 3                  # level indices
+    python autoplay.py --file levels/90-stress.json
+    python autoplay.py --time-limit 30      # give up on a level after 30 s
+Prints par time (ticks to win at SIM_HZ) and solve time per level; the exit
+status is 1 if any level was not solved.
+"""
+import heapq
+import sys
+import time
+
+import pygame
+
+import leveldata
+import main
+
+PLAYER_SIZE = 32
+SPEED = 5                    # Player.speed, px per axis per tick
+MOVES = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+HORIZON = 120 * main.SIM_HZ  # longest leg searched, in ticks
+FIRST_BUDGET = 5_000         # A* expansions per P2 plan in the first round...
+MAX_NODES = 320_000          # ...growing 4x per round up to this
+WEIGHT = 2                   # weighted A*: routes within 2x of the shortest, found far faster
+MAX_LEGS = 20                # plans run before giving up (replans included)
+
+
+def player_rect(pos):
+    return pygame.Rect(pos, (PLAYER_SIZE, PLAYER_SIZE))
+
+def keys_for(move, controls):
+    dx, dy = move
+    keys = set()
+    if dx: keys.add(controls["left"] if dx < 0 else controls["right"])
+    if dy: keys.add(controls["up"] if dy < 0 else controls["down"])
+    return keys
+
+class Walker:
+    """Player.update's movement for one player on one level's walls, memoized."""
+    def __init__(self, player, walls):
+        self.player = player
+        self.walls = walls # SpatialGrid
+        self.steps = {}
+
+    def free(self, pos):
+        return not self.walls.collides(player_rect(pos))
+
+    def step(self, pos, move):
+        return self.neighbours(pos)[MOVES.index(move)][1]
+
+    def neighbours(self, pos):
+        """[(move, position after one tick holding it)] for every move."""
+        steps = self.steps.get(pos)
+        if steps is None:
+            steps = self.steps[pos] = []
+            for move in MOVES:
+                x, y = pos
+                if move[0] and self.free((x + move[0] * SPEED, y)): x += move[0] * SPEED
+                if move[1] and self.free((x, y + move[1] * SPEED)): y += move[1] * SPEED
+                rect = player_rect((x, y))
+                self.player.clamp(rect)
+                steps.append((move, rect.topleft))
+        return steps
+
+    def distances(self, goal, anchor):
+        """{position: ticks to the nearest position touching goal}, ignoring
+        guards, over the SPEED lattice through anchor. A real move changes
+        each axis by at most SPEED, so this never overestimates (A* heuristic).
+        Positions off the lattice (a start clamped back into the play area)
+        are left out."""
+        ax, ay = anchor[0] % SPEED, anchor[1] % SPEED
+        x0 = goal.left - PLAYER_SIZE + 1; y0 = goal.top - PLAYER_SIZE + 1
+        x0 += (ax - x0) % SPEED; y0 += (ay - y0) % SPEED
+        frontier = [(x, y) for x in range(x0, goal.right, SPEED) for y in range(y0, goal.bottom, SPEED)
+                    if self.free((x, y))]
+        dist = dict.fromkeys(frontier, 0)
+        d = 0
+        while frontier:
+            d += 1
+            nxt = []
+            for x, y in frontier:
+                for dx, dy in MOVES:
+                    pos = (x + dx * SPEED, y + dy * SPEED)
+                    if pos not in dist and main.SCREEN_RECT.contains(player_rect(pos)) and self.free(pos):
+                        dist[pos] = d
+                        nxt.append(pos)
+            frontier = nxt
+        return dist
+
+class Timeline:
+    """Guard state at each future tick, given where P2 will stand.
+
+    A scratch GuardStore replays Game.update's guard half tick by tick:
+    switches P2 stands on turn their guards off, then the guards move.
+    A second store is loaded with one tick's state to answer sees().
+    """
+    def __init__(self, game, p2_path):
+        self.game = game
+        self.p2_path = p2_path # P2 top-left after ticks 1, 2, ...; held after the last
+        self.runner = main.GuardStore(game.levels[game.current_level_idx]["guards"], game.sight)
+        self.runner.set_state(game.guards.get_state())
+        self.probe = main.GuardStore(game.levels[game.current_level_idx]["guards"], game.sight)
+        self.states = []
+        self.loaded = None
+        self.switches = [(d.rect, d.link_id) for d in game.deactivators if not d.is_fake and not d.effect]
+
+    def advance(self):
+        t = len(self.states) + 1
+        p2 = self.p2_path[min(t, len(self.p2_path)) - 1]
+        rect = player_rect(p2)
+        pressed = {link_id for switch, link_id in self.switches if switch.colliderect(rect)}
+        active = self.runner.active
+        for i, link_id in enumerate(self.runner.link):
+            active[i] = link_id not in pressed
+        self.runner.update()
+        self.states.append(self.runner.get_state())
+
+    def sees(self, t, pos):
+        """Would a guard catch P1 standing at pos after tick t?"""
+        if self.loaded != t:
+            while len(self.states) < t:
+                self.advance()
+            self.probe.set_state(self.states[t - 1])
+            self.loaded = t
+        return self.probe.spots(player_rect(pos)) is not None
+
+class Solver:
+    """Plays one level of a Game to victory. See the module docstring.
+
+    time_limit: seconds of planning before giving up, or None.
+    """
+    def __init__(self, game, time_limit=None):
+        self.game = game
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self.timed_out = False
+        self.walker = Walker(game.p1, game.wall_grid)
+        self.p2_walker = Walker(game.p2, game.wall_grid)
+        self.ticks = 0
+        self.legs = 0
+        self.respawns = 0
+        self.nodes = 0
+
+    # P2
+    def p2_routes(self):
+        """{switch index: [(move, P2 position after it), ...]} for the nearest
+        way onto each real switch, never touching a trap."""
+        game = self.game
+        traps = [d.rect for d in game.deactivators if d.effect == "trap"]
+        targets = {i: d.rect for i, d in enumerate(game.deactivators) if not d.is_fake and not d.effect}
+        start = game.p2.rect.topleft
+        parent = {start: None}
+        routes = {}
+        frontier = [start]
+        while frontier and len(routes) < len(targets):
+            nxt = []
+            for pos in frontier:
+                rect = player_rect(pos)
+                for i, target in targets.items():
+                    if i not in routes and target.colliderect(rect):
+                        route = []
+                        node = pos
+                        while parent[node] is not None:
+                            prev, move = parent[node]
+                            route.append((move, node))
+                            node = prev
+                        routes[i] = route[::-1]
+                for move, new in self.p2_walker.neighbours(pos):
+                    if new not in parent and player_rect(new).collidelist(traps) == -1:
+                        parent[new] = (pos, move)
+                        nxt.append(new)
+            frontier = nxt
+        return routes
+
+    def p2_plans(self):
+        """P2 routes worth trying: stay put, then the nearest switch of each
+        link that has guards."""
+        game = self.game
+        links = set(game.link_guards)
+        plans = [[]]
+        for i, route in sorted(self.p2_routes().items(), key=lambda item: len(item[1])):
+            link_id = game.deactivators[i].link_id
+            if link_id in links:
+                links.discard(link_id)
+                plans.append(route)
+        return plans
+
+    # P1
+    def search(self, dist, timeline, bound, budget):
+        """A* over (position, tick) for the P1 moves reaching the goal
+        (dist == 0) soonest within `bound` ticks. Returns (moves, done):
+        moves is None if nothing was found, and done is False if the search
+        stopped at `budget` expansions (or the deadline) rather than running
+        out of states."""
+        start = self.game.p1.rect.topleft
+        if start not in dist:
+            # A start off the lattice (see distances): estimate from its neighbours
+            near = [dist[n] for n in (self.walker.step(start, m) for m in MOVES) if n in dist and n != start]
+            if not near:
+                return None, True
+            dist[start] = min(near) + 1
+        parent = {(start, 0): None}
+        heap = [(dist[start], 0, start)]
+        expanded = 0
+        while heap:
+            if expanded == budget or expanded & 4095 == 4095 and self.out_of_time():
+                self.nodes += expanded
+                return None, False
+            _, t, pos = heapq.heappop(heap)
+            t = -t # stored negated: among equal estimates, expand the deepest first
+            if dist[pos] == 0:
+                moves = []
+                node = (pos, t)
+                while parent[node] is not None:
+                    node, move = parent[node]
+                    moves.append(move)
+                self.nodes += expanded
+                return moves[::-1], True
+            expanded += 1
+            for move, new in self.walker.neighbours(pos):
+                node = (new, t + 1)
+                h = dist.get(new)
+                if node in parent or h is None or t + 1 + h > bound: continue
+                if timeline.sees(t + 1, new): continue
+                parent[node] = ((pos, t), move)
+                heapq.heappush(heap, (t + 1 + WEIGHT * h, -(t + 1), new))
+        self.nodes += expanded
+        return None, True
+
+    def plan(self):
+        """(P1 moves, P2 route) for the fastest way to the current goal found,
+        or None.
+
+        Every P2 plan is searched with a node budget that grows each round,
+        so a plan that needs P2's help isn't starved by one where P1 waits
+        forever. The first round that finds a route returns the shortest."""
+        game = self.game
+        goal = game.chest_rect if game.p1_has_key else game.key_rect
+        # The first tick clamps a start position that overlaps the border
+        dist = self.walker.distances(goal, self.walker.step(game.p1.rect.topleft, (0, 0)))
+        p2_rest = self.p2_walker.step(game.p2.rect.topleft, (0, 0))
+        plans = [(route, Timeline(game, [pos for _, pos in route] or [p2_rest])) for route in self.p2_plans()]
+        budget = FIRST_BUDGET
+        while plans and budget <= MAX_NODES and not self.out_of_time():
+            best = None
+            bound = HORIZON
+            pending = []
+            for route, timeline in plans:
+                moves, done = self.search(dist, timeline, bound, budget)
+                if moves is not None:
+                    best = (moves, route)
+                    bound = len(moves) - 1
+                elif not done:
+                    pending.append((route, timeline))
+            if best:
+                return best
+            plans = pending
+            budget *= 4
+        return None
+
+    def out_of_time(self):
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            self.timed_out = True
+        return self.timed_out
+
+    def run(self, moves, p2_route):
+        """Feed the plan to the game as held keys. False if P1 strayed."""
+        game = self.game
+        p1, p2 = game.p1, game.p2
+        pos = p1.rect.topleft
+        for t, move in enumerate(moves):
+            p2_move = p2_route[t][0] if t < len(p2_route) else (0, 0)
+            game.input.set_keys(keys_for(move, p1.controls) | keys_for(p2_move, p2.controls))
+            had_key = game.p1_has_key
+            game.update()
+            self.ticks += 1
+            if game.state != "PLAYING":
+                return True
+            pos = self.walker.step(pos, move)
+            if p1.rect.topleft != pos:
+                if p1.rect.topleft == p1.start_pos or had_key and not game.p1_has_key:
+                    self.respawns += 1
+                return False
+        game.input.set_keys(())
+        return True
+
+    def solve(self):
+        game = self.game
+        while game.state == "PLAYING" and self.legs < MAX_LEGS:
+            self.legs += 1
+            plan = self.plan()
+            if plan is None:
+                return False
+            self.run(*plan)
+        return game.state == "VICTORY"
+
+def solve_level(level, game=None, time_limit=None):
+    """Autoplay one level (index into game.levels, or a compiled level dict).
+    Returns a report dict; "timed_out" is set if planning ran past
+    time_limit seconds."""
+    game = game or main.Game(headless=True)
+    if isinstance(level, dict):
+        game.levels.append(level)
+        level = len(game.levels) - 1
+    game.load_level(level)
+    game.handle_keydown(pygame.K_RETURN) # past the briefing
+    start = time.perf_counter()
+    solver = Solver(game, time_limit)
+    solved = solver.solve()
+    return {"level": level, "name": game.level_name, "solved": solved, "timed_out": solver.timed_out,
+            "ticks": solver.ticks, "par": solver.ticks / main.SIM_HZ,
+            "solve_time": time.perf_counter() - start,
+            "legs": solver.legs, "respawns": solver.respawns, "nodes": solver.nodes}
+
+def summary(report):
+    status = "ok    " if report["solved"] else "FAILED"
+    verb = "gave up after" if report["timed_out"] else "solved in"
+    return (f"{status} {report['level']}: {report['name']}  par {report['par']:.2f}s ({report['ticks']} ticks, "
+            f"{report['legs']} legs, {report['respawns']} respawns)  {verb} {report['solve_time']:.2f}s")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    game = main.Game(headless=True)
+    time_limit = None
+    if "--time-limit" in args:
+        i = args.index("--time-limit")
+        time_limit = float(args[i + 1])
+        del args[i:i + 2]
+    if "--file" in args:
+        path = args[args.index("--file") + 1]
+        targets = [leveldata.load_level(path, main.LEVEL_SETTINGS)]
+    else:
+        targets = [int(a) for a in args] or list(range(len(game.levels)))
+    failed = False
+    for target in targets:
+        report = solve_level(target, game, time_limit)
+        print(summary(report))
+        failed |= not report["solved"]
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,242 @@
+"""Batch episode runner: many headless episodes spread over a process pool.
+
+An episode is a small dict (so it pickles cheaply) naming a level, a way
+to drive it and an optional guard tuning:
+    {"level": 2}                                 level index in levels/
+    {"level": "levels/90-stress.json"}           level file
+    {"level": {"seed": 3, "guards": 64}}         stressgen.stress_level(...)
+    "scale": {"speed": 1.5, "fov": 0.8}          multiply every guard's
+                                                 speed / fov / len / sweep_speed
+    "driver": "autoplay" (default)               autoplay.py plays both roles
+              "keys", "keys": [[mask, ticks], ...]  held keys, replay.py masks
+              "replay", "replay": "run.ddr"      a recording (it loads its own levels)
+    "max_ticks": N                               stop "keys" episodes early
+    "time_limit": seconds                        stop autoplay planning early
+    "id": anything                               echoed back in the result
+
+Each worker builds one headless Game when the pool starts and keeps it,
+with its compiled levels, sight tables and sprite caches, for every
+episode it runs; tuned variants of a level share the base level's sight
+tables. Results stream back in episode order as compact dicts:
+    {"id", "level", "outcome", "ticks", "respawns", "traps", "time"}
+where outcome is the final Game.state ("VICTORY"; "PLAYING" if the keys
+ran out), "UNSOLVED" if autoplay found no win (or hit its time limit), or
+"ERROR" with an "error" message. respawns and traps count every attempt
+of the episode, restarts included.
+
+Usage:
+    python batch.py                                        # autoplay every level
+    python batch.py --levels 1,2,3 --scale speed=0.5,1,2 --scale fov=0.75,1
+    python batch.py --stress 0-31 --guards 12 --walls 8 --time-limit 10
+    python batch.py --replay a.ddr b.ddr
+Other options: --workers N (default: every core), --out results.jsonl,
+--time-limit S (autoplay planning seconds per episode).
+Results are printed as JSON lines with a summary at the end.
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import concurrent.futures
+import itertools
+import json
+import sys
+import time
+
+import pygame
+
+import autoplay
+import leveldata
+import main
+import replay
+import stressgen
+
+SCALED_FIELDS = ("speed", "fov", "len", "sweep_speed")
+
+# Per-worker state, built by init_worker()
+_game = None
+_campaign = None # the levels/ library alone, for replays
+_library = None  # the same levels plus every one appended for episodes
+_levels = {} # level source key -> index in _library
+
+
+def init_worker():
+    """Pool initializer: one warm headless Game per process."""
+    global _game, _campaign, _library
+    _game = main.Game(headless=True)
+    _campaign = _game.levels
+    for i in range(len(_campaign)):
+        _campaign[i] # compile (or read from cache) every level up front
+    # Generated and tuned levels go into a second library sharing the compiled
+    # campaign, so a replay still ends the campaign after the last level
+    _library = _game.levels = leveldata.LevelLibrary(main.LEVEL_DIR, main.LEVEL_SETTINGS)
+    _library.loaded.update(_campaign.loaded)
+    _levels.clear()
+
+def _source_key(level):
+    return json.dumps(level, sort_keys=True)
+
+def _level_index(level, scale):
+    """Index in _game.levels of an episode's level, compiling it once."""
+    game = _game
+    base_key = _source_key(level)
+    base = _levels.get(base_key)
+    if base is None:
+        if isinstance(level, int):
+            base = level
+        else:
+            if isinstance(level, str):
+                data = leveldata.load_level(level, main.LEVEL_SETTINGS)
+            else:
+                data = stressgen.stress_level(**level)
+            game.levels.append(data)
+            base = len(game.levels) - 1
+        _levels[base_key] = base
+    if not scale:
+        return base
+    key = _source_key([level, scale])
+    idx = _levels.get(key)
+    if idx is None:
+        data = dict(game.levels[base])
+        data["guards"] = [dict(g, **{f: g[f] * scale[f] for f in SCALED_FIELDS if f in scale})
+                          for g in data["guards"]]
+        game.levels.append(data)
+        idx = _levels[key] = len(game.levels) - 1
+        # Same walls, same sight tables
+        if base not in game.sight_maps:
+            game.load_level(base)
+        game.sight_maps[idx] = game.sight_maps[base]
+    return idx
+
+def _drive_keys(game, script, max_ticks):
+    source = main.ScriptedInput()
+    game.input = source
+    ticks = 0
+    for mask, count in script:
+        source.held = replay.keys_from_mask(mask)
+        for _ in range(count):
+            if game.state != "PLAYING" or ticks == max_ticks:
+                return
+            game.update()
+            ticks += 1
+
+def _replay_totals(game, recording):
+    """Play a recording into game; (respawns, traps) summed over every
+    attempt. load_level() zeroes both counters and makes a new P1, so a new
+    P1 between ticks means the last attempt's counts are final."""
+    totals = [0, 0]
+    last = [game.p1, game.respawns, game.trap_triggers]
+    def tally(game):
+        if game.p1 is not last[0]:
+            totals[0] += last[1]
+            totals[1] += last[2]
+        last[:] = game.p1, game.respawns, game.trap_triggers
+    replay.play(recording, game, on_tick=tally)
+    tally(game)
+    return totals[0] + last[1], totals[1] + last[2]
+
+def run_episode(episode):
+    """Play one episode in this process's Game; returns its result dict."""
+    if _game is None:
+        init_worker()
+    game = _game
+    start = time.perf_counter()
+    result = {"id": episode.get("id"), "level": episode.get("level")}
+    try:
+        driver = episode.get("driver", "autoplay")
+        if driver == "replay":
+            # A fresh session, as if the game had just started
+            game.levels = _campaign
+            try:
+                game.load_level(0, initial_load=True)
+                game.state = "MAIN_MENU"
+                game.tick = 0
+                respawns, traps = _replay_totals(game, replay.Replay.load(episode["replay"]))
+            finally:
+                game.levels = _library
+            game.input = main.ScriptedInput()
+            ticks = game.tick
+            outcome = game.state
+        else:
+            idx = _level_index(episode.get("level", 0), episode.get("scale"))
+            if driver == "autoplay":
+                report = autoplay.solve_level(idx, game, episode.get("time_limit"))
+                ticks = report["ticks"]
+                outcome = game.state if report["solved"] else "UNSOLVED"
+            elif driver == "keys":
+                game.load_level(idx)
+                game.handle_keydown(pygame.K_RETURN) # past the briefing
+                game.tick = 0
+                _drive_keys(game, episode["keys"], episode.get("max_ticks"))
+                ticks = game.tick
+                outcome = game.state
+            else:
+                raise ValueError(f"unknown driver {driver!r}")
+            respawns, traps = game.respawns, game.trap_triggers
+        result.update(outcome=outcome, ticks=ticks, respawns=respawns, traps=traps)
+    except Exception as e:
+        result.update(outcome="ERROR", error=f"{type(e).__name__}: {e}")
+    result["time"] = round(time.perf_counter() - start, 3)
+    return result
+
+def run(episodes, workers=None, chunksize=1):
+    """Yield run_episode() results in episode order as workers finish them.
+    workers=1 runs in this process (no pool)."""
+    if workers == 1:
+        yield from map(run_episode, episodes)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        yield from pool.map(run_episode, episodes, chunksize=chunksize)
+
+def sweep(levels, scales, **episode):
+    """Episodes for every level x every combination of guard scale factors.
+    scales: {"speed": [0.5, 1, 2], "fov": [0.75, 1]}."""
+    names = sorted(scales)
+    episodes = []
+    for level in levels:
+        for values in itertools.product(*(scales[name] for name in names)):
+            scale = dict(zip(names, values))
+            episodes.append(dict(episode, id=len(episodes), level=level, scale=scale))
+    return episodes
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    def option(name, default=None):
+        return args[args.index(name) + 1] if name in args else default
+
+    scales = {}
+    for i, arg in enumerate(args):
+        if arg == "--scale":
+            name, values = args[i + 1].split("=")
+            if name not in SCALED_FIELDS:
+                sys.exit(f"--scale: unknown field {name!r} (known: {', '.join(SCALED_FIELDS)})")
+            scales[name] = [float(v) for v in values.split(",")]
+    if "--replay" in args:
+        paths = list(itertools.takewhile(lambda a: not a.startswith("--"), args[args.index("--replay") + 1:]))
+        episodes = [{"id": i, "driver": "replay", "replay": p} for i, p in enumerate(paths)]
+    else:
+        if "--stress" in args:
+            first, _, last = option("--stress").partition("-")
+            counts = {name: int(option("--" + name)) for name in ("guards", "walls", "switches", "fakes")
+                      if "--" + name in args}
+            levels = [dict(counts, seed=s) for s in range(int(first), int(last or first) + 1)]
+        elif "--levels" in args:
+            levels = [int(i) for i in option("--levels").split(",")]
+        else:
+            levels = list(range(len(leveldata.LevelLibrary(main.LEVEL_DIR, main.LEVEL_SETTINGS))))
+        limit = {"time_limit": float(option("--time-limit"))} if "--time-limit" in args else {}
+        episodes = sweep(levels, scales, **limit)
+
+    workers = int(option("--workers", 0)) or None
+    out = open(option("--out"), "w") if "--out" in args else sys.stdout
+    start = time.perf_counter()
+    outcomes = {}
+    for result in run(episodes, workers):
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+        outcomes[result["outcome"]] = outcomes.get(result["outcome"], 0) + 1
+    if out is not sys.stdout:
+        out.close()
+    counts = ", ".join(f"{n} {outcome}" for outcome, n in sorted(outcomes.items()))
+    print(f"{len(episodes)} episodes in {time.perf_counter() - start:.1f}s ({counts})", file=sys.stderr)
@@ -0,0 +1,300 @@
+"""Microbenchmarks for the game loop hot paths.
+
+Runs under the SDL dummy video driver, so no window is needed. Results are
+written as JSON and can be compared between commits:
+
+    python bench.py --out before.json
+    ... change something ...
+    python bench.py --out after.json
+    python bench.py --compare before.json after.json
+
+Options: --quick (shorter runs), --filter TEXT (only benchmarks whose name
+contains TEXT).
+
+A benchmark callable may carry a stats() method; its counters are stored
+next to the timing (e.g. sight tables built, which must not grow once
+every walking guard has done a lap).
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import pygame
+
+import main
+import stressgen
+
+# Scaling curves
+GUARD_COUNTS = [1, 4, 16, 64, 256]
+WALL_COUNTS = [16, 64, 256, 1024]
+STRESS_SIZES = [16, 64, 256] # generated levels: n guards, n/2 walls, n/16 switches
+
+# Keys held while benchmarking gameplay: both players keep moving
+MOVE_KEYS = {pygame.K_d, pygame.K_s, pygame.K_LEFT, pygame.K_UP}
+
+
+def measure(fn, min_time=0.2, repeats=5):
+    """Median microseconds per call of fn() over `repeats` timed batches."""
+    # Calibrate a batch size that takes at least min_time / repeats
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeats:
+            break
+        number *= 2
+    samples = [elapsed / number]
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {"us_per_call": statistics.median(samples) * 1e6, "calls": number * repeats}
+
+
+def playing_game(level):
+    """A Game in PLAYING state on `level` (index or level dict), inputs held."""
+    game = main.Game(input_source=main.ScriptedInput(MOVE_KEYS))
+    if isinstance(level, dict):
+        game.levels.append(level)
+        level = len(game.levels) - 1
+    game.load_level(level)
+    game.state = "PLAYING"
+    return game
+
+
+def stepping(fn, game, reset_every=400):
+    """Wrap fn so the level restarts periodically; players pinned against a
+    wall would otherwise stop exercising movement."""
+    count = [0]
+    def run():
+        count[0] += 1
+        if count[0] % reset_every == 0:
+            level_idx = game.current_level_idx
+            game.load_level(level_idx)
+            game.state = "PLAYING"
+        fn()
+    return run
+
+
+def crowd_level(n_guards, n_walls, seed=0):
+    """Level 2 layout with n_guards random guards and n_walls extra walls."""
+    rng = random.Random(seed)
+    level = dict(main.get_levels()[2])
+    level.pop("wall_cells") # walls change below; let SpatialGrid rebucket
+    level["name"] = f"Bench {n_guards}g/{n_walls}w"
+    guards = []
+    for i in range(n_guards):
+        x, y = rng.randint(20, 600), rng.randint(80, 680)
+        path = [(x, y), (rng.randint(20, 600), rng.randint(80, 680))]
+        guards.append({"x": x, "y": y, "path": path, "angle": rng.randint(0, 359), "id": i % 3 + 1,
+                       "speed": rng.choice([0, 6, 12]), "fov": rng.choice([45, 60, 90]),
+                       "len": rng.choice([100, 150, 200]), "sweep_speed": rng.choice([0, 2.5, 5])})
+    walls = list(level["walls"])
+    for _ in range(n_walls):
+        w, h = rng.choice([(rng.randint(20, 150), 20), (20, rng.randint(20, 150))])
+        walls.append((rng.randint(10, 1250), rng.randint(70, 700), w, h))
+    level["guards"] = guards
+    level["walls"] = walls
+    return level
+
+
+def benchmarks(quick=False):
+    """(name, callable) pairs. Fixtures are built lazily per benchmark."""
+    main.init_display()
+    n_levels = len(main.get_levels())
+
+    def game_update(idx):
+        game = playing_game(idx)
+        return stepping(game.update, game)
+
+    def game_draw(idx, full):
+        game = playing_game(idx)
+        def frame():
+            game.update()
+            if full: game.invalidate_scene()
+            game.draw(0.5)
+        return stepping(frame, game)
+
+    def guard_fixture():
+        g = main.Guard(300, 300, [(300, 300), (300, 300)], 90, 1, 0, 60, 200, 5)
+        return g
+
+    def guard_check_collision():
+        g = guard_fixture()
+        rects = [pygame.Rect(x, 350, 32, 32) for x in range(150, 450, 10)]
+        i = [0]
+        def run():
+            i[0] = (i[0] + 1) % len(rects)
+            g.update()
+            g.check_collision(rects[i[0]])
+        return run
+
+    def guard_patrol():
+        g = main.Guard(100, 100, [(100, 100), (400, 333), (600, 120)], 0, 1, 7, 60, 200)
+        return g.update
+
+    def guard_draw():
+        g = guard_fixture()
+        def run():
+            g.update()
+            g.draw(main.screen, 0.5)
+        return run
+
+    def player_update(level):
+        game = playing_game(level)
+        keys = game.input.get_pressed()
+        def run():
+            game.p1.update(keys, game.wall_grid)
+            game.p2.update(keys, game.wall_grid)
+        return stepping(run, game)
+
+    def instruction_draw():
+        instr = main.TutorialInstruction("bench", ["Use the WASD", "keys to navigate"], main.offset_rect((20, 580, 200, 60)), True)
+        def run():
+            instr.rect.x = (instr.rect.x + 1) % 400 # moving a hint must not cost a rebuild
+            instr.draw(main.screen)
+        return run
+
+    def crowd_update(n):
+        game = playing_game(crowd_level(n, 0))
+        return stepping(game.update, game)
+
+    def crowd_draw(n):
+        game = playing_game(crowd_level(n, 0))
+        def frame():
+            game.update()
+            game.draw(0.5)
+        return stepping(frame, game)
+
+    def stress_game(n):
+        return playing_game(stressgen.stress_level(0, guards=n, walls=n // 2, switches=max(2, n // 16), fakes=max(1, n // 32)))
+
+    def stress_update(n):
+        game = stress_game(n)
+        return stepping(game.update, game)
+
+    def stress_draw(n):
+        game = stress_game(n)
+        def frame():
+            game.update()
+            game.draw(0.5)
+        return stepping(frame, game)
+
+    def occluded_lap(n):
+        # Draw every walking guard's first lap before timing, at a different
+        # interpolation alpha each frame like the real loop. After that the
+        # level's SightMap should be complete.
+        game = stress_game(n)
+        lap = max((math.ceil(path.length / speed) for _, path, speed, _ in game.guards.motion if path), default=0)
+        rng = random.Random(0)
+        for _ in range(lap):
+            game.update()
+            game.draw(rng.random())
+        built = len(game.sight.tables)
+        def frame():
+            game.update()
+            game.draw(rng.random())
+        frame.stats = lambda: {"sight_tables": built, "sight_tables_added": len(game.sight.tables) - built}
+        return frame
+
+    def wall_update(n):
+        return player_update(crowd_level(0, n))
+
+    cases = []
+    for idx in range(n_levels):
+        cases.append((f"game.update/level{idx}", lambda idx=idx: game_update(idx)))
+        cases.append((f"game.draw/level{idx}", lambda idx=idx: game_draw(idx, False)))
+        cases.append((f"game.draw_full/level{idx}", lambda idx=idx: game_draw(idx, True)))
+    cases += [
+        ("guard.check_collision", guard_check_collision),
+        ("guard.update/patrol", guard_patrol),
+        ("guard.draw", guard_draw),
+        ("player.update/level3", lambda: player_update(3)),
+        ("tutorial_instruction.draw", instruction_draw),
+    ]
+    guard_counts = GUARD_COUNTS[:3] if quick else GUARD_COUNTS
+    wall_counts = WALL_COUNTS[:2] if quick else WALL_COUNTS
+    for n in guard_counts:
+        cases.append((f"scaling/guards/{n}/update", lambda n=n: crowd_update(n)))
+        cases.append((f"scaling/guards/{n}/draw", lambda n=n: crowd_draw(n)))
+    for n in wall_counts:
+        cases.append((f"scaling/walls/{n}/player.update", lambda n=n: wall_update(n)))
+    for n in STRESS_SIZES[:2] if quick else STRESS_SIZES:
+        cases.append((f"scaling/stress/{n}/update", lambda n=n: stress_update(n)))
+        cases.append((f"scaling/stress/{n}/draw", lambda n=n: stress_draw(n)))
+        cases.append((f"occlusion/stress/{n}/lap", lambda n=n: occluded_lap(n)))
+    return cases
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(out=None, quick=False, name_filter=None):
+    min_time = 0.05 if quick else 0.2
+    results = {}
+    for name, make in benchmarks(quick):
+        if name_filter and name_filter not in name:
+            continue
+        fn = make()
+        results[name] = measure(fn, min_time=min_time)
+        stats = fn.stats() if hasattr(fn, "stats") else {}
+        results[name].update(stats)
+        extra = "  ".join(f"{k} {v}" for k, v in stats.items())
+        print(f"{name:40s} {results[name]['us_per_call']:10.1f} us  {extra}".rstrip())
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": main.load_vision() and main.vision.np.__version__,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+    if out:
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f: before = json.load(f)
+    with open(after_path) as f: after = json.load(f)
+    print(f"{'benchmark':40s} {'before':>10s} {'after':>10s} {'change':>8s}")
+    for name, new in after["results"].items():
+        old = before["results"].get(name)
+        if old is None:
+            print(f"{name:40s} {'-':>10s} {new['us_per_call']:10.1f}")
+            continue
+        ratio = new["us_per_call"] / old["us_per_call"]
+        print(f"{name:40s} {old['us_per_call']:10.1f} {new['us_per_call']:10.1f} {ratio:7.2f}x")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--compare" in args:
+        i = args.index("--compare")
+        compare(args[i + 1], args[i + 2])
+    else:
+        out = args[args.index("--out") + 1] if "--out" in args else None
+        name_filter = args[args.index("--filter") + 1] if "--filter" in args else None
+        run(out=out, quick="--quick" in args, name_filter=name_filter)
@@ -0,0 +1,24 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture(autouse=True)
+def repo_cwd(monkeypatch):
+    # Fonts and assets are opened by relative path, as when running main.py
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def display():
+    """A dummy-driver window, as main() opens it."""
+    import pygame
+    import main
+    main.init_display()
+    pygame.event.clear()
+    yield main.screen
+    pygame.event.clear()
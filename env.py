@@ -0,0 +1,227 @@
+"""Gym-style environments around Game, for training agents.
+
+Env plays one level with P1, P2 or both driven by step(). Actions index
+ACTIONS (stay, then the 8 directions); with agents="both" an action is a
+pair (P1, P2). A player the agent doesn't control takes its moves from
+partner(env), or stands still. The API follows gymnasium:
+    obs, info = env.reset()
+    obs, reward, terminated, truncated, info = env.step(action)
+without depending on it.
+
+Observations (obs="state", "pixels" or "both", a dict of the two):
+    state   float32 vector, positions scaled to [0, 1] by the screen size:
+            P1 x, y, P2 x, y, key x, y, chest x, y, p1_has_key, P1 frozen,
+            P2 inverted, then one block per guard column (x, y, cos angle,
+            sin angle, active) and a pressed flag per switch.
+    pixels  uint8 (height, width, 3) RGB frame. The game renders straight
+            into a surface built over a numpy array (pygame.image.frombuffer),
+            so the frame is a view of the render target, not a copy.
+            frame_size=(w, h) scales the frame down into its own array.
+Both are overwritten in place by the next step() or reset(); copy them to
+keep them.
+
+Rewards (REWARDS) come from game events in the step: picking up the key,
+winning, P1 respawning and P2 springing a trap. An episode terminates on
+victory and is truncated after max_ticks simulation ticks.
+
+VecEnv steps N envs in lockstep in one process. Their observations are
+rows of shared batch arrays (states padded to the longest level's vector),
+and an env that finishes resets itself, gymnasium-style, with its final
+observation in infos[i]["final_obs"].
+"""
+import numpy as np
+import pygame
+
+import autoplay
+import main
+
+ACTIONS = [(0, 0)] + [move for move in autoplay.MOVES if move != (0, 0)]
+AGENTS = ("p1", "p2", "both")
+REWARDS = {"key": 1.0, "victory": 1.0, "respawn": -1.0, "trap": -0.5}
+MAX_TICKS = 60 * main.SIM_HZ
+HEAD = 11 # state entries before the guard columns
+
+
+def state_size(level):
+    """Length of the state vector for a compiled level dict."""
+    return HEAD + 5 * len(level["guards"]) + len(level["deactivators"])
+
+def frame_array(size):
+    """Zeroed (height, width, 4) RGBX array a frame surface can be built over."""
+    width, height = size
+    return np.zeros((height, width, 4), np.uint8)
+
+class Env:
+    """One Game, one level. See the module docstring."""
+    def __init__(self, level=1, agents="both", obs="state", frame_size=None, repeat=1,
+                 max_ticks=MAX_TICKS, partner=None):
+        if agents not in AGENTS:
+            raise ValueError(f"agents must be one of {AGENTS}, not {agents!r}")
+        if obs not in ("state", "pixels", "both"):
+            raise ValueError(f"obs must be 'state', 'pixels' or 'both', not {obs!r}")
+        self.agents = agents
+        self.obs_mode = obs
+        self.repeat = repeat       # simulation ticks per step (action repeat)
+        self.max_ticks = max_ticks
+        self.partner = partner     # partner(env) -> action for the player the agent doesn't control
+        self.game = main.Game(headless=True)
+        if isinstance(level, dict):
+            self.game.levels.append(level)
+            level = len(self.game.levels) - 1
+        self.level = level
+        self.state_len = state_size(self.game.levels[level])
+        self.frame_size = tuple(frame_size or main.SCREEN_RECT.size)
+        self.keys = {}             # (P1 action, P2 action) -> HeldKeys
+        self.ticks = 0
+        self.surface = None
+        if obs != "state" and main.screen is None:
+            main.init_display(headless=True) # fonts and a format for the render target
+        self.bind(np.zeros(self.state_len, np.float32),
+                  frame_array(self.frame_size) if obs != "state" else None)
+
+    def bind(self, state, frame=None):
+        """Write observations into these arrays from now on: a float32 vector
+        of at least state_len entries and a frame_array() of frame_size."""
+        self.state_buf = state
+        self.frame_buf = frame
+        if frame is None:
+            return
+        self.frame = frame[..., :3]
+        self.frame_surface = pygame.image.frombuffer(frame, self.frame_size, "RGBX")
+        if self.frame_size == main.SCREEN_RECT.size:
+            self.surface = self.frame_surface
+        elif self.surface is None:
+            self.full_buf = frame_array(main.SCREEN_RECT.size) # same format, so scale() can write the frame
+            self.surface = pygame.image.frombuffer(self.full_buf, main.SCREEN_RECT.size, "RGBX")
+        self.game.invalidate_scene(layers=True)
+
+    def reset(self, seed=None):
+        """Restart the level. seed is accepted for the gymnasium signature;
+        the game itself is deterministic."""
+        game = self.game
+        game.load_level(self.level)
+        game.state = "PLAYING"
+        self.ticks = 0
+        return self.observe(), {}
+
+    def held(self, action):
+        if self.agents == "both":
+            pair = tuple(action)
+        else:
+            other = self.partner(self) if self.partner else 0
+            pair = (action, other) if self.agents == "p1" else (other, action)
+        keys = self.keys.get(pair)
+        if keys is None:
+            game = self.game
+            keys = self.keys[pair] = main.HeldKeys(autoplay.keys_for(ACTIONS[pair[0]], game.p1.controls) |
+                                                   autoplay.keys_for(ACTIONS[pair[1]], game.p2.controls))
+        return keys
+
+    def step(self, action):
+        game = self.game
+        game.input.held = self.held(action)
+        respawns, traps, had_key = game.respawns, game.trap_triggers, game.p1_has_key
+        for _ in range(self.repeat):
+            game.update()
+            self.ticks += 1
+            if game.state != "PLAYING":
+                break
+        reward = (REWARDS["respawn"] * (game.respawns - respawns) + REWARDS["trap"] * (game.trap_triggers - traps)
+                  + REWARDS["key"] * (game.p1_has_key and not had_key))
+        terminated = game.state == "VICTORY"
+        if terminated:
+            reward += REWARDS["victory"]
+        truncated = not terminated and self.ticks >= self.max_ticks
+        info = {"ticks": self.ticks, "respawns": game.respawns, "traps": game.trap_triggers}
+        return self.observe(), reward, terminated, truncated, info
+
+    def observe(self):
+        if self.obs_mode == "state":
+            return self.write_state()
+        self.render()
+        if self.obs_mode == "pixels":
+            return self.frame
+        return {"state": self.write_state(), "pixels": self.frame}
+
+    def write_state(self):
+        game = self.game
+        out = self.state_buf
+        width, height = main.SCREEN_RECT.size
+        out[0:8] = (game.p1.rect.x, game.p1.rect.y, game.p2.rect.x, game.p2.rect.y,
+                    game.key_rect.x, game.key_rect.y, game.chest_rect.x, game.chest_rect.y)
+        out[0:8:2] /= width
+        out[1:8:2] /= height
+        out[8:HEAD] = (game.p1_has_key, game.p1.is_frozen, game.p2.inverted_controls)
+        guards = game.guards
+        n = len(guards)
+        o = HEAD
+        out[o:o + n] = guards.x; out[o:o + n] /= width
+        out[o + n:o + 2 * n] = guards.y; out[o + n:o + 2 * n] /= height
+        angles = np.radians(guards.angle)
+        out[o + 2 * n:o + 3 * n] = np.cos(angles)
+        out[o + 3 * n:o + 4 * n] = np.sin(angles)
+        out[o + 4 * n:o + 5 * n] = guards.active
+        switches = out[o + 5 * n:self.state_len]
+        switches[:] = 0
+        switches[list(game.pressed)] = 1
+        return out
+
+    def render(self):
+        """Draw the current tick into the frame array."""
+        screen = main.screen
+        main.screen = self.surface # every Game draws to main.screen
+        try:
+            self.game.render()
+        finally:
+            main.screen = screen
+        if self.surface is not self.frame_surface:
+            pygame.transform.scale(self.surface, self.frame_size, self.frame_surface)
+        return self.frame
+
+class VecEnv:
+    """N Envs stepped in lockstep, observations batched. Takes a list of
+    Envs, or a count plus Env keyword arguments for identical ones."""
+    def __init__(self, envs, **kwargs):
+        self.envs = [Env(**kwargs) for _ in range(envs)] if isinstance(envs, int) else list(envs)
+        first = self.envs[0]
+        if any(env.obs_mode != first.obs_mode or env.frame_size != first.frame_size for env in self.envs):
+            raise ValueError("VecEnv needs one observation mode and frame size for every env")
+        count = len(self.envs)
+        self.states = np.zeros((count, max(env.state_len for env in self.envs)), np.float32)
+        self.frame_bufs = None
+        if first.obs_mode != "state":
+            width, height = first.frame_size
+            self.frame_bufs = np.zeros((count, height, width, 4), np.uint8)
+            self.frames = self.frame_bufs[..., :3]
+        for i, env in enumerate(self.envs):
+            env.bind(self.states[i], self.frame_bufs[i] if self.frame_bufs is not None else None)
+        self.rewards = np.zeros(count, np.float32)
+        self.terminated = np.zeros(count, bool)
+        self.truncated = np.zeros(count, bool)
+
+    def __len__(self):
+        return len(self.envs)
+
+    def batch(self):
+        mode = self.envs[0].obs_mode
+        if mode == "state":
+            return self.states
+        if mode == "pixels":
+            return self.frames
+        return {"state": self.states, "pixels": self.frames}
+
+    def reset(self, seed=None):
+        for env in self.envs:
+            env.reset(seed)
+        return self.batch(), [{} for _ in self.envs]
+
+    def step(self, actions):
+        """actions[i] is env i's action. Finished envs reset in place."""
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            obs, self.rewards[i], self.terminated[i], self.truncated[i], info = env.step(action)
+            if self.terminated[i] or self.truncated[i]:
+                info["final_obs"] = {k: v.copy() for k, v in obs.items()} if isinstance(obs, dict) else obs.copy()
+                env.reset()
+            infos.append(info)
+        return self.batch(), self.rewards, self.terminated, self.truncated, infos
@@ -0,0 +1,314 @@
+"""Level files: validation, compilation and the on-disk binary cache.
+
+Levels live in levels/*.json (loaded in file name order) and use raw map
+coordinates, i.e. y = 0 is the top of the play area below the HUD.
+Compiling a level applies the HUD offset, adds the border walls, resolves
+named colours and buckets the walls for SpatialGrid. The result is the level
+dict Game.load_level() reads, including "wall_cells".
+
+Level scripting is declarative:
+    "stages":   a progression P1 advances through by entering each stage's
+                "enter" zone in turn; every stage shows, hides or completes
+                instructions. Stage 0 applies when the level starts and
+                again whenever P1 respawns.
+    "triggers": actions run on a game event ("key", "respawn").
+Switches ("deactivators") either disable the guards sharing their id or
+carry an "effect": "trap" (freeze P1, invert P2) or "cure" (undo it).
+
+Compiled levels are cached as marshal blobs in levels/__pycache__/, keyed
+by a hash of the source file, the layout settings and the compiler version,
+so editing a level or changing HUD_OFFSET recompiles it on next load.
+
+LevelLibrary only lists file names up front; each level is read the first
+time it is indexed, so startup cost does not grow with the number of levels.
+"""
+import hashlib
+import json
+import marshal
+import os
+
+MAGIC = b"DDLV"
+VERSION = 2 # bump when compile_level output changes
+
+CACHE_DIRNAME = "__pycache__"
+
+# Switch effects, and the link ids that meant them before the "effect" field
+EFFECTS = ("trap", "cure")
+LEGACY_EFFECT_IDS = {999: "trap", 888: "cure"}
+# Game events a trigger can react to
+EVENTS = ("key", "respawn")
+
+
+class LevelError(ValueError):
+    """A level file is malformed."""
+
+
+# Validation
+
+def _fail(where, msg):
+    raise LevelError(f"{where}: {msg}")
+
+def _number(value, where):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        _fail(where, f"expected a number, got {value!r}")
+    return value
+
+def _coords(value, n, where):
+    if not isinstance(value, list) or len(value) != n:
+        _fail(where, f"expected a list of {n} numbers, got {value!r}")
+    return tuple(_number(v, where) for v in value)
+
+def _lines(value, where):
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        _fail(where, "expected a list of strings")
+    return list(value)
+
+def _fields(obj, required, optional, where):
+    if not isinstance(obj, dict):
+        _fail(where, f"expected an object, got {obj!r}")
+    missing = [k for k in required if k not in obj]
+    if missing:
+        _fail(where, f"missing {', '.join(missing)}")
+    unknown = [k for k in obj if k not in required and k not in optional]
+    if unknown:
+        _fail(where, f"unknown field {', '.join(unknown)}")
+
+def _color(value, colors, where):
+    if isinstance(value, str):
+        if value not in colors:
+            _fail(where, f"unknown colour {value!r} (known: {', '.join(sorted(colors))})")
+        return tuple(colors[value])
+    color = _coords(value, 3, where)
+    if not all(isinstance(c, int) and 0 <= c <= 255 for c in color):
+        _fail(where, f"colour components must be 0-255, got {value!r}")
+    return color
+
+
+# Compilation
+
+def compile_level(raw, settings, where="level"):
+    """Validate a parsed level file and turn it into an engine level dict."""
+    _fields(raw, ["name", "briefing_p1", "briefing_p2", "p1_start", "p2_start", "key", "chest", "walls"],
+            ["base_walls", "guards", "deactivators", "instructions", "stages", "triggers", "custom_data"], where)
+    width, height = settings["screen"]
+    hud = settings["hud_offset"]
+    colors = settings["colors"]
+
+    def point(value, where):
+        x, y = _coords(value, 2, where)
+        return (x, y + hud)
+
+    def rect(value, where):
+        x, y, w, h = _coords(value, 4, where)
+        if w < 0 or h < 0:
+            _fail(where, f"negative size in {value!r}")
+        return (x, y + hud, w, h)
+
+    if not isinstance(raw["name"], str):
+        _fail(f"{where}.name", "expected a string")
+
+    walls = []
+    if raw.get("base_walls", False):
+        walls += [(0, 0, width, 10 + hud), rect([0, height - 10 - hud, width, 10], where),
+                  rect([0, 0, 10, height], where), rect([width - 10, 0, 10, height], where),
+                  rect([635, 0, 10, height], where)]
+    if not isinstance(raw["walls"], list):
+        _fail(f"{where}.walls", "expected a list")
+    walls += [rect(w, f"{where}.walls[{i}]") for i, w in enumerate(raw["walls"])]
+
+    guards = []
+    for i, g in enumerate(raw.get("guards", [])):
+        at = f"{where}.guards[{i}]"
+        _fields(g, ["path", "angle", "id", "speed", "fov", "len"], ["x", "y", "sweep_speed", "color", "note"], at)
+        if not isinstance(g["path"], list) or not g["path"]:
+            _fail(f"{at}.path", "expected a non-empty list of points")
+        path = [point(p, f"{at}.path[{j}]") for j, p in enumerate(g["path"])]
+        x, y = point([g["x"], g["y"]], at) if "x" in g or "y" in g else path[0]
+        guards.append({"x": x, "y": y, "path": path,
+                       "angle": _number(g["angle"], f"{at}.angle"), "id": g["id"],
+                       "speed": _number(g["speed"], f"{at}.speed"), "fov": _number(g["fov"], f"{at}.fov"),
+                       "len": _number(g["len"], f"{at}.len"),
+                       "sweep_speed": _number(g.get("sweep_speed", 0), f"{at}.sweep_speed"),
+                       "color": _color(g.get("color", "guard"), colors, f"{at}.color")})
+
+    deactivators = []
+    for i, d in enumerate(raw.get("deactivators", [])):
+        at = f"{where}.deactivators[{i}]"
+        _fields(d, ["x", "y"], ["id", "fake", "effect", "color", "note"], at)
+        x, y = point([d["x"], d["y"]], at)
+        effect = d.get("effect", LEGACY_EFFECT_IDS.get(d.get("id")))
+        if effect is not None and effect not in EFFECTS:
+            _fail(f"{at}.effect", f"unknown effect {effect!r} (known: {', '.join(EFFECTS)})")
+        if effect is None and "id" not in d:
+            _fail(at, "missing id (the guard link) for a switch without an effect")
+        deactivators.append({"x": x, "y": y, "id": d.get("id"), "fake": bool(d.get("fake", False)), "effect": effect,
+                             "color": _color(d.get("color", "deactivator"), colors, f"{at}.color")})
+
+    instructions = []
+    for i, instr in enumerate(raw.get("instructions", [])):
+        at = f"{where}.instructions[{i}]"
+        _fields(instr, ["id", "lines", "rect"], ["start_active"], at)
+        instructions.append({"id": instr["id"], "lines": _lines(instr["lines"], f"{at}.lines"),
+                             "rect": rect(instr["rect"], f"{at}.rect"),
+                             "start_active": bool(instr.get("start_active", False))})
+
+    instruction_ids = {instr["id"] for instr in instructions}
+
+    def actions(obj, at):
+        show = obj.get("show", {})
+        if not isinstance(show, dict):
+            _fail(f"{at}.show", "expected an object of instruction id -> centre point or null")
+        hide = obj.get("hide", []); complete = obj.get("complete", [])
+        for name, ids in (("hide", hide), ("complete", complete)):
+            if not isinstance(ids, list):
+                _fail(f"{at}.{name}", "expected a list of instruction ids")
+        for instr_id in list(show) + hide + complete:
+            if instr_id not in instruction_ids:
+                _fail(at, f"unknown instruction {instr_id!r}")
+        return {"show": {k: None if v is None else point(v, f"{at}.show.{k}") for k, v in show.items()},
+                "hide": list(hide), "complete": list(complete)}
+
+    stages = []
+    for i, stage in enumerate(raw.get("stages", [])):
+        at = f"{where}.stages[{i}]"
+        _fields(stage, ["enter"] if i else [], ["show", "hide", "complete", "note"] + (["enter"] if i else []), at)
+        entry = actions(stage, at)
+        entry["zone"] = rect(stage["enter"], f"{at}.enter") if i else None
+        stages.append(entry)
+
+    triggers = {}
+    for i, trigger in enumerate(raw.get("triggers", [])):
+        at = f"{where}.triggers[{i}]"
+        _fields(trigger, ["on"], ["show", "hide", "complete", "note"], at)
+        if trigger["on"] not in EVENTS:
+            _fail(f"{at}.on", f"unknown event {trigger['on']!r} (known: {', '.join(EVENTS)})")
+        triggers.setdefault(trigger["on"], []).append(actions(trigger, at))
+
+    level = {
+        "name": raw["name"],
+        "briefing_p1": _lines(raw["briefing_p1"], f"{where}.briefing_p1"),
+        "briefing_p2": _lines(raw["briefing_p2"], f"{where}.briefing_p2"),
+        "p1_start": point(raw["p1_start"], f"{where}.p1_start"),
+        "p2_start": point(raw["p2_start"], f"{where}.p2_start"),
+        "key": rect(raw["key"], f"{where}.key"),
+        "chest": rect(raw["chest"], f"{where}.chest"),
+        "walls": walls,
+        "guards": guards,
+        "deactivators": deactivators,
+        "instructions": instructions,
+        "stages": stages,
+        "triggers": triggers,
+        "wall_cells": wall_cells(walls, settings["grid_cell"]),
+    }
+    if "custom_data" in raw:
+        # Points ([x, y]) and rects ([x, y, w, h]) are offset like everything else
+        custom = {}
+        for name, value in raw["custom_data"].items():
+            at = f"{where}.custom_data.{name}"
+            if isinstance(value, list) and len(value) == 2:
+                value = point(value, at)
+            elif isinstance(value, list) and len(value) == 4:
+                value = rect(value, at)
+            custom[name] = value
+        level["custom_data"] = custom
+    return level
+
+def wall_cells(walls, cell_size):
+    """Same buckets SpatialGrid builds: (cx, cy) -> [wall index]."""
+    cells = {}
+    for i, (x, y, w, h) in enumerate(walls):
+        for cx in range(int(x) // cell_size, (int(x + w) - 1) // cell_size + 1):
+            for cy in range(int(y) // cell_size, (int(y + h) - 1) // cell_size + 1):
+                cells.setdefault((cx, cy), []).append(i)
+    return cells
+
+
+# Cache
+
+def cache_key(source, settings):
+    h = hashlib.sha1(source)
+    h.update(repr((VERSION, marshal.version, sorted(settings.items()))).encode())
+    return h.digest()
+
+def load_level(path, settings, cache_dir=None):
+    """Compiled level for a .json file, from the cache when it is current."""
+    with open(path, "rb") as f:
+        source = f.read()
+    key = cache_key(source, settings)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), CACHE_DIRNAME)
+    cache_path = os.path.join(cache_dir, os.path.splitext(os.path.basename(path))[0] + ".lvl")
+
+    try:
+        with open(cache_path, "rb") as f:
+            blob = f.read()
+        if blob[:4] == MAGIC and blob[4:4 + len(key)] == key:
+            return marshal.loads(blob[4 + len(key):])
+    except (OSError, ValueError, EOFError, TypeError):
+        pass # missing, stale or unreadable cache: recompile
+
+    try:
+        raw = json.loads(source)
+    except ValueError as e:
+        raise LevelError(f"{path}: {e}") from None
+    level = compile_level(raw, settings, where=os.path.basename(path))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = cache_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + key + marshal.dumps(level))
+        os.replace(tmp, cache_path)
+    except OSError:
+        pass # read-only install: run uncached
+    return level
+
+
+class LevelLibrary:
+    """Indexable, lazily loaded list of levels from a directory of .json files.
+
+    Only file names are read when the library is created; a level is loaded
+    (from cache or compiled) the first time it is indexed and kept after
+    that. append() adds an already compiled level dict, e.g. a generated one.
+    """
+    def __init__(self, directory, settings, cache_dir=None):
+        self.directory = directory
+        self.settings = settings
+        self.cache_dir = cache_dir
+        self.paths = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".json"))
+        self.loaded = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self.paths)
+        if not 0 <= idx < len(self.paths):
+            raise IndexError("level index out of range")
+        level = self.loaded.get(idx)
+        if level is None:
+            level = self.loaded[idx] = load_level(self.paths[idx], self.settings, self.cache_dir)
+        return level
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def append(self, level):
+        self.paths.append(None)
+        self.loaded[len(self.paths) - 1] = level
+
+
+if __name__ == "__main__":
+    # python leveldata.py [FILE ...]: validate level files and refresh the cache
+    import sys
+    import main
+    files = sys.argv[1:] or LevelLibrary(main.LEVEL_DIR, main.LEVEL_SETTINGS).paths
+    failed = False
+    for path in files:
+        try:
+            level = load_level(path, main.LEVEL_SETTINGS)
+            print(f"ok    {path}: {level['name']} ({len(level['walls'])} walls, {len(level['guards'])} guards)")
+        except (LevelError, OSError) as e:
+            print(f"error {e}")
+            failed = True
+    sys.exit(1 if failed else 0)
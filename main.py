@@ -1,7 +1,19 @@
+import time
+STARTUP_T0 = time.perf_counter() # before the pygame import, for the startup report
+
 import pygame
 import sys
 import math
 import asyncio
+import bisect
+import io
+import os
+from collections import OrderedDict, deque
+
+import leveldata
+
+vision = None # vision.py (batched NumPy guard vision), imported by load_vision()
+vision_checked = False
 
 # Screen settings
 SCREEN_WIDTH = 1280
@@ -9,6 +21,40 @@ SCREEN_HEIGHT = 720
 FPS = 80
 HUD_OFFSET = 60
 
+# Simulation timing. All speeds (Player.speed, guard speed/sweep_speed) are per
+# simulation tick, so gameplay runs at SIM_HZ no matter how fast we render.
+SIM_HZ = 80
+SIM_DT = 1.0 / SIM_HZ
+MAX_FRAME_TIME = 0.25 # clamp after stalls so we don't try to catch up forever
+
+# Levels with at least this many guards use the vectorized vision check
+# (vision.py). Below it the per-guard Python loop is cheaper than NumPy overhead.
+VECTOR_VISION_MIN_GUARDS = 128
+
+HUD_RECT = pygame.Rect(0, 0, SCREEN_WIDTH, HUD_OFFSET)
+SCREEN_RECT = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+
+# Cell size (px) of the spatial grid used for wall/rect lookups
+GRID_CELL = 64
+# Below this many rects, one C-level Rect.collidelist beats the bucket lookup
+GRID_MIN_RECTS = 64
+
+# Vision cone sprite cache: cones are drawn at angles rounded to
+# CONE_ANGLE_STEP degrees and the cache holds at most CONE_CACHE_BYTES of sprites
+CONE_ANGLE_STEP = 2
+CONE_CACHE_BYTES = 32 * 1024 * 1024
+
+# Guard vision stops at walls. Visibility is sampled along one ray per degree
+# (SightTable); each level keeps tables for at most SIGHT_CACHE_TABLES positions
+SIGHT_CACHE_TABLES = 4096
+
+# Dirty-rect drawing falls back to a full repaint once the changed regions
+# add up to more than this share of the screen (they overlap, so it is cheaper)
+FULL_REPAINT_SHARE = 0.5
+
+# Maximum number of rendered text surfaces kept by text_cache
+TEXT_CACHE_SIZE = 256
+
 # COLORS
 C_BG = (15, 15, 20)          
 C_WALL = (100, 110, 130)
@@ -31,22 +77,286 @@ C_BUTTON_IDLE = (40, 40, 50)
 C_TUTORIAL_BOX = (50, 50, 60, 200) 
 C_TUTORIAL_BORDER = (200, 200, 200)
 
+# Level files (see leveldata.py). Changing any setting recompiles cached levels.
+LEVEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "levels")
+LEVEL_SETTINGS = {
+    "screen": (SCREEN_WIDTH, SCREEN_HEIGHT),
+    "hud_offset": HUD_OFFSET,
+    "grid_cell": GRID_CELL,
+    "colors": {"guard": C_GUARD_DEFAULT, "deactivator": C_DEACTIVATOR_DEFAULT},
+}
+
 # ENGINE SETUP
-try:
-    pygame.init()
-except pygame.error as e:
-    print(f"Pygame initialization failed: {e}")
-    sys.exit()
-
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Duos & Don'ts")
-clock = pygame.time.Clock()
-
-# Fonts
-font_title = pygame.font.Font("assets/OpenSans-Bold.ttf", 50)
-font_ui = pygame.font.Font("assets/Inconsolata-Regular.ttf", 24)
-font_small = pygame.font.Font("assets/Inconsolata-Regular.ttf", 18)
-font_rules = pygame.font.Font("assets/Inconsolata-Regular.ttf", 20)
+# Nothing touches the display at import time so the simulation can run headless
+# (servers, batch level validation). init_display() is called by main().
+screen = None
+clock = None
+scheduler = None # frame scheduler main() runs on; scheduler.pacing.stats() for frame pacing
+
+class StartupTimer:
+    """Where the time goes between process start and the first frame.
+
+    mark(name) closes the phase that ran since the previous mark; add() books
+    time spent inside a phase (font loads happen during the first draw).
+    Nothing is recorded after finish().
+    """
+    def __init__(self, t0):
+        self.last = self.t0 = t0
+        self.phases = []
+        self.extra = {}
+        self.done = False
+
+    def mark(self, name):
+        if self.done: return
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def add(self, name, seconds):
+        if self.done: return
+        self.extra[name] = self.extra.get(name, 0.0) + seconds
+
+    def finish(self):
+        self.done = True
+
+    def report(self):
+        lines = [f"startup: {(self.last - self.t0) * 1000:.1f} ms to first frame"]
+        lines += [f"  {name:<16}{seconds * 1000:8.1f} ms" for name, seconds in self.phases]
+        lines += [f"  (incl. {name:<8}{seconds * 1000:8.1f} ms)" for name, seconds in self.extra.items()]
+        return "\n".join(lines)
+
+startup = StartupTimer(STARTUP_T0)
+startup.mark("import pygame")
+
+class LazyFont:
+    """A pygame Font that is only opened when first used.
+
+    Each TTF file is read once and its bytes shared by every size.
+    """
+    font_data = {} # path -> TTF bytes
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.font = None
+
+    def load(self):
+        start = time.perf_counter()
+        if not pygame.font.get_init():
+            pygame.font.init()
+        data = LazyFont.font_data.get(self.path)
+        if data is None:
+            with open(self.path, "rb") as f:
+                data = LazyFont.font_data[self.path] = f.read()
+        self.font = pygame.font.Font(io.BytesIO(data), self.size)
+        startup.add("fonts", time.perf_counter() - start)
+        return self.font
+
+    def __getattr__(self, name):
+        # Only reached for attributes LazyFont doesn't have: render, size, ...
+        return getattr(self.font or self.load(), name)
+
+font_title = LazyFont("assets/OpenSans-Bold.ttf", 50)
+font_ui = LazyFont("assets/Inconsolata-Regular.ttf", 24)
+font_small = LazyFont("assets/Inconsolata-Regular.ttf", 18)
+font_rules = LazyFont("assets/Inconsolata-Regular.ttf", 20)
+
+def init_display(headless=False):
+    """Create the render target. Only the display subsystem is started
+    (no audio or joystick); fonts open themselves on first use.
+
+    headless=True renders into an offscreen surface without opening a window.
+    """
+    global screen, clock
+    if headless:
+        screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        clock = pygame.time.Clock()
+        return screen
+    try:
+        pygame.display.init()
+    except pygame.error as e:
+        print(f"Pygame initialization failed: {e}")
+        sys.exit()
+    startup.mark("display init")
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Duos & Don'ts")
+    clock = pygame.time.Clock()
+    startup.mark("window")
+    return screen
+
+def load_vision():
+    """Import vision.py on first need: NumPy takes longer to import than the
+    rest of startup, and only guard-heavy levels use it. None without NumPy."""
+    global vision, vision_checked
+    if not vision_checked:
+        vision_checked = True
+        try:
+            import vision as module
+        except ImportError:
+            module = None
+        vision = module
+    return vision
+
+# PROFILING HOOKS
+class NullProfiler:
+    """Stand-in used when profiling is off (see profiler.FrameProfiler)."""
+    overlay_visible = False
+    def begin_frame(self): pass
+    def end_frame(self): pass
+    def begin(self, name): pass
+    def end(self): pass
+    def handle_event(self, event): pass
+
+NULL_PROFILER = NullProfiler()
+
+# Which profiler phase each kind of scene item is drawn under
+ITEM_PHASES = {
+    "deactivator": "draw.entities", "key": "draw.entities", "chest": "draw.entities",
+    "p1": "draw.entities", "p2": "draw.entities",
+    "guard": "draw.guards",
+    "instruction": "draw.instructions",
+    "hud": "draw.hud", "key_status": "draw.hud", "trap_warning": "draw.hud",
+}
+
+# FRAME SCHEDULING
+# main() waits for each frame through a scheduler. The desktop one keeps
+# clock.tick(FPS), which sleeps off the rest of the frame. In the browser
+# (pygbag) the page steps the asyncio loop once per requestAnimationFrame,
+# and clock.tick would spin inside that frame instead of sleeping, so the
+# web scheduler only yields to the browser and times the gap between frames.
+# On static screens main() sets scheduler.idle: frames drop to IDLE_FPS and
+# a pending event ends the wait early, so input still answers at once.
+PACING_WINDOW = 240 # frames the pacing stats cover
+JANK_FACTOR = 1.5   # a frame interval this many times the target is a hitch
+IDLE_FPS = 10
+IDLE_POLL = 1 / 60  # desktop: how often an idle wait checks for input
+# What wakes an idle wait early: input and anything that needs a redraw
+WAKE_EVENTS = (pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION,
+               pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED)
+
+def input_waiting():
+    # peek() without types returns (and in pygame 2.6 mishandles the refcount
+    # of) the queued event itself; with types it is a plain bool
+    return pygame.event.peek(WAKE_EVENTS)
+
+class FramePacing:
+    """Frame intervals and per-frame work time over the last PACING_WINDOW frames."""
+    def __init__(self, fps):
+        self.fps = fps
+        self.intervals = deque(maxlen=PACING_WINDOW)
+        self.work = deque(maxlen=PACING_WINDOW)
+        self.skipped = 0 # web: animation frames passed over to stay under fps
+        self.idle = 0    # idle frames, left out of the interval stats
+
+    def record(self, interval, work):
+        self.intervals.append(interval)
+        self.work.append(work)
+
+    def stats(self):
+        """fps, mean / p95 / max frame interval (ms), janky frames, and the
+        share of wall time spent working rather than waiting."""
+        intervals = sorted(self.intervals)
+        if not intervals:
+            return {"fps": 0.0, "mean_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0, "jank": 0, "busy": 0.0,
+                    "skipped": self.skipped, "idle": self.idle}
+        total = sum(intervals)
+        return {"fps": len(intervals) / total if total else 0.0,
+                "mean_ms": total / len(intervals) * 1000,
+                "p95_ms": intervals[math.ceil(len(intervals) * 0.95) - 1] * 1000, # nearest rank
+                "max_ms": intervals[-1] * 1000,
+                "jank": sum(1 for t in intervals if t > JANK_FACTOR / self.fps),
+                "busy": sum(self.work) / total if total else 0.0,
+                "skipped": self.skipped,
+                "idle": self.idle}
+
+class DesktopScheduler:
+    """clock.tick(fps): sleep until the frame is due."""
+    def __init__(self, fps=FPS):
+        self.fps = fps
+        self.pacing = FramePacing(fps)
+        self.woke = None
+        self.idle = False
+
+    async def next_frame(self):
+        """Wait for the next frame; returns the seconds since the last one."""
+        work = time.perf_counter() - self.woke if self.woke is not None else 0.0
+        if self.idle:
+            # Doze in short asyncio sleeps (other tasks keep running) until
+            # the idle frame is due or input is waiting
+            due = self.woke + 1.0 / IDLE_FPS if self.woke is not None else 0.0
+            while time.perf_counter() < due and not input_waiting():
+                await asyncio.sleep(IDLE_POLL)
+            dt = clock.tick() / 1000.0
+            self.pacing.idle += 1
+        else:
+            await asyncio.sleep(0) # other tasks (netplay, telemetry) get their turn
+            dt = clock.tick(self.fps) / 1000.0
+            self.pacing.record(dt, work)
+        self.woke = time.perf_counter()
+        return dt
+
+class WebScheduler:
+    """One frame per browser animation frame, at most fps of them a second."""
+    def __init__(self, fps=FPS):
+        self.fps = fps
+        self.pacing = FramePacing(fps)
+        self.last = None # when the previous frame started
+        self.woke = None
+        self.idle = False
+
+    async def next_frame(self):
+        work = time.perf_counter() - self.woke if self.woke is not None else 0.0
+        rate = IDLE_FPS if self.idle else self.fps
+        while True:
+            await asyncio.sleep(0) # back to the browser until its next animation frame
+            now = time.perf_counter()
+            # On displays faster than fps, pass frames over; 10% slack so a
+            # 60 Hz display isn't halved by timer noise
+            if self.last is None or now - self.last >= 0.9 / rate:
+                break
+            if self.idle:
+                if input_waiting():
+                    break
+            else:
+                self.pacing.skipped += 1
+        dt = now - self.last if self.last is not None else 1.0 / self.fps
+        self.last = self.woke = now
+        if self.idle:
+            self.pacing.idle += 1
+        else:
+            self.pacing.record(dt, work)
+        return dt
+
+def make_scheduler(fps=FPS):
+    return WebScheduler(fps) if sys.platform == "emscripten" else DesktopScheduler(fps)
+
+# INPUT SOURCES
+class HeldKeys(frozenset):
+    """Set of held key codes, indexable like pygame.key.get_pressed()."""
+    def __getitem__(self, key):
+        return key in self
+
+class KeyboardInput:
+    """Reads the live keyboard. Needs an initialized display."""
+    def get_pressed(self):
+        return pygame.key.get_pressed()
+
+class ScriptedInput:
+    """Input source driven by code (headless runs, bots, replays)."""
+    def __init__(self, keys=()):
+        self.held = HeldKeys(keys)
+
+    def set_keys(self, keys):
+        self.held = HeldKeys(keys)
+
+    def press(self, *keys):
+        self.held = HeldKeys(self.held | set(keys))
+
+    def release(self, *keys):
+        self.held = HeldKeys(self.held - set(keys))
+
+    def get_pressed(self):
+        return self.held
 
 # HELPERS
 def offset_rect(r):
@@ -71,12 +381,246 @@ def draw_visual_chest(surface, rect, is_open):
     lock_color = C_KEY if is_open else (50, 50, 50)
     pygame.draw.rect(surface, lock_color, (rect.centerx - 5, rect.centery, 10, 12))
 
+def lerp_pos(prev, cur, alpha):
+    """Interpolated (x, y) between the previous and current simulation tick."""
+    return (round(prev[0] + (cur[0] - prev[0]) * alpha), round(prev[1] + (cur[1] - prev[1]) * alpha))
+
+def lerp_angle(prev, cur, alpha):
+    diff = (cur - prev + 180) % 360 - 180
+    return prev + diff * alpha
+
+class TextCache:
+    """Rendered text surfaces keyed by (font, text, color, antialias), LRU-bounded.
+
+    HUD, menu, briefing and hint text hardly ever changes, so font.render
+    only runs the first time a string is seen. Returned surfaces are shared:
+    blit them, don't draw on them.
+    """
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, tuple(color), antialias)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surf
+        self.misses += 1
+        surf = font.render(text, antialias, color)
+        self.surfaces[key] = surf
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surf
+
+    def clear(self):
+        self.surfaces.clear()
+
+text_cache = TextCache()
+
+def render_text(font, text, color, antialias=True):
+    return text_cache.render(font, text, color, antialias)
+
+def compose_panel(size, fill, border=None, texts=()):
+    """Pre-compose a translucent box (fill, rounded border, text) into one
+    SRCALPHA surface so drawing it is a single blit. texts: [(surf, pos)]."""
+    panel = pygame.Surface(size, pygame.SRCALPHA)
+    panel.fill(fill)
+    if border:
+        pygame.draw.rect(panel, border, panel.get_rect(), 2, border_radius=8)
+    for surf, pos in texts:
+        panel.blit(surf, pos)
+    return panel
+
 def draw_centered_text(surface, text, y_off, font, color=C_TEXT):
-    surf = font.render(text, True, color)
+    surf = render_text(font, text, color)
     rect = surf.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 + y_off))
     surface.blit(surf, rect)
 
 # classes
+class SpatialGrid:
+    """Uniform bucket grid over static rects (walls, switches, pickups).
+
+    Rects are bucketed once when the level loads; queries only look at the
+    cells the query rect overlaps instead of the whole list.
+    """
+    def __init__(self, rects, cell_size=GRID_CELL, cell_ids=None):
+        self.rects = [pygame.Rect(r) for r in rects]
+        self.cell_size = cell_size
+        self.linear = len(self.rects) < GRID_MIN_RECTS
+        self.cells = {}    # (cx, cy) -> [Rect], so buckets can use Rect.collidelist
+        self.cell_ids = {} # (cx, cy) -> [index into self.rects]
+        if cell_ids is not None:
+            # Buckets precomputed when the level was compiled
+            self.cell_ids = cell_ids
+            self.cells = {cell: [self.rects[i] for i in ids] for cell, ids in cell_ids.items()}
+            return
+        for i, r in enumerate(self.rects):
+            for cell in self._cells_for(r):
+                self.cells.setdefault(cell, []).append(r)
+                self.cell_ids.setdefault(cell, []).append(i)
+
+    def _cells_for(self, rect):
+        cs = self.cell_size
+        return [(cx, cy)
+                for cx in range(rect.left // cs, (rect.right - 1) // cs + 1)
+                for cy in range(rect.top // cs, (rect.bottom - 1) // cs + 1)]
+
+    def query(self, rect):
+        """Sorted indices of stored rects that overlap rect."""
+        if self.linear:
+            return rect.collidelistall(self.rects)
+        found = set()
+        for cell in self._cells_for(rect):
+            bucket = self.cells.get(cell)
+            if bucket:
+                ids = self.cell_ids[cell]
+                found.update(ids[j] for j in rect.collidelistall(bucket))
+        return sorted(found)
+
+    def collides(self, rect):
+        """Same as rect.collidelist(rects) != -1."""
+        # Hot path (twice per player per tick): no generators, C-level checks per bucket
+        if self.linear:
+            return rect.collidelist(self.rects) != -1
+        cs = self.cell_size
+        cells = self.cells
+        x0 = rect.left // cs; x1 = (rect.right - 1) // cs
+        y0 = rect.top // cs; y1 = (rect.bottom - 1) // cs
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket and rect.collidelist(bucket) != -1:
+                    return True
+        return False
+
+    def collidelist(self, rect):
+        """Same as rect.collidelist(rects): lowest overlapping index or -1."""
+        hits = self.query(rect)
+        return hits[0] if hits else -1
+
+class SightTable:
+    """How far a guard at one position can see along each ray, for wall occlusion.
+
+    Distances are computed lazily per ray angle and kept, so a stationary or
+    sweeping guard casts each ray once per level. Each ray is a slab test
+    against only the nearby walls whose angular span it falls in.
+    """
+    def __init__(self, key, reach, walls):
+        self.key = key
+        self.reach = reach
+        self.walls = []      # (start angle, span, x0, y0, x1, y1), coordinates relative to the guard
+        self.distances = {}  # angle % 360 -> visible distance
+        self.cones = {}      # (angle, fov) -> (no wall in the cone, polygon points)
+        for x0, y0, x1, y1 in walls:
+            if x0 <= 0 < x1 and y0 <= 0 < y1:
+                start, span = 0.0, 360.0 # standing inside it
+            else:
+                # Corners seen from the guard span less than 180 degrees around the wall's center
+                mid = -math.degrees(math.atan2((y0 + y1) / 2, (x0 + x1) / 2))
+                offsets = [(-math.degrees(math.atan2(y, x)) - mid + 180) % 360 - 180
+                           for x, y in ((x0, y0), (x1, y0), (x0, y1), (x1, y1))]
+                start, span = mid + min(offsets), max(offsets) - min(offsets)
+            self.walls.append((start, span, x0, y0, x1, y1))
+
+    def distance(self, angle):
+        angle %= 360
+        d = self.distances.get(angle)
+        if d is None:
+            d = self.distances[angle] = self.cast(angle)
+        return d
+
+    def cast(self, angle):
+        rad = math.radians(angle)
+        dx, dy = math.cos(rad), -math.sin(rad) # screen y points down
+        best = self.reach
+        for start, span, x0, y0, x1, y1 in self.walls:
+            if (angle - start) % 360 > span + 1e-9: continue
+            if dx > 1e-12: near_x, far_x = x0 / dx, x1 / dx
+            elif dx < -1e-12: near_x, far_x = x1 / dx, x0 / dx
+            elif x0 <= 0 < x1: near_x, far_x = -math.inf, math.inf
+            else: continue
+            if dy > 1e-12: near_y, far_y = y0 / dy, y1 / dy
+            elif dy < -1e-12: near_y, far_y = y1 / dy, y0 / dy
+            elif y0 <= 0 < y1: near_y, far_y = -math.inf, math.inf
+            else: continue
+            near = max(near_x, near_y); far = min(far_x, far_y)
+            if near <= far and far >= 0 and near < best:
+                best = max(near, 0.0)
+        return best
+
+    def cone(self, angle, fov):
+        """(clear, points): whether no wall cuts into the cone, and its polygon
+        relative to the guard center (without the center itself)."""
+        key = (angle, fov)
+        cone = self.cones.get(key)
+        if cone is None:
+            rays = [(a, self.distance(a)) for a in cone_angles(angle, fov)]
+            cone = (all(r == self.reach for _, r in rays), cone_points(rays))
+            if len(self.cones) < 1024: self.cones[key] = cone # walking guards' exact angles rarely repeat
+        return cone
+
+    def clear(self, angle, fov):
+        return self.cone(angle, fov)[0]
+
+    def polygon(self, angle, fov):
+        return self.cone(angle, fov)[1]
+
+    def contains(self, angle, fov, theta, dx, dy):
+        """Is the point (dx, dy) from the guard, at angle theta inside the field
+        of view and within reach, inside polygon(angle, fov)?"""
+        lo = max(angle - fov / 2, math.floor(theta))
+        hi = min(angle + fov / 2, math.floor(theta) + 1)
+        r0 = self.distance(lo); r1 = self.distance(hi)
+        if r0 == self.reach and r1 == self.reach:
+            return True
+        (x0, y0), (x1, y1) = cone_points([(lo, r0), (hi, r1)])
+        ex, ey = x1 - x0, y1 - y0
+        if ex == 0 and ey == 0:
+            return dx * dx + dy * dy <= r0 * r0
+        # Same side of the edge V0-V1 as the guard (the origin)
+        return (ex * (dy - y0) - ey * (dx - x0)) * (ex * -y0 - ey * -x0) >= 0
+
+class SightMap:
+    """Per-level SightTables keyed by guard center and reach, LRU-bounded.
+
+    Walking guards need a table per position they pass through; tables fill
+    lazily and are reused on every later lap. The walls near a position are
+    looked up once per grid cell rather than per table.
+    """
+    serials = iter(range(1, 1 << 62))
+
+    def __init__(self, wall_grid, max_tables=SIGHT_CACHE_TABLES):
+        self.wall_grid = wall_grid
+        self.max_tables = max_tables
+        self.serial = next(SightMap.serials) # keeps cached cone sprites apart between levels
+        self.tables = OrderedDict()
+        self.nearby = {} # (cell x, cell y, reach) -> walls that any center in the cell can reach
+
+    def table(self, center, reach):
+        key = (self.serial, center, reach)
+        table = self.tables.get(key)
+        if table is not None:
+            self.tables.move_to_end(key)
+            return table
+        cx, cy = center
+        cs = self.wall_grid.cell_size
+        cell = (cx // cs, cy // cs, reach)
+        walls = self.nearby.get(cell)
+        if walls is None:
+            area = pygame.Rect(cell[0] * cs - reach, cell[1] * cs - reach, cs + 2 * reach, cs + 2 * reach)
+            walls = self.nearby[cell] = [self.wall_grid.rects[i] for i in self.wall_grid.query(area)]
+        reach_area = pygame.Rect(cx - reach, cy - reach, 2 * reach, 2 * reach)
+        walls = [w for w in walls if w.colliderect(reach_area)]
+        table = SightTable(key, reach, [(w.left - cx, w.top - cy, w.right - cx, w.bottom - cy) for w in walls])
+        self.tables[key] = table
+        if len(self.tables) > self.max_tables:
+            self.tables.popitem(last=False)
+        return table
+
 class TutorialInstruction:
     """Floating box for instructions with state management."""
     def __init__(self, id, text_lines, rect, start_active=False):
@@ -85,25 +629,26 @@ class TutorialInstruction:
         self.rect = pygame.Rect(rect)
         self.active = start_active
         self.completed = False
+        self.panel = None
+        self.panel_key = None
     
     def draw(self, surface):
         if not self.active or self.completed:
             return
 
-        # transparent surface
-        s = pygame.Surface((self.rect.width, self.rect.height), pygame.SRCALPHA)
-        s.fill(C_TUTORIAL_BOX) # Fill with transparent color
-        surface.blit(s, (self.rect.x, self.rect.y))
-        
-        # Draw Border
-        pygame.draw.rect(surface, C_TUTORIAL_BORDER, self.rect, 2, border_radius=8)
-        
-        y_offset = self.rect.top + 10
-        for line in self.text_lines:
-            text_surf = font_small.render(line, True, C_TEXT)
-            text_rect = text_surf.get_rect(centerx=self.rect.centerx, top=y_offset)
-            surface.blit(text_surf, text_rect)
-            y_offset += 20
+        # The box is composed once and only rebuilt when its text or size
+        # changes; moving it (rect.center) is just a different blit position
+        key = (tuple(self.text_lines), self.rect.size)
+        if key != self.panel_key:
+            texts = []
+            y_offset = 10
+            for line in self.text_lines:
+                text_surf = render_text(font_small, line, C_TEXT)
+                texts.append((text_surf, text_surf.get_rect(centerx=self.rect.width // 2, top=y_offset)))
+                y_offset += 20
+            self.panel = compose_panel(self.rect.size, C_TUTORIAL_BOX, C_TUTORIAL_BORDER, texts)
+            self.panel_key = key
+        surface.blit(self.panel, self.rect.topleft)
 
 class Player:
     def __init__(self, x, y, color, controls, player_id):
@@ -120,8 +665,11 @@ class Player:
         self.inverted_controls = False
 
     def update(self, keys, walls):
+        # walls: SpatialGrid of the level's walls
         # Frozen Logic
         if self.is_frozen:
+            self.prev_x = self.rect.x
+            self.prev_y = self.rect.y
             return 
 
         dx, dy = 0, 0
@@ -148,40 +696,50 @@ class Player:
         self.prev_x = self.rect.x
         self.prev_y = self.rect.y
 
-        current_collidable_walls = walls 
-        
         # X Axis Movement & Collision
         self.rect.x += dx
-        if self.rect.collidelist(current_collidable_walls) != -1:
+        if walls.collides(self.rect):
             if self.inverted_controls:
                 # Penalty: Respawn at start if touching wall while inverted
                 self.rect.topleft = self.start_pos
+                self.prev_x, self.prev_y = self.start_pos # don't interpolate the jump
             else:
                 self.rect.x -= dx # Standard slide
             
         # Y Axis Movement & Collision
         self.rect.y += dy
-        if self.rect.collidelist(current_collidable_walls) != -1:
+        if walls.collides(self.rect):
             if self.inverted_controls:
                 # Penalty: Respawn at start if touching wall while inverted
                 self.rect.topleft = self.start_pos
+                self.prev_x, self.prev_y = self.start_pos
             else:
                 self.rect.y -= dy
 
+        self.clamp(self.rect)
+
+    def clamp(self, rect):
+        """Keep rect inside the play area, on this player's side of the divider."""
         playable_rect = pygame.Rect(10, 10 + HUD_OFFSET, SCREEN_WIDTH - 20, SCREEN_HEIGHT - 20 - HUD_OFFSET)
-        self.rect.clamp_ip(playable_rect)
+        rect.clamp_ip(playable_rect)
 
         if self.player_id == "p1":
-            if self.rect.right > 635:
-                self.rect.right = 635 
+            if rect.right > 635:
+                rect.right = 635 
         elif self.player_id == "p2":
-            if self.rect.left < 645:
-                self.rect.left = 645
+            if rect.left < 645:
+                rect.left = 645
             
     def is_moving(self):
         return self.rect.x != self.prev_x or self.rect.y != self.prev_y
 
-    def draw(self, surface):
+    def draw_rect(self, alpha=1.0):
+        # alpha: how far we are between the previous and current tick
+        x, y = lerp_pos((self.prev_x, self.prev_y), self.rect.topleft, alpha)
+        return pygame.Rect(x, y, self.rect.width, self.rect.height)
+
+    def draw(self, surface, alpha=1.0):
+        rect = self.draw_rect(alpha)
         draw_color = self.color
         # Visual indicator for Inverted/Frozen states
         if self.inverted_controls:
@@ -189,138 +747,486 @@ class Player:
         if self.is_frozen:
             draw_color = (100, 100, 255) # purple for frozen
             
-        pygame.draw.rect(surface, draw_color, self.rect, border_radius=6)
-        pygame.draw.circle(surface, (255,255,255), (self.rect.x + 8, self.rect.y + 8), 4)
-        pygame.draw.circle(surface, (255,255,255), (self.rect.x + 24, self.rect.y + 8), 4)
+        pygame.draw.rect(surface, draw_color, rect, border_radius=6)
+        pygame.draw.circle(surface, (255,255,255), (rect.x + 8, rect.y + 8), 4)
+        pygame.draw.circle(surface, (255,255,255), (rect.x + 24, rect.y + 8), 4)
 
     def reset(self):
         self.rect.topleft = self.start_pos
+        self.prev_x, self.prev_y = self.start_pos
         self.is_frozen = False 
         self.is_trapped = False
         self.inverted_controls = False
 
-class Guard:
-    def __init__(self, x, y, patrol_path, angle_start, link_id, speed=0, fov=60, vision_len=180, sweep_speed=0, color=C_GUARD_DEFAULT):
-        self.rect = pygame.Rect(x, y, 32, 32)
-        self.patrol_path = patrol_path
-        self.current_point = 0
-        self.speed = speed
-        self.base_angle = angle_start
-        self.current_angle = angle_start
-        self.vision_length = vision_len
-        self.fov = fov
-        self.link_id = link_id
-        self.active = True
-        self.sweep_speed = sweep_speed 
-        self.sweep_offset = 0
-        self.color = color
-        self.cone_surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-
-        # PRE-RENDERING SURFACES
-        if self.color == C_FIRE:
-            self.fire_frames = []
-            # We create 3 different frames for the flickering effect
-            for flicker in range(3):
-                # Flames are taller than the rect, so we make a taller surface
-                frame = pygame.Surface((32, 45), pygame.SRCALPHA)
-                cx, cy = 16, 45 # Local center-bottom of the frame
-                
-                # Draw outer flame (same math as your draw loop, but local)
-                pts_out = [(cx-15, cy), (cx-10, cy-25-flicker*2), (cx, cy-15), (cx+10, cy-30+flicker*2), (cx+15, cy)]
-                pygame.draw.polygon(frame, C_FIRE, pts_out)
-                
-                # Draw inner flame
-                pts_in = [(cx-8, cy), (cx-5, cy-15-flicker), (cx, cy-10), (cx+5, cy-20+flicker), (cx+8, cy)]
-                pygame.draw.polygon(frame, C_FIRE_INNER, pts_in)
-                
-                self.fire_frames.append(frame)
+def snap_angle(angle, step=CONE_ANGLE_STEP):
+    """Angle rounded to the cone sprite step. Guards detect with the cone
+    they are drawn with, so both go through this."""
+    return (round(angle / step) * step) % 360
+
+def cone_angles(angle, fov):
+    """Ray angles of a vision cone: both edges plus every whole degree between."""
+    left, right = angle - fov / 2, angle + fov / 2
+    return [left] + list(range(math.floor(left) + 1, math.ceil(right))) + [right]
+
+unit_vectors = {} # ray angle -> (cos, -sin); cone rays are whole or half degrees
+
+def cone_points(rays):
+    """(angle, distance) rays -> polygon points relative to the guard center."""
+    points = []
+    for a, r in rays:
+        unit = unit_vectors.get(a)
+        if unit is None:
+            rad = math.radians(a)
+            unit = unit_vectors[a] = (math.cos(rad), -math.sin(rad))
+        points.append((unit[0] * r, unit[1] * r))
+    return points
+
+class ConeCache:
+    """Pre-rendered vision cones shared by every guard, with LRU eviction.
+
+    Keyed by (vision_length, fov, color, quantized angle), so guards with the
+    same geometry (e.g. the sweeping guards) reuse each other's sprites.
+    Cones cut short by a wall are also keyed by the guard's SightTable. A
+    walking guard has one per step of its path, so its sprites are evicted
+    before any other. Sprites are cropped to the cone's bounding box.
+    """
+    def __init__(self, max_bytes=CONE_CACHE_BYTES, angle_step=CONE_ANGLE_STEP):
+        self.max_bytes = max_bytes
+        self.angle_step = angle_step
+        self.sprites = OrderedDict() # key -> (surface, offset from guard center)
+        self.sizes = {}              # key -> estimated bytes
+        self.passing = OrderedDict() # keys of walking guards' wall-cut sprites, oldest first
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, vision_length, fov, color, angle, view=None, walking=False):
+        """(sprite, (dx, dy)) to blit at guard center + (dx, dy).
+
+        view: the guard's SightTable, to cut the cone off at walls. Cones no
+        wall touches share one sprite. walking: the guard is on a patrol path.
+        """
+        angle = snap_angle(angle, self.angle_step)
+        if view is not None and view.clear(angle, fov):
+            view = None
+        key = (vision_length, fov, tuple(color[:3]), angle, view and view.key)
+        entry = self.sprites.get(key)
+        if entry is not None:
+            self.sprites.move_to_end(key)
+            if key in self.passing: self.passing.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        if view is not None:
+            points = view.polygon(angle, fov)
         else:
-            # Pre-render the standard Guard body
-            self.image_on = pygame.Surface(self.rect.size, pygame.SRCALPHA)
-            pygame.draw.rect(self.image_on, self.color, (0, 0, self.rect.width, self.rect.height), border_radius=4)
-            
-            # Pre-render the "Deactivated" Guard body
-            self.image_off = pygame.Surface(self.rect.size, pygame.SRCALPHA)
-            pygame.draw.rect(self.image_off, C_GUARD_OFF, (0, 0, self.rect.width, self.rect.height), border_radius=4)
-
-        # Vision cone optimization (keeping your small surface fix)
-        box_size = self.vision_length * 2
-        self.cone_surf = pygame.Surface((box_size, box_size), pygame.SRCALPHA)
-
-    def update(self):
-        if not self.active: return
-        
-        if self.speed > 0 and self.patrol_path and len(self.patrol_path) > 1:
-            target = self.patrol_path[self.current_point]
-            tx, ty = target
-            dir_x, dir_y = tx - self.rect.x, ty - self.rect.y
-            dist = math.hypot(dir_x, dir_y)
-            
-            if dist < self.speed:
-                self.rect.x = tx
-                self.rect.y = ty
-                self.current_point = (self.current_point + 1) % len(self.patrol_path)
+            points = cone_points((a, vision_length) for a in cone_angles(angle, fov))
+        entry = self.render(vision_length, color, points, shared=view is None)
+        self.sprites[key] = entry
+        if view is not None and walking: self.passing[key] = None
+        self.sizes[key] = entry[0].get_width() * entry[0].get_height() * 4
+        self.bytes += self.sizes[key]
+        while self.bytes > self.max_bytes and len(self.sprites) > 1:
+            if self.passing:
+                old, _ = self.passing.popitem(last=False)
+                del self.sprites[old]
             else:
-                self.rect.x += (dir_x / dist) * self.speed
-                self.rect.y += (dir_y / dist) * self.speed
-                if self.sweep_speed == 0:
-                    self.base_angle = -math.degrees(math.atan2(dir_y, dir_x))
-
-        if self.sweep_speed != 0:
-            self.sweep_offset += self.sweep_speed
-            if abs(self.sweep_offset) > 45: 
-                self.sweep_speed *= -1
-            self.current_angle = self.base_angle + self.sweep_offset
+                old, _ = self.sprites.popitem(last=False)
+            self.bytes -= self.sizes.pop(old)
+        return entry
+
+    @staticmethod
+    def render(vision_length, color, points, shared=False):
+        # Same polygon as a cone drawn on a (2L x 2L) box centred on the guard...
+        points = [(vision_length, vision_length)] + [(vision_length + x, vision_length + y) for x, y in points]
+        # ...cropped to its bounding box by whole pixels, so rasterization is unchanged
+        xs, ys = zip(*points)
+        min_x = math.floor(min(xs)); min_y = math.floor(min(ys))
+        max_x = math.ceil(max(xs)); max_y = math.ceil(max(ys))
+        size = (max_x - min_x + 1, max_y - min_y + 1)
+        points = [(x - min_x, y - min_y) for x, y in points]
+        if shared:
+            # Drawn opaque over a colorkey with a surface alpha: SDL run-length
+            # encodes it on the first blit, after which it blits several times faster
+            sprite = pygame.Surface(size)
+            pygame.draw.polygon(sprite, color[:3], points)
+            sprite.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+            sprite.set_alpha(80, pygame.RLEACCEL)
         else:
-            self.current_angle = self.base_angle
+            sprite = pygame.Surface(size, pygame.SRCALPHA)
+            pygame.draw.polygon(sprite, list(color)+[80], points)
+        return sprite, (min_x - vision_length, min_y - vision_length)
+
+    def clear(self):
+        self.sprites.clear()
+        self.sizes.clear()
+        self.passing.clear()
+        self.bytes = 0
+
+cone_cache = ConeCache()
+
+class PatrolPath:
+    """A patrol loop (last point back to the first) compiled into a segment
+    table, so the pose after travelling any distance is one bisect away."""
+    def __init__(self, points):
+        self.origin = points[0]
+        self.starts = []   # distance along the loop where each segment begins
+        self.segments = [] # (x0, y0, unit_x, unit_y, heading)
+        total = 0.0
+        for i, (x0, y0) in enumerate(points):
+            x1, y1 = points[(i + 1) % len(points)]
+            length = math.hypot(x1 - x0, y1 - y0)
+            if length == 0: continue
+            self.starts.append(total)
+            self.segments.append((x0, y0, (x1 - x0) / length, (y1 - y0) / length,
+                                  -math.degrees(math.atan2(y1 - y0, x1 - x0))))
+            total += length
+        self.length = total
+
+    def pose(self, distance):
+        """(x, y, heading) after `distance` px; heading is None for a loop of length 0."""
+        if not self.segments:
+            return self.origin[0], self.origin[1], None
+        distance %= self.length
+        i = bisect.bisect_right(self.starts, distance) - 1
+        x0, y0, ux, uy, heading = self.segments[i]
+        along = distance - self.starts[i]
+        return x0 + ux * along, y0 + uy * along, heading
+
+def sweep_offset(sweep_speed, ticks):
+    """Angle offset of a sweeping guard after `ticks` active ticks.
+
+    The sweep steps by sweep_speed each tick and turns back on the first step
+    past 45 degrees, i.e. a triangle wave of k steps per quarter period.
+    """
+    k = int(45 // abs(sweep_speed)) + 1
+    m = ticks % (4 * k)
+    if m <= k: steps = m
+    elif m <= 3 * k: steps = 2 * k - m
+    else: steps = m - 4 * k
+    return sweep_speed * steps
+
+GUARD_SIZE = 32
+
+guard_sprite_cache = {} # color -> body sprites, shared by every guard of that color
+
+def guard_sprites(color):
+    """Pre-rendered guard bodies for one color: three flicker frames for fire,
+    otherwise the (on, off) boxes."""
+    key = tuple(color)
+    sprites = guard_sprite_cache.get(key)
+    if sprites is not None:
+        return sprites
+    if key == C_FIRE:
+        sprites = []
+        # We create 3 different frames for the flickering effect
+        for flicker in range(3):
+            # Flames are taller than the rect, so we make a taller surface
+            frame = pygame.Surface((32, 45), pygame.SRCALPHA)
+            cx, cy = 16, 45 # Local center-bottom of the frame
+
+            # Outer flame
+            pts_out = [(cx-15, cy), (cx-10, cy-25-flicker*2), (cx, cy-15), (cx+10, cy-30+flicker*2), (cx+15, cy)]
+            pygame.draw.polygon(frame, C_FIRE, pts_out)
+
+            # Inner flame
+            pts_in = [(cx-8, cy), (cx-5, cy-15-flicker), (cx, cy-10), (cx+5, cy-20+flicker), (cx+8, cy)]
+            pygame.draw.polygon(frame, C_FIRE_INNER, pts_in)
+
+            sprites.append(frame)
+    else:
+        # Standard guard body, and the "Deactivated" one
+        image_on = pygame.Surface((GUARD_SIZE, GUARD_SIZE), pygame.SRCALPHA)
+        pygame.draw.rect(image_on, color, (0, 0, GUARD_SIZE, GUARD_SIZE), border_radius=4)
+        image_off = pygame.Surface((GUARD_SIZE, GUARD_SIZE), pygame.SRCALPHA)
+        pygame.draw.rect(image_off, C_GUARD_OFF, (0, 0, GUARD_SIZE, GUARD_SIZE), border_radius=4)
+        sprites = (image_on, image_off)
+    guard_sprite_cache[key] = sprites
+    return sprites
+
+def ticks_ms():
+    """Wall-clock milliseconds. pygame.time.get_ticks() reads 0 until SDL's
+    timer is started, which init_display() doesn't do."""
+    return int(time.perf_counter() * 1000)
+
+def flicker_frame():
+    """Fire animation frame shown right now (the same for every fire guard)."""
+    return (ticks_ms() // 100) % 3
+
+class GuardStore:
+    """Every guard of a level as parallel columns (struct of arrays).
+
+    Row i of each list is guard i. Guards own no surfaces (bodies come from
+    guard_sprites(), cones from cone_cache), so one costs a few list slots.
+    update() only walks guards that move, and spots() drops guards whose
+    reach can't touch the target with a box test before the exact check.
+    Indexing or iterating the store gives Guard views.
+    """
+    def __init__(self, guards=(), sight=None):
+        self.sight = sight # level SightMap; None sees through walls
+        # Fixed per guard
+        self.link = []; self.speed = []; self.sweep = []; self.fov = []; self.length = []
+        self.reach = []       # half-size of the box a guard can detect anything in
+        self.start_angle = []; self.color = []; self.fire = []
+        self.paths = []       # PatrolPath, or None for guards that stand still
+        self.motion = []      # (row, path, speed, sweep speed) of guards that walk or sweep
+        # Pose
+        self.x = []; self.y = []; self.angle = []
+        self.prev_x = []; self.prev_y = []; self.prev_angle = []
+        self.clock = []       # ticks spent active; a mover's pose is a function of this
+        self.active = []
+        self.cones = []       # last ((center, angle), cone sprite), draw_bounds() and draw() share it
+        self.views = []
+        for g in guards:
+            self.add(g)
+
+    def add(self, g):
+        """Append a guard given as a level-file dict; returns its row."""
+        i = len(self.x)
+        speed, path, sweep = g["speed"], g["path"], g.get("sweep_speed", 0)
+        self.link.append(g["id"]); self.speed.append(speed); self.sweep.append(sweep)
+        self.fov.append(g["fov"]); self.length.append(g["len"]); self.reach.append(max(g["len"], GUARD_SIZE // 2))
+        color = g.get("color", C_GUARD_DEFAULT)
+        self.start_angle.append(g["angle"]); self.color.append(color); self.fire.append(tuple(color) == C_FIRE)
+        self.paths.append(PatrolPath(path) if speed > 0 and path and len(path) > 1 else None)
+        if self.paths[i] or sweep != 0:
+            self.motion.append((i, self.paths[i], speed, sweep))
+        self.x.append(g["x"]); self.y.append(g["y"]); self.angle.append(g["angle"])
+        self.prev_x.append(g["x"]); self.prev_y.append(g["y"]); self.prev_angle.append(g["angle"])
+        self.clock.append(0); self.active.append(True); self.cones.append((None, None))
+        self.views.append(Guard.view(self, i))
+        guard_sprites(color)
+        return i
+
+    STATE = ("x", "y", "angle", "prev_x", "prev_y", "prev_angle", "clock", "active")
+
+    def get_state(self):
+        """Copy of every guard's pose, clock and active flag, for set_state()."""
+        return tuple(getattr(self, name)[:] for name in self.STATE)
+
+    def set_state(self, state):
+        for name, column in zip(self.STATE, state):
+            getattr(self, name)[:] = column
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, i):
+        return self.views[i]
+
+    def __iter__(self):
+        return iter(self.views)
+
+    # Simulation
+    def update(self):
+        """One tick for every guard. Still guards only need their previous
+        pose refreshed, which is three slice copies for the whole level."""
+        self.prev_x[:] = self.x
+        self.prev_y[:] = self.y
+        self.prev_angle[:] = self.angle
+        # seek(i, clock + 1) for each mover, with the column lookups hoisted
+        active, clock, start, angles, x, y = self.active, self.clock, self.start_angle, self.angle, self.x, self.y
+        for i, path, speed, sweep in self.motion:
+            if not active[i]: continue # the clock only runs while active
+            ticks = clock[i] = clock[i] + 1
+            angle = start[i]
+            if path:
+                px, py, heading = path.pose(speed * ticks)
+                x[i] = round(px); y[i] = round(py)
+                if sweep == 0 and heading is not None:
+                    angle = heading
+            if sweep != 0:
+                angle += sweep_offset(sweep, ticks)
+            angles[i] = angle
+
+    def step(self, i):
+        """One tick for guard i alone."""
+        self.prev_x[i], self.prev_y[i], self.prev_angle[i] = self.x[i], self.y[i], self.angle[i]
+        if self.active[i]:
+            self.seek(i, self.clock[i] + 1)
+
+    def seek(self, i, ticks):
+        """Jump guard i to its pose after `ticks` active ticks, without stepping there."""
+        self.clock[i] = ticks
+        angle = self.start_angle[i]
+        path = self.paths[i]
+        if path:
+            x, y, heading = path.pose(self.speed[i] * ticks)
+            self.x[i] = round(x); self.y[i] = round(y)
+            # Walking guards face along the path unless they sweep
+            if self.sweep[i] == 0 and heading is not None and ticks > 0:
+                angle = heading
+        if self.sweep[i] != 0:
+            angle += sweep_offset(self.sweep[i], ticks)
+        self.angle[i] = angle
+
+    def view(self, i, center):
+        """SightTable for guard i standing at center, or None without walls."""
+        return self.sight.table(center, self.length[i]) if self.sight else None
+
+    def sees(self, i, player_rect):
+        """Does guard i touch or see player_rect?"""
+        if not self.active[i]: return False
+        x, y = self.x[i], self.y[i]
+        if pygame.Rect(x, y, GUARD_SIZE, GUARD_SIZE).colliderect(player_rect): return True
+
+        cx, cy = x + GUARD_SIZE // 2, y + GUARD_SIZE // 2
+        length, fov, current = self.length[i], self.fov[i], snap_angle(self.angle[i], cone_cache.angle_step)
+        view = None
+        points = [player_rect.topleft, player_rect.topright, player_rect.bottomleft, player_rect.bottomright]
+        for px, py in points:
+            dx = px - cx; dy = py - cy; dist = math.hypot(dx, dy)
+            if dist <= length:
+                angle_to_point = -math.degrees(math.atan2(dy, dx))
+                diff = (angle_to_point - current + 180) % 360 - 180
+                if abs(diff) < fov / 2:
+                    if self.sight is None: return True
+                    # Inside the open cone; is a wall in the way?
+                    view = view or self.view(i, (cx, cy))
+                    if view.contains(current, fov, current + diff, dx, dy): return True
+        return False
+
+    def spots(self, player_rect, rows=None):
+        """Row of the first guard (of all, or of `rows`) that touches or sees
+        player_rect, or None."""
+        left, top, right, bottom = player_rect.left, player_rect.top, player_rect.right, player_rect.bottom
+        x, y, reach, active, sees = self.x, self.y, self.reach, self.active, self.sees
+        half = GUARD_SIZE // 2
+        for i in range(len(x)) if rows is None else rows:
+            if active[i]:
+                r = reach[i]; cx = x[i] + half; cy = y[i] + half
+                # Nothing outside the reach box can be touched or seen
+                if cx - r <= right and left <= cx + r and cy - r <= bottom and top <= cy + r and sees(i, player_rect):
+                    return i
+        return None
+
+    # Drawing
+    def draw_pose(self, i, alpha=1.0):
+        """Interpolated (rect, angle) of guard i between the last two simulation ticks."""
+        rect = pygame.Rect(lerp_pos((self.prev_x[i], self.prev_y[i]), (self.x[i], self.y[i]), alpha), (GUARD_SIZE, GUARD_SIZE))
+        return rect, lerp_angle(self.prev_angle[i], self.angle[i], alpha)
+
+    def draw_bounds(self, i, rect, angle):
+        """Screen area that draw() touches for guard i at this pose."""
+        if self.fire[i]:
+            return pygame.Rect(rect.x, rect.bottom - 45, rect.width, 45)
+        if self.active[i]:
+            sprite, (dx, dy) = self.cone_sprite(i, angle)
+            return rect.union(sprite.get_rect(topleft=(rect.centerx + dx, rect.centery + dy)))
+        return rect
+
+    def cone_sprite(self, i, angle):
+        """(sprite, offset from the drawn center) of guard i's cone. Walls are
+        looked up from the guard's tick position, not the interpolated one, so
+        a walking guard needs one SightTable per position on its path, and
+        its occluded sprites repeat every lap."""
+        half = GUARD_SIZE // 2
+        center = (self.x[i] + half, self.y[i] + half)
+        angle = snap_angle(angle, cone_cache.angle_step)
+        last = self.cones[i]
+        if last[0] != (center, angle):
+            last = self.cones[i] = ((center, angle), cone_cache.get(self.length[i], self.fov[i], self.color[i], angle,
+                                                                    view=self.view(i, center), walking=self.paths[i] is not None))
+        return last[1]
+
+    def draw(self, i, surface, rect, angle, flicker=0):
+        """Draw guard i at a pose from draw_pose()."""
+        sprites = guard_sprites(self.color[i])
 
-    def draw(self, surface):
         # 1. DRAW THE BODY (Blitting the pre-rendered images)
-        if self.color == C_FIRE:
-            if self.active:
-                flicker_idx = (pygame.time.get_ticks() // 100) % 3
-                # Blit the pre-rendered fire frame
+        if self.fire[i]:
+            if self.active[i]:
                 # Offset Y slightly so it sits on the floor correctly
-                surface.blit(self.fire_frames[flicker_idx], (self.rect.x, self.rect.bottom - 45))
+                surface.blit(sprites[flicker], (rect.x, rect.bottom - 45))
             else:
                 # Still draw the simple ellipse for "off" fire
-                pygame.draw.ellipse(surface, C_GUARD_OFF, (self.rect.x, self.rect.bottom - 10, 32, 10))
-        else:
-            # Blit the correct pre-rendered guard image
-            img = self.image_on if self.active else self.image_off
-            surface.blit(img, self.rect)
-
-        # 2. DRAW THE VISION CONE (Optimized small surface)
-        if self.active and self.color != C_FIRE:
-            self.cone_surf.fill((0, 0, 0, 0)) 
-            local_center = (self.vision_length, self.vision_length)
-            
-            rad = math.radians(-self.current_angle)
-            l_rad = rad - math.radians(self.fov/2); lx = local_center[0] + math.cos(l_rad)*self.vision_length; ly = local_center[1] + math.sin(l_rad)*self.vision_length
-            r_rad = rad + math.radians(self.fov/2); rx = local_center[0] + math.cos(r_rad)*self.vision_length; ry = local_center[1] + math.sin(r_rad)*self.vision_length
-            
-            pygame.draw.polygon(self.cone_surf, list(self.color)+[80], [local_center, (lx, ly), (rx, ry)])
-            surface.blit(self.cone_surf, (self.rect.centerx - self.vision_length, self.rect.centery - self.vision_length))
+                pygame.draw.ellipse(surface, C_GUARD_OFF, (rect.x, rect.bottom - 10, 32, 10))
+            return
 
-    def check_collision(self, player_rect):
-        if not self.active: return False
-        if self.rect.colliderect(player_rect): return True
+        surface.blit(sprites[0] if self.active[i] else sprites[1], rect)
 
-        points = [player_rect.topleft, player_rect.topright, player_rect.bottomleft, player_rect.bottomright]
-        for px, py in points:
-            dx = px - self.rect.centerx; dy = py - self.rect.centery; dist = math.hypot(dx, dy)
-            if dist <= self.vision_length:
-                angle_to_point = -math.degrees(math.atan2(dy, dx))
-                diff = (angle_to_point - self.current_angle + 180) % 360 - 180
-                if abs(diff) < self.fov / 2: return True
-        return False
+        # 2. DRAW THE VISION CONE (shared, pre-rendered)
+        if self.active[i]:
+            sprite, (dx, dy) = self.cone_sprite(i, angle)
+            surface.blit(sprite, (rect.centerx + dx, rect.centery + dy))
+
+class Guard:
+    """One guard: a view of its row in a GuardStore.
+
+    Guard(...) on its own (benchmarks, tools) gets a store of one.
+    """
+    __slots__ = ("store", "i")
+
+    def __init__(self, x, y, patrol_path, angle_start, link_id, speed=0, fov=60, vision_len=180, sweep_speed=0, color=C_GUARD_DEFAULT, sight=None):
+        self.store = GuardStore([{"x": x, "y": y, "path": patrol_path, "angle": angle_start, "id": link_id, "speed": speed,
+                                  "fov": fov, "len": vision_len, "sweep_speed": sweep_speed, "color": color}], sight)
+        self.i = 0
+
+    @classmethod
+    def view(cls, store, i):
+        guard = cls.__new__(cls)
+        guard.store = store
+        guard.i = i
+        return guard
+
+    @property
+    def rect(self):
+        return pygame.Rect(self.store.x[self.i], self.store.y[self.i], GUARD_SIZE, GUARD_SIZE)
+
+    @property
+    def current_angle(self):
+        return self.store.angle[self.i]
+
+    @property
+    def active(self):
+        return self.store.active[self.i]
+
+    @active.setter
+    def active(self, value):
+        self.store.active[self.i] = value
+
+    @property
+    def link_id(self):
+        return self.store.link[self.i]
+
+    @property
+    def fov(self):
+        return self.store.fov[self.i]
+
+    @property
+    def vision_length(self):
+        return self.store.length[self.i]
+
+    @property
+    def clock(self):
+        return self.store.clock[self.i]
+
+    def update(self):
+        self.store.step(self.i)
+
+    def seek(self, ticks):
+        self.store.seek(self.i, ticks)
+
+    def draw_pose(self, alpha=1.0):
+        return self.store.draw_pose(self.i, alpha)
+
+    def draw_bounds(self, alpha=1.0):
+        return self.store.draw_bounds(self.i, *self.draw_pose(alpha))
+
+    def draw(self, surface, alpha=1.0):
+        self.store.draw(self.i, surface, *self.draw_pose(alpha), flicker_frame())
+
+    def check_collision(self, player_rect):
+        return self.store.sees(self.i, player_rect)
 
 class Deactivator:
-    def __init__(self, x, y, link_id, is_fake=False, color=C_DEACTIVATOR_DEFAULT):
+    def __init__(self, x, y, link_id, is_fake=False, color=C_DEACTIVATOR_DEFAULT, effect=None):
         self.rect = pygame.Rect(x, y, 40, 40)
         self.link_id = link_id
         self.is_pressed = False
         self.is_fake = is_fake 
+        self.effect = effect # "trap" / "cure", or None for a guard switch
         self.base_color = color
 
     def update(self, player_rect):
@@ -345,256 +1251,30 @@ class Deactivator:
 # Level defs
 
 def get_levels():
-    
-    base_walls = [
-        (0, 0, SCREEN_WIDTH, 10 + HUD_OFFSET), 
-        offset_rect((0, SCREEN_HEIGHT - 10 - HUD_OFFSET, SCREEN_WIDTH, 10)), 
-        offset_rect((0, 0, 10, SCREEN_HEIGHT)), 
-        offset_rect((SCREEN_WIDTH - 10, 0, 10, SCREEN_HEIGHT)), 
-        offset_rect((635, 0, 10, SCREEN_HEIGHT)) 
-    ]
-
-    levels = []
-
-    # level 0: tutorial
-    l0_walls = list(base_walls)
-    l0_walls.append(offset_rect((150, 100, 20, 600)))
-    l0_walls.append(offset_rect((450, 0, 20, 520)))
-    
-    levels.append({
-        "name": "Level 0: Tutorial",
-        "briefing_p1": [
-            "Navigate the maze using the WASD keys.",
-            "",
-            "Collect the key.",
-            "",
-            "Open the chest to win."
-        ],
-        "briefing_p2": [
-            "No role in this level.",
-            "",
-            "Sit back and watch.",
-            "",
-            "Use the arrow keys to move around."
-        ],
-        "p1_start": offset_point((70, 540)), "p2_start": offset_point((1230, 30)), 
-        "key": offset_rect((300, 580, 40, 40)), "chest": offset_rect((550, 50, 40, 40)), 
-        "walls": l0_walls,
-        "guards": [],
-        "deactivators": [],
-        "instructions": [
-            # player 1 instructions
-            {"id": "p1_wasd", "lines": ["Use the WASD", "keys to navigate"], "rect": offset_rect((20, 580, 200, 60)), "start_active": True},
-            {"id": "p1_key", "lines": ["Collect the key"], "rect": offset_rect((350, 580, 200, 40)), "start_active": True},
-            {"id": "p1_chest", "lines": ["Unlock the", "treasure chest"], "rect": offset_rect((345, 50, 200, 60)), "start_active": False},
-            
-            # Player 2: Instructions
-            {"id": "p2_arrows", "lines": ["Use the Arrow", "keys to navigate"], "rect": offset_rect((1060, 80, 200, 60)), "start_active": True},
-            {"id": "p2_no_role", "lines": ["You don't have any", " roles in this level"], "rect": offset_rect((850, 320, 240, 60)), "start_active": True},
-        ],
-    })
-
-    # Level 1: with obstacles
-    l1_walls = list(base_walls)
-    # p1 walls
-    l1_walls.append(offset_rect((150, 100, 20, 600)))
-    l1_walls.append(offset_rect((450, 0, 20, 520)))
-    # p2 walls
-    l1_walls.append(offset_rect((640, 200, 500, 20)))
-    l1_walls.append(offset_rect((800, 500, 500, 20)))
-
-    l1_guard1_path = [offset_point((300, 200)), offset_point((300, 200))] 
-    l1_guard2_path = [offset_point((300, 500)), offset_point((300, 500))] 
-    
-    # INSTRUCTION COORDINATES
-    P1_ZONE_YELLOW_RECT_DATA = (180, 250, 465, 400) # Area Player 1 enters after first obstacle
-    P1_ZONE_PINK_RECT_DATA = (510, 400, 465, 200)   # Area Player 1 enters after second obstacle
-    P1_HINT_TOP = (400, 80)       # P1 Hint position near Top Guard
-    P1_HINT_BOTTOM = (440, 495)    # P1 Hint position near Bottom Guard
-    P2_HINT_TOP = (950, 120)       # P2 Hint position near Top Deactivator
-    P2_HINT_BOTTOM = (920, 620)   # P2 Hint position near Bottom Deactivator
-    
-    levels.append({
-        "name": "Level 1: Easy",
-        "briefing_p1": [
-            "Avoid contact with the obstacles (guards).",
-            "",
-            "Wait for P2 to deactivate the obstacles."
-        ],
-        "briefing_p2": [
-            "Use the arrow keys to move around.",
-            "",
-            "Disable obstacles for P1",
-            "by hovering over the deactivators."
-        ],
-        "p1_start": offset_point((70, 620)), "p2_start": offset_point((655, 350)), 
-        "key": offset_rect((300, 580, 40, 40)), "chest": offset_rect((550, 50, 40, 40)), 
-        "walls": l1_walls,
-        "guards": [
-            # Top Guard
-            {"x": l1_guard1_path[0][0], "y": l1_guard1_path[0][1], "path": l1_guard1_path, "angle": 90, "id": 1, "speed": 0, "fov": 60, "len": 250, "sweep_speed": 5, "color": C_GUARD_DEFAULT},
-            # Bottom Guard
-            {"x": l1_guard2_path[0][0], "y": l1_guard2_path[0][1], "path": l1_guard2_path, "angle": 270, "id": 2, "speed": 0, "fov": 40, "len": 200, "sweep_speed": 5, "color": C_GUARD_DEFAULT}
-        ],
-        "deactivators": [
-            # Deactivator for Top Guard
-            {"x": offset_point((750, 100))[0], "y": offset_point((750, 100))[1], "id": 1, "fake": False, "color": C_GUARD_DEFAULT},  
-            # Deactivator for Bottom Guard
-            {"x": offset_point((1100, 600))[0], "y": offset_point((1100, 600))[1], "id": 2, "fake": False, "color": C_GUARD_DEFAULT}, 
-        ],
-        "instructions": [
-            # P1 instructions
-            {"id": "p1_guard", "lines": ["Stay clear", "of the guards"], "rect": offset_rect(P1_HINT_TOP + (200, 60)), "start_active": True},
-            {"id": "p1_key", "lines": ["Collect the key"], "rect": offset_rect((370, 550, 200, 40)), "start_active": False},
-            
-            # P2 instructions
-            {"id": "p2_deact_move", "lines": ["Hover over the deactivator", "to disable the obstacles"], "rect": offset_rect(P2_HINT_TOP + (300, 60)), "start_active": True},
-        ],
-        # instruction logic
-        "custom_data": {
-            "p1_zone_yellow_rect": P1_ZONE_YELLOW_RECT_DATA,
-            "p1_zone_pink_rect": P1_ZONE_PINK_RECT_DATA,
-            "p1_hint_top": P1_HINT_TOP,
-            "p1_hint_bottom": P1_HINT_BOTTOM,
-            "p2_hint_top": P2_HINT_TOP,
-            "p2_hint_bottom": P2_HINT_BOTTOM,
-        }
-    })
-    
-# Level 2
-    l2_walls = list(base_walls)
-    l2_walls.extend([
-        offset_rect((0, 200, 400, 20)), offset_rect((200, 450, 430, 20)), offset_rect((100, 280, 20, 100)), offset_rect((500, 150, 20, 100)), 
-        offset_rect((700, 150, 20, 400)), offset_rect((850, 280, 20, 400)), offset_rect((1000, 150, 20, 400)), 
-        offset_rect((700, 450, 150, 20)), offset_rect((900, 450, 100, 20)), offset_rect((850, 280, 200, 20)), 
-    ])
-    l2_p2_start = offset_point((750, 50)) 
-    l2_guard1_path = [offset_point((200, 300)), offset_point((550, 300))]
-    l2_guard2_path = [offset_point((400, 100)), offset_point((400, 300))]
-    l2_guard3_path = [offset_point((580, 580)), offset_point((580, 580))]
-    
-    levels.append({
-        "name": "Level 2: Medium",
-        "briefing_p1": [
-            "Navigate fast-moving guards.",
-            "",
-            "Reach the chest.",
-            "",
-            "Be patient while P2 looks", 
-            "for the correct deactivator"
-        ],
-        "briefing_p2": [
-            "There are fake deactivators here.",
-            "",
-            "Find correct ones to disable the obstacles."
-        ],
-        "p1_start": offset_point((50, 50)), "p2_start": l2_p2_start,
-        "key": offset_rect((550, 610, 40, 40)), "chest": offset_rect((100, 50, 40, 40)), 
-        "walls": l2_walls,
-        "guards": [
-            {"x": l2_guard1_path[0][0], "y": l2_guard1_path[0][1], "path": l2_guard1_path, "angle": 0, "id": 1, "speed": 18, "fov": 45, "len": 100, "color": C_GUARD_DEFAULT},
-            {"x": l2_guard2_path[0][0], "y": l2_guard2_path[0][1], "path": l2_guard2_path, "angle": 90, "id": 2, "speed": 12, "fov": 45, "len": 150, "color": C_GUARD_DEFAULT},
-            {"x": l2_guard3_path[0][0], "y": l2_guard3_path[0][1], "path": l2_guard3_path, "angle": 225, "id": 3, "speed": 0, "fov": 70, "len": 200, "sweep_speed": 2.5, "color": C_GUARD_DEFAULT},
-        ],
-        "deactivators": [
-            # real deactivators
-            {"x": offset_point((750, 500))[0], "y": offset_point((750, 500))[1], "id": 1, "fake": False, "color": C_GUARD_DEFAULT}, 
-            {"x": offset_point((790, 400))[0], "y": offset_point((790, 400))[1], "id": 2, "fake": False, "color": C_GUARD_DEFAULT}, 
-            {"x": offset_point((900, 500))[0], "y": offset_point((900, 500))[1], "id": 3, "fake": False, "color": C_GUARD_DEFAULT},
-            #Fake deactivators
-            {"x": offset_point((1030, 320))[0], "y": offset_point((1030, 320))[1], "id": 4, "fake": True, "color": C_GUARD_DEFAULT}, 
-            {"x": offset_point((900, 200))[0], "y": offset_point((900, 200))[1], "id": 4, "fake": True, "color": C_GUARD_DEFAULT},
-            {"x": offset_point((1100, 150))[0], "y": offset_point((1100, 150))[1], "id": 5, "fake": True, "color": C_GUARD_DEFAULT},
-        ],
-        "instructions": [
-            {"id": "l2_p2_fake", "lines": ["There are 3 real ", "deactivators", "and 3 fake ones"], "rect": offset_rect((1050, 30, 210, 72)), "start_active": True},
-        ],
-    })
-
-    # Level 3
-    l3_walls = list(base_walls)
-    # walls for P1
-    l3_walls.append(offset_rect((200, 120, 340, 20)))   # Top/Mid divider
-    l3_walls.append(offset_rect((135, 480, 500, 20))) # Mid/Bot divider
-    l3_walls.append(offset_rect((200, 0, 20, 120))) # wall b/w p1 origin and treasure chest
-    l3_walls.append(offset_rect((500, 500, 20, 80))) # wall near key
-    l3_walls.append(offset_rect((400, 250, 20, 250))) # middle vertical wall
-    l3_walls.append(offset_rect((520, 140, 20, 200))) # right vertical wall
-    l3_walls.append(offset_rect((260, 140, 20, 200))) # left vertical wall
-    l3_walls.append(offset_rect((130, 320, 20, 180))) # left vertical wall
-    
-    # Walls for P2
-    l3_walls.append(offset_rect((800, 200, 20, 300))) # middle vertical wall 1
-    l3_walls.append(offset_rect((1000, 100, 20, 320))) # middle vertical wall 2
-    l3_walls.append(offset_rect((800, 400, 200, 20))) # middle horizontal wall
-    l3_walls.append(offset_rect((1000, 550, 20, 100))) # wall to the right of bottom fake deactivator
-    l3_walls.append(offset_rect((1170, 100, 150, 20))) # wall below antifreeze switch
-    l3_walls.append(offset_rect((1170, 120, 20, 90))) # wall near top fake deactivator
-    l3_walls.append(offset_rect((900, 550, 20, 100))) # wall to the left of bottom fake deactivator
-    l3_walls.append(offset_rect((640, 100, 150, 20))) # wall below top real deactivator
-    l3_walls.append(offset_rect((1000, 300, 135, 20))) # wall near middle real deactivator
-
-    # guard locations
-    l3_guard1_path = [offset_point((570, 620)), offset_point((570, 620))] # key guard
-    l3_guard2_path = [offset_point((100, 90)), offset_point((100, 90))] # treasure chest guard
-    l3_guard3_p2_path = [offset_point((550, 100)), offset_point((50, 580))] # wandering guard
-
-    levels.append({
-        "name": "Level 3: HARD",
-        "briefing_p1": [
-            "Avoid guards.",
-            "",
-            "If P2 hits a fake switch, you FREEZE",
-            "",
-            "Wait for the P2 to",
-            "bring the game back to normal."
-        ],
-
-        "briefing_p2": [
-            "Some deactivators are FAKE.",
-            "",
-            "If you hit a fake one:",
-            " - P1 freezes",
-            " - Your controls invert (left <-> right)",
-            " - If you touch any wall, you respawn",
-            "",
-            "Reach the CYAN switch to",
-            "bring the game back to normal."
-        ],
-        "p1_start": offset_point((250, 50)), 
-        "p2_start": offset_point((640, 620)), 
-        "key": offset_rect((580, 500, 40, 40)), # In middle section
-        "chest": offset_rect((50, 50, 40, 40)), # In top section
-        "walls": l3_walls,
-        "guards": [
-            # guards
-            {"x": l3_guard1_path[0][0], "y": l3_guard1_path[0][1], "path": l3_guard1_path, "angle": 90, "id": 1, "speed": 0, "sweep_speed": 0, "fov": 60, "len": 150, "color": C_GUARD_DEFAULT}, # key guard
-            {"x": l3_guard2_path[0][0], "y": l3_guard2_path[0][1], "path": l3_guard2_path, "angle": 140, "id": 2, "speed": 0, "sweep_speed": 6, "fov": 90, "len": 150, "color": C_GUARD_DEFAULT}, # treasure chest guard
-            {"x": l3_guard3_p2_path[0][0], "y": l3_guard3_p2_path[0][1], "path": l3_guard3_p2_path, "angle": 90, "id": 3, "speed": 14, "fov": 60, "len": 150, "color": C_GUARD_DEFAULT}, # wandering guard
-        ],
-        "deactivators": [
-            # Real deactivator
-            {"x": offset_point((660, 40))[0], "y": offset_point((660, 40))[1], "id": 1, "fake": False, "color": C_DEACTIVATOR_DEFAULT}, # top deactivator
-            {"x": offset_point((1220, 135))[0], "y": offset_point((1220, 135))[1], "id": 2, "fake": False, "color": C_DEACTIVATOR_DEFAULT}, # below antifreeze switch
-            {"x": offset_point((900, 350))[0], "y": offset_point((900, 350))[1], "id": 3, "fake": False, "color": C_DEACTIVATOR_DEFAULT}, # middle deactivator
-            # Fake deactivator
-            {"x": offset_point((1030, 340))[0], "y": offset_point((1030, 340))[1], "id": 999, "fake": True, "color": C_DEACTIVATOR_DEFAULT}, # top
-            {"x": offset_point((940, 600))[0], "y": offset_point((940, 600))[1], "id": 999, "fake": True, "color": C_DEACTIVATOR_DEFAULT}, # bottom
-            # Antifreeze switch
-            {"x": offset_point((1220, 30))[0], "y": offset_point((1220, 30))[1], "id": 888, "fake": True, "color": (0, 255, 255)},
-        ],
-        "instructions": [
-             {"id": "l3_hint", "lines": ["Beware of the fake", "Deactivators"], "rect": offset_rect((1030, 570, 220, 60)), "start_active": True},
-        ]
-    })
-
-    return levels
+    """Every level, loaded eagerly (tools and benchmarks). The game itself
+    goes through a LevelLibrary, which loads levels on first use."""
+    return list(leveldata.LevelLibrary(LEVEL_DIR, LEVEL_SETTINGS))
 
 # game manager
 
 class Game:
-    def __init__(self):
-        self.levels = get_levels()
+    def __init__(self, input_source=None, headless=False):
+        # headless games never touch the display; input comes from input_source
+        self.headless = headless
+        if input_source is None:
+            input_source = ScriptedInput() if headless else KeyboardInput()
+        self.input = input_source
+        self.tick = 0
+        self.recorder = None # replay.Recorder, if this session is being recorded
+        self.telemetry = None # telemetry.Telemetry, if gameplay events are being logged
+        self.frozen_at = None # tick P1 was frozen at (telemetry)
+        self.profiler = NULL_PROFILER
+        self.pending_regions = None # what present() pushes: None = whole screen
+        self.scene_damage = []
+        self.panels = {} # name -> (content key, pre-composed surface)
+        self.sight_maps = {} # level index -> SightMap
+
+        self.levels = leveldata.LevelLibrary(LEVEL_DIR, LEVEL_SETTINGS) # loaded on demand
         self.current_level_idx = 0
         self.state = "MAIN_MENU"
         self.menu_buttons = [
@@ -604,22 +1284,23 @@ class Game:
             {"text": "Level 3", "level_idx": 3, "rect": pygame.Rect(SCREEN_WIDTH//2 - 100, 480, 200, 50)}
         ]
         
-        self.p1_passed_obs1 = False
-        self.p1_passed_obs2 = False
-
         self.load_level(self.current_level_idx, initial_load=True)
         
     def load_level(self, idx, initial_load=False):
+        self.end_frozen_span()
         if idx >= len(self.levels):
             self.state = "CAMPAIGN_COMPLETE"
             return
             
         self.current_level_idx = idx
+        if self.telemetry: self.telemetry.emit(self.tick, "level", idx)
         data = self.levels[idx]
         self.level_name = data["name"]
         self.briefing_p1 = data["briefing_p1"]
         self.briefing_p2 = data["briefing_p2"]
         self.walls = [pygame.Rect(w) for w in data["walls"]]
+        self.wall_grid = SpatialGrid(self.walls, cell_ids=data.get("wall_cells"))
+        self.invalidate_scene(layers=True)
         
         p1_controls = {'up': pygame.K_w, 'down': pygame.K_s, 'left': pygame.K_a, 'right': pygame.K_d}
         
@@ -630,17 +1311,21 @@ class Game:
         self.chest_rect = pygame.Rect(data["chest"])
         self.p1_has_key = False
         
-        self.guards = []
-        for g in data["guards"]:
-            self.guards.append(Guard(g["x"], g["y"], g["path"], g["angle"], g["id"], g["speed"], g["fov"], g["len"], g.get("sweep_speed",0), g.get("color", C_GUARD_DEFAULT)))
+        # Walls never change within a level, so restarts keep the sight tables
+        self.sight = self.sight_maps.get(idx)
+        if self.sight is None:
+            self.sight = self.sight_maps[idx] = SightMap(self.wall_grid)
+        self.guards = GuardStore(data["guards"], self.sight)
             
         self.deactivators = []
         for d_data in data["deactivators"]:
-            self.deactivators.append(Deactivator(d_data["x"], d_data["y"], d_data["id"], d_data.get("fake", False), d_data.get("color", C_DEACTIVATOR_DEFAULT)))
+            self.deactivators.append(Deactivator(d_data["x"], d_data["y"], d_data["id"], d_data.get("fake", False),
+                                                 d_data.get("color", C_DEACTIVATOR_DEFAULT), d_data.get("effect")))
+
+        self.vision_batch = None
+        if len(self.guards) >= VECTOR_VISION_MIN_GUARDS and load_vision() is not None:
+            self.vision_batch = vision.VisionBatch(self.guards, cone_cache.angle_step)
 
-        self.p1_zone_yellow = None
-        self.p1_zone_pink = None
-        
         # instruction set up
         self.tutorial_instructions = []
         for instr in data.get("instructions", []):
@@ -648,24 +1333,39 @@ class Game:
                 TutorialInstruction(instr["id"], instr["lines"], instr["rect"], instr.get("start_active", False))
             )
 
-        if data.get("custom_data"):
-            custom_data = data["custom_data"]
-            if custom_data.get("p1_zone_yellow_rect"):
-                self.p1_zone_yellow = pygame.Rect(offset_rect(custom_data["p1_zone_yellow_rect"]))
-            if custom_data.get("p1_zone_pink_rect"):
-                self.p1_zone_pink = pygame.Rect(offset_rect(custom_data["p1_zone_pink_rect"]))
-
-        # Reset Level 1 progression flags on load/restart
-        self.p1_passed_obs1 = False
-        self.p1_passed_obs2 = False
+        # Indexes for the trigger system (see TRIGGERS below)
+        self.instructions_by_id = {i.id: i for i in self.tutorial_instructions}
+        self.link_guards = {} # link id -> rows of the guards its switches disable
+        for i, link_id in enumerate(self.guards.link):
+            self.link_guards.setdefault(link_id, []).append(i)
+        self.switch_grid = SpatialGrid([d.rect for d in self.deactivators])
+        self.pressed = frozenset() # indices of the switches P2 stands on
+        self.link_presses = {}     # link id -> how many of its switches are pressed
+        self.switches_dirty = False
+        self.stages = data.get("stages", [])
+        self.zone_grid = SpatialGrid([stage["zone"] for stage in self.stages[1:]])
+        self.p1_zones = None       # stage zones P1 overlaps; None = recheck
+        self.p1_zone_rect = None
+        self.triggers = data.get("triggers", {})
+        if self.stages: self.set_stage(0)
 
         self.time_limit = None
-        self.start_ticks = pygame.time.get_ticks()
+        self.start_ticks = ticks_ms()
+        self.respawns = 0      # times P1 was spotted this attempt (batch results)
+        self.trap_triggers = 0 # times P2 stepped onto a trap switch
 
         if not initial_load: self.state = "BRIEFING" 
     
+    def end_frozen_span(self):
+        """Log "thawed" for a freeze that ends without a thaw (restart, level
+        change, quit), so its time still counts."""
+        if self.telemetry and self.frozen_at is not None:
+            self.telemetry.emit(self.tick, "thawed", self.tick - self.frozen_at)
+        self.frozen_at = None
+
     def restart_level(self):
         # load_level function handles resetting the level state and instruction flags
+        if self.telemetry: self.telemetry.emit(self.tick, "restart", self.current_level_idx)
         self.load_level(self.current_level_idx)
 
     def restart_game(self):
@@ -674,11 +1374,108 @@ class Game:
     def handle_menu_click(self, pos):
         for btn in self.menu_buttons:
             if btn["rect"].collidepoint(pos):
+                if self.recorder: self.recorder.on_load(btn["level_idx"])
                 self.load_level(btn["level_idx"])
                 return
 
+    def handle_keydown(self, key, mods=0):
+        """Discrete key presses (level skip, menu, restart, continue)."""
+        if self.recorder: self.recorder.on_key(key, mods)
+        if mods & pygame.KMOD_SHIFT:
+            if key == pygame.K_0: self.load_level(0)
+            elif key == pygame.K_1: self.load_level(1)
+            elif key == pygame.K_2: self.load_level(2)
+            elif key == pygame.K_3: self.load_level(3)
+
+        # --- M Key for Main Menu ---
+        if key == pygame.K_m:
+            self.state = "MAIN_MENU"
+
+        if key == pygame.K_r:
+            if self.state == "PLAYING": self.restart_level()
+            elif self.state == "VICTORY": self.restart_level()
+            elif self.state == "CAMPAIGN_COMPLETE": self.restart_game()
+        if key == pygame.K_RETURN:
+            if self.state == "BRIEFING":
+                self.state = "PLAYING"; self.start_ticks = ticks_ms()
+            elif self.state == "VICTORY":
+                self.load_level(self.current_level_idx + 1)
+
+    # TRIGGERS
+    # Level scripting comes from the level file ("stages", "triggers", switch
+    # effects) and only runs when its inputs change: P2 stepping on or off a
+    # switch, P1 crossing a stage zone, or a game event like picking up the key.
+    def run_actions(self, actions):
+        for instr_id, center in actions["show"].items():
+            instr = self.instructions_by_id[instr_id]
+            instr.active = True
+            if center is not None: instr.rect.center = center
+        for instr_id in actions["hide"]:
+            self.instructions_by_id[instr_id].active = False
+        for instr_id in actions["complete"]:
+            self.instructions_by_id[instr_id].completed = True
+
+    def fire(self, event):
+        for actions in self.triggers.get(event, ()):
+            self.run_actions(actions)
+
+    def set_stage(self, stage):
+        self.stage = stage
+        if self.telemetry: self.telemetry.emit(self.tick, "stage", stage)
+        self.run_actions(self.stages[stage])
+
+    def update_zones(self):
+        """Advance the stage progression when P1 enters the next stage's zone."""
+        if not self.stages or (self.p1_zones is not None and self.p1.rect == self.p1_zone_rect):
+            return
+        self.p1_zone_rect = pygame.Rect(self.p1.rect)
+        zones = frozenset(self.zone_grid.query(self.p1.rect)) # zone i opens stage i + 1
+        if zones == self.p1_zones:
+            return
+        self.p1_zones = zones
+        while self.stage + 1 < len(self.stages) and self.stage in zones:
+            self.set_stage(self.stage + 1)
+
+    def update_switches(self):
+        """Press/release switches under P2 and apply what changed."""
+        if not self.deactivators:
+            return
+        pressed = frozenset(self.switch_grid.query(self.p2.rect))
+        if pressed == self.pressed and not self.switches_dirty:
+            return
+        for i in pressed ^ self.pressed:
+            d = self.deactivators[i]
+            d.is_pressed = i in pressed
+            if d.effect == "trap" and d.is_pressed: self.trap_triggers += 1
+            if self.telemetry and d.is_pressed:
+                self.telemetry.emit(self.tick, d.effect or ("fake" if d.is_fake else "switch"), i)
+            if d.is_fake or d.effect: continue
+            # Guards on a link stay off while any of its switches is held
+            count = self.link_presses.get(d.link_id, 0) + (1 if d.is_pressed else -1)
+            self.link_presses[d.link_id] = count
+            if count == (1 if d.is_pressed else 0):
+                active = self.guards.active
+                for g in self.link_guards.get(d.link_id, ()):
+                    active[g] = not d.is_pressed
+        self.pressed = pressed
+        self.switches_dirty = False
+
+        # Effects hold while pressed; in switch order, so a cure beats a trap
+        for i in sorted(pressed):
+            effect = self.deactivators[i].effect
+            if effect == "trap":
+                self.p1.is_frozen = True
+                self.p1.is_trapped = True
+                self.p2.inverted_controls = True
+            elif effect == "cure":
+                self.p1.is_frozen = False
+                self.p1.is_trapped = False
+                self.p2.inverted_controls = False
+
     def update(self):
-        keys = pygame.key.get_pressed()
+        keys = self.input.get_pressed()
+        self.tick += 1
+        if self.recorder: self.recorder.on_tick(keys)
         
         if self.state == "MAIN_MENU":
             pass
@@ -687,111 +1484,67 @@ class Game:
             pass
 
         elif self.state == "PLAYING":
-            self.p1.update(keys, self.walls)
-            self.p2.update(keys, self.walls)
+            prof = self.profiler
+            prof.begin("update.players")
+            self.p1.update(keys, self.wall_grid)
+            self.p2.update(keys, self.wall_grid)
+            prof.end()
 
-            # instruction logic for level 1
-            if self.current_level_idx == 1:
-                
-                custom_data = self.levels[self.current_level_idx]["custom_data"]
-                P1_HINT_TOP = custom_data["p1_hint_top"]
-                P1_HINT_BOTTOM = custom_data["p1_hint_bottom"]
-                P2_HINT_TOP = custom_data["p2_hint_top"]
-                P2_HINT_BOTTOM = custom_data["p2_hint_bottom"]
-
-                p1_guard_instr = next((i for i in self.tutorial_instructions if i.id == "p1_guard"), None)
-                p2_deact_instr = next((i for i in self.tutorial_instructions if i.id == "p2_deact_move"), None)
-                
-                # Check for yellow zone - whether P1 has passed the first obstacle
-                if not self.p1_passed_obs1 and self.p1_zone_yellow and self.p1.rect.colliderect(self.p1_zone_yellow):
-                    self.p1_passed_obs1 = True
-                
-                # If the first obstacle is passed, check for the Pink Zone (Obstacle 2 cleared) - USES RECT COLLISION
-                if self.p1_passed_obs1 and not self.p1_passed_obs2 and self.p1_zone_pink and self.p1.rect.colliderect(self.p1_zone_pink):
-                    self.p1_passed_obs2 = True
-
-                if p1_guard_instr and p2_deact_instr:
-                    
-                    if not self.p1_passed_obs1:
-                        # STATE 1: At the start (Left lane or top crossing area)
-                        # Hints focus on Top Obstacle
-                        p1_guard_instr.active = True
-                        p1_guard_instr.rect.center = offset_point(P1_HINT_TOP)
-                        p2_deact_instr.active = True
-                        p2_deact_instr.rect.center = offset_point(P2_HINT_TOP)
-
-                    elif self.p1_passed_obs1 and not self.p1_passed_obs2:
-                        # STATE 2: Passed first obstacle (Yellow Zone), approaching second (Pink Zone)
-                        # Hints focus on Bottom Obstacle
-                        p1_guard_instr.active = True
-                        p1_guard_instr.rect.center = offset_point(P1_HINT_BOTTOM)
-                        p2_deact_instr.active = True
-                        p2_deact_instr.rect.center = offset_point(P2_HINT_BOTTOM)
-
-                    elif self.p1_passed_obs2:
-                        # STATE 3: Passed both obstacles (Pink Zone)
-                        # Hints disappear
-                        p1_guard_instr.active = False
-                        p2_deact_instr.active = False
-
-            # TUTORIAL LOGIC UPDATE
-            elif self.current_level_idx == 0:
-                # Level 0: Key Instruction removed when key collected
-                p1_key_instr = next((i for i in self.tutorial_instructions if i.id == "p1_key"), None)
-                if p1_key_instr and self.p1_has_key:
-                    p1_key_instr.completed = True
-
-
-            active_links = {}
-            for d in self.deactivators:
-                if self.current_level_idx == 0: continue
+            self.update_zones()
+
+            prof.begin("update.deactivators")
+            self.update_switches()
+            prof.end()
+            
+            prof.begin("update.guards")
+            self.guards.update()
                 
-                d.update(self.p2.rect)
+            # COLLISION & RESPAWN LOGIC 
+            # Guard movement doesn't depend on P1, so checking all guards after
+            # moving them gives the same result as checking each one in turn.
+            if self.vision_batch is not None:
+                # NumPy ignores walls; only guards it flags need the occlusion check
+                spotted = self.guards.spots(self.p1.rect, self.vision_batch.hits(self.guards, self.p1.rect))
+            else:
+                spotted = self.guards.spots(self.p1.rect)
+            prof.end()
+
+            if spotted is not None:
+                if self.telemetry:
+                    self.telemetry.emit(self.tick, "respawn", spotted, self.p1_has_key)
+                    if self.p1_has_key: self.telemetry.emit(self.tick, "key_drop")
+                self.p1.reset() 
+                self.respawns += 1
+                self.switches_dirty = True # a trap P2 still stands on freezes P1 again
                 
-                if d.is_pressed:
-                    # CHECK FOR SPECIAL TRAP SWITCHES
-                    if d.link_id == 999: # TRAP
-                        self.p1.is_frozen = True
-                        self.p1.is_trapped = True # Keep existing flag for guards potentially
-                        self.p2.inverted_controls = True
-                    
-                    # CHECK FOR CURE SWITCH
-                    elif d.link_id == 888: # CURE
-                        self.p1.is_frozen = False
-                        self.p1.is_trapped = False
-                        self.p2.inverted_controls = False
-                    
-                    elif not d.is_fake: 
-                        active_links[d.link_id] = True
-            
-            for g in self.guards:
-                g.active = not active_links.get(g.link_id, False)
-                g.update()
+                # Level progression starts over
+                if self.stages:
+                    self.set_stage(0)
+                    self.p1_zones = None
                 
-                # COLLISION & RESPAWN LOGIC 
-                if g.check_collision(self.p1.rect):
-                    self.p1.reset() 
-                    
-                    # If P1 respawns, reset progression flags for Level 1 logic
-                    if self.current_level_idx == 1:
-                         self.p1_passed_obs1 = False
-                         self.p1_passed_obs2 = False
-                    
-                    if self.p1_has_key:
-                        self.p1_has_key = False
-                        self.key_rect = pygame.Rect(self.key_data)
-                        self.p1.is_trapped = False
+                if self.p1_has_key:
+                    self.p1_has_key = False
+                    self.key_rect = pygame.Rect(self.key_data)
+                    self.p1.is_trapped = False
+                self.fire("respawn")
             
             if not self.p1_has_key and self.p1.rect.colliderect(self.key_rect):
                 self.p1_has_key = True
-                
-                # Activate P1 Chest Instruction (L0/L1)
-                p1_chest_instr = next((i for i in self.tutorial_instructions if i.id == "p1_chest"), None)
-                if p1_chest_instr: p1_chest_instr.active = True
                 self.key_rect.topleft = (-100, -100) 
+                self.fire("key")
+                if self.telemetry: self.telemetry.emit(self.tick, "key")
 
             if self.p1_has_key and self.p1.rect.colliderect(self.chest_rect):
                 self.state = "VICTORY"
+                if self.telemetry: self.telemetry.emit(self.tick, "complete", self.current_level_idx)
+
+            if self.telemetry and self.p1.is_frozen != (self.frozen_at is not None):
+                if self.p1.is_frozen:
+                    self.frozen_at = self.tick
+                    self.telemetry.emit(self.tick, "frozen")
+                else:
+                    self.telemetry.emit(self.tick, "thawed", self.tick - self.frozen_at)
+                    self.frozen_at = None
 
         elif self.state == "VICTORY":
             if keys[pygame.K_r]: self.restart_level()
@@ -800,7 +1553,50 @@ class Game:
             if keys[pygame.K_r]: self.restart_game()
 
 
-    def draw(self):
+    def draw(self, alpha=1.0):
+        """Render the current state and push it to the window."""
+        self.render(alpha)
+        self.present()
+
+    def present(self):
+        """Push what render() painted: the whole screen or just its dirty rects."""
+        if self.headless:
+            return
+        self.profiler.begin("present")
+        if self.pending_regions is None:
+            pygame.display.flip()
+        elif self.pending_regions:
+            pygame.display.update(self.pending_regions)
+        self.profiler.end()
+
+    def damage(self, rect):
+        """Something outside the scene (e.g. a debug overlay) was painted over
+        rect after render(): push it now and repaint under it next frame."""
+        if self.pending_regions is not None:
+            self.pending_regions.append(rect)
+        self.scene_damage.append(pygame.Rect(rect))
+
+    def screen_key(self):
+        """What a static screen (anything but PLAYING) shows right now. It
+        only changes on input, a hovered menu button or the fire flicker
+        behind the victory panel; main() redraws when it does."""
+        hovered = None
+        if self.state == "MAIN_MENU" and not self.headless:
+            pos = pygame.mouse.get_pos()
+            hovered = next((i for i, btn in enumerate(self.menu_buttons) if btn["rect"].collidepoint(pos)), None)
+        flicker = flicker_frame() if self.state == "VICTORY" and any(self.guards.fire) else None
+        return (self.state, self.current_level_idx, hovered, flicker)
+
+    def render(self, alpha=1.0):
+        """Paint the current state into the screen surface. alpha in [0, 1]
+        interpolates moving entities between the previous and the latest
+        simulation tick."""
+        if self.state == "PLAYING":
+            # Static layer + dirty rectangles; everything else repaints in full
+            self.draw_playing(alpha)
+            return
+
+        alpha = 1.0 # nothing is simulated, draw the settled state
         screen.fill(C_BG)
         
         if self.state == "MAIN_MENU":
@@ -809,87 +1605,211 @@ class Game:
         elif self.state == "BRIEFING":
             self.draw_briefing_screen()
 
-        elif self.state in ("PLAYING", "VICTORY"):
-            
-            # Draw Walls (Checking for Trap State in Level 3)
-            current_wall_color = C_WALL
-            if self.current_level_idx == 3 and self.p1.is_frozen:
-                 current_wall_color = C_WALL_DANGER
-            
-            for wall in self.walls: pygame.draw.rect(screen, current_wall_color, wall)
-            
-            for d in self.deactivators: d.draw(screen)
-            
-            if not self.p1_has_key:
-                draw_visual_key(screen, self.key_rect)
-            
-            draw_visual_chest(screen, self.chest_rect, self.p1_has_key)
-            
-            for g in self.guards: g.draw(screen)
-            self.p1.draw(screen); self.p2.draw(screen)
-            
-            # DRAW TUTORIAL BOXES
-            for instruction in self.tutorial_instructions:
-                instruction.draw(screen)
-
-            pygame.draw.rect(screen, C_HUD_BG, (0, 0, SCREEN_WIDTH, HUD_OFFSET))
-            key_status_text = "Key: Retrieved" if self.p1_has_key else "Key: Awaiting Retrieval"
-            key_status_color = C_KEY if self.p1_has_key else (150, 150, 150)
-            status_surf = font_ui.render(key_status_text, True, key_status_color)
-            screen.blit(status_surf, (SCREEN_WIDTH - status_surf.get_width() - 20, 15))
-            screen.blit(font_ui.render(self.level_name, True, C_KEY), (20, 10))
-            
-            # Playing UI Hint
-            if self.state == "PLAYING":
-                restart_text = font_small.render("Press 'R' to Restart Level", True, (100, 100, 120))
-                screen.blit(restart_text, (SCREEN_WIDTH // 2 - restart_text.get_width() // 2, 15))
-                
-                # LEVEL 3 TRAP WARNING
-            if self.current_level_idx == 3 and self.p1.is_frozen:
-                warn_text = "!! P1 FROZEN - P2 DON'T TOUCH WALLS - REACH CYAN SWITCH TO UNDO !!"
-                warn_surf = font_ui.render(warn_text, True, (255, 50, 50))
-                
-                # Calculate box dimensions based on text size
-                padding = 15
-                box_w = warn_surf.get_width() + (padding * 2)
-                box_h = warn_surf.get_height() + (padding * 2)
-                box_rect = pygame.Rect(SCREEN_WIDTH//2 - box_w//2, 85, box_w, box_h)
-                
-                # Semi-Transparent Grey Box
-                s = pygame.Surface((box_rect.width, box_rect.height), pygame.SRCALPHA)
-                s.fill(C_TUTORIAL_BOX) 
-                screen.blit(s, (box_rect.x, box_rect.y))
-                pygame.draw.rect(screen, C_TUTORIAL_BORDER, box_rect, 2, border_radius=8) # border
-                # Draw the Text centered in the box
-                screen.blit(warn_surf, (box_rect.x + padding, box_rect.y + padding))
-
-            if self.state == "VICTORY":
-                overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-                overlay.fill((0,0,0,150))
-                screen.blit(overlay, (0,0))
-                draw_centered_text(screen, "LEVEL CLEARED", -30, font_title, C_KEY)
-                draw_centered_text(screen, "Press 'ENTER' for Next Level", 30, font_ui)
-                draw_centered_text(screen, "Press 'R' to Replay Level", 70, font_small)
+        elif self.state == "VICTORY":
+            # Settled scene under a dimming overlay, drawn in full
+            layer = self.static_layer(self.walls_in_danger(), hint=False)
+            screen.blit(layer, (0, 0))
+            self.draw_items(self.scene_items(layer, alpha))
+
+            screen.blit(self.panel("victory", None, self.build_victory_overlay), (0,0))
 
         elif self.state == "CAMPAIGN_COMPLETE":
             draw_centered_text(screen, "All levels cleared!", 50, font_ui)
             draw_centered_text(screen, "Click 'M' to Return to Menu", 100, font_ui)
 
-        pygame.display.flip()
+        # Any full-screen frame leaves the screen out of sync with the cached play scene
+        self.scene_valid = False
+        self.pending_regions = None
+
+    # STATIC LAYER + DIRTY RECTANGLE RENDERING
+    def invalidate_scene(self, layers=False):
+        """Force the next PLAYING frame to repaint everything (level load,
+        window expose). layers=True also drops the pre-rendered backgrounds."""
+        self.scene_valid = False
+        self.scene_prev = {}
+        self.scene_damage = []
+        if layers:
+            self.static_layers = {}
+
+    def walls_in_danger(self):
+        # A sprung trap (P1 frozen) paints the walls red
+        return self.p1.is_frozen
+
+    def static_layer(self, danger, hint=True):
+        """Walls, HUD bar and level title pre-rendered once per level load."""
+        layer = self.static_layers.get((danger, hint))
+        if layer is None:
+            layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), 0, screen) # screen's pixel format: blits are plain copies
+            layer.fill(C_BG)
+            wall_color = C_WALL_DANGER if danger else C_WALL
+            for wall in self.walls: pygame.draw.rect(layer, wall_color, wall)
+            pygame.draw.rect(layer, C_HUD_BG, HUD_RECT)
+            layer.blit(render_text(font_ui, self.level_name, C_KEY), (20, 10))
+            if hint:
+                restart_text = render_text(font_small, "Press 'R' to Restart Level", (100, 100, 120))
+                layer.blit(restart_text, (SCREEN_WIDTH // 2 - restart_text.get_width() // 2, 15))
+            self.static_layers[(danger, hint)] = layer
+        return layer
+
+    def scene_items(self, layer, alpha):
+        """Everything drawn on top of the static layer, bottom to top, as
+        (id, screen rect, appearance key, draw function). An item whose rect
+        and key match the previous frame doesn't need repainting."""
+        items = []
+        for i, d in enumerate(self.deactivators):
+            items.append((("deactivator", i), pygame.Rect(d.rect), d.is_pressed, d.draw))
+
+        if not self.p1_has_key:
+            items.append(("key", pygame.Rect(self.key_rect), None, lambda s: draw_visual_key(s, self.key_rect)))
+        items.append(("chest", pygame.Rect(self.chest_rect), self.p1_has_key, lambda s: draw_visual_chest(s, self.chest_rect, self.p1_has_key)))
+
+        guards = self.guards
+        flicker = flicker_frame()
+        for i in range(len(guards)):
+            rect, angle = guards.draw_pose(i, alpha)
+            bounds = guards.draw_bounds(i, rect, angle)
+            if not bounds.colliderect(SCREEN_RECT): continue # off screen
+            frame = flicker if guards.fire[i] else 0
+            items.append((("guard", i), bounds, (rect.topleft, angle, guards.active[i], frame),
+                          lambda s, i=i, rect=rect, angle=angle, frame=frame: guards.draw(i, s, rect, angle, frame)))
+
+        for p in (self.p1, self.p2):
+            items.append((p.player_id, p.draw_rect(alpha), (p.is_frozen, p.inverted_controls),
+                          lambda s, p=p: p.draw(s, alpha)))
+
+        # DRAW TUTORIAL BOXES
+        for instruction in self.tutorial_instructions:
+            if instruction.active and not instruction.completed:
+                items.append((("instruction", instruction.id), pygame.Rect(instruction.rect), tuple(instruction.text_lines), instruction.draw))
+
+        # HUD sits above the playfield: repaint the cached bar over anything that strays into it
+        items.append(("hud", pygame.Rect(HUD_RECT), None, lambda s: s.blit(layer, HUD_RECT, HUD_RECT)))
+        key_status_text = "Key: Retrieved" if self.p1_has_key else "Key: Awaiting Retrieval"
+        key_status_color = C_KEY if self.p1_has_key else (150, 150, 150)
+        status_surf = render_text(font_ui, key_status_text, key_status_color)
+        status_pos = (SCREEN_WIDTH - status_surf.get_width() - 20, 15)
+        items.append(("key_status", status_surf.get_rect(topleft=status_pos), self.p1_has_key, lambda s: s.blit(status_surf, status_pos)))
+
+        # LEVEL 3 TRAP WARNING
+        if self.walls_in_danger():
+            warn_text = "!! P1 FROZEN - P2 DON'T TOUCH WALLS - REACH CYAN SWITCH TO UNDO !!"
+            warn_surf = render_text(font_ui, warn_text, (255, 50, 50))
+            
+            # Calculate box dimensions based on text size
+            padding = 15
+            box_w = warn_surf.get_width() + (padding * 2)
+            box_h = warn_surf.get_height() + (padding * 2)
+            box_rect = pygame.Rect(SCREEN_WIDTH//2 - box_w//2, 85, box_w, box_h)
+
+            # Semi-Transparent Grey Box with border and text, composed once
+            box = self.panel("trap_warning", warn_text, lambda: compose_panel(
+                box_rect.size, C_TUTORIAL_BOX, C_TUTORIAL_BORDER, [(warn_surf, (padding, padding))]))
+            items.append(("trap_warning", box_rect, None, lambda s: s.blit(box, box_rect)))
+        return items
+
+    def panel(self, name, key, build):
+        """Pre-composed overlay surface, rebuilt only when key changes."""
+        entry = self.panels.get(name)
+        if entry is None or entry[0] != key:
+            entry = (key, build())
+            self.panels[name] = entry
+        return entry[1]
+
+    def build_victory_overlay(self):
+        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        overlay.fill((0,0,0,150))
+        draw_centered_text(overlay, "LEVEL CLEARED", -30, font_title, C_KEY)
+        draw_centered_text(overlay, "Press 'ENTER' for Next Level", 30, font_ui)
+        draw_centered_text(overlay, "Press 'R' to Replay Level", 70, font_small)
+        return overlay
+
+    def draw_playing(self, alpha):
+        """Repaint only what changed since the last frame.
+
+        Regions are restored from the static layer and the items inside them
+        redrawn in z-order. An unchanged item overlapping a restored region
+        is redrawn too (its own rect joins the region set), so translucent
+        cones and boxes never blend twice. The result is pushed with
+        display.update(rects) instead of a full flip. When most of the screen
+        changes (many walking guards) everything is repainted instead.
+        """
+        danger = self.walls_in_danger()
+        layer = self.static_layer(danger)
+        items = self.scene_items(layer, alpha)
+
+        prof = self.profiler
+        regions = None
+        if self.scene_valid and danger == self.scene_danger:
+            prev = self.scene_prev
+            regions = self.scene_damage
+            dirty = [False] * len(items)
+            for n, (item_id, rect, key, _) in enumerate(items):
+                old = prev.pop(item_id, None)
+                if old != (rect, key):
+                    dirty[n] = True
+                    regions.append(rect)
+                    if old is not None: regions.append(old[0])
+            # Items that disappeared (collected key, hidden hints)
+            regions.extend(rect for rect, _ in prev.values())
+            if sum(r.width * r.height for r in regions) > FULL_REPAINT_SHARE * SCREEN_WIDTH * SCREEN_HEIGHT:
+                regions = None
+
+        if regions is None:
+            prof.begin("draw.walls")
+            screen.blit(layer, (0, 0))
+            prof.end()
+            self.draw_items(items)
+        else:
+            grown = bool(regions)
+            while grown:
+                grown = False
+                for n, item in enumerate(items):
+                    if not dirty[n] and item[1].collidelist(regions) != -1:
+                        dirty[n] = True
+                        regions.append(item[1])
+                        grown = True
+
+            prof.begin("draw.walls")
+            for rect in regions:
+                screen.blit(layer, rect, rect)
+            prof.end()
+            self.draw_items(items, dirty)
+
+        self.scene_prev = {item_id: (rect, key) for item_id, rect, key, _ in items}
+        self.scene_valid = True
+        self.scene_danger = danger
+        self.scene_damage = []
+        self.pending_regions = regions
+
+    def draw_items(self, items, dirty=None):
+        """Draw scene items in order (only the dirty ones if a mask is given),
+        timing each run of same-kind items as one profiler phase."""
+        prof = self.profiler
+        phase = None
+        for n, (item_id, _, _, draw_fn) in enumerate(items):
+            if dirty is not None and not dirty[n]:
+                continue
+            item_phase = ITEM_PHASES[item_id[0] if isinstance(item_id, tuple) else item_id]
+            if item_phase != phase:
+                if phase: prof.end()
+                prof.begin(item_phase)
+                phase = item_phase
+            draw_fn(screen)
+        if phase: prof.end()
 
     def draw_main_menu(self):
         draw_centered_text(screen, "DUOS & DON'TS", -250, font_title, C_P1)
         
-        mouse_pos = pygame.mouse.get_pos()
+        mouse_pos = (-1, -1) if self.headless else pygame.mouse.get_pos()
         for btn in self.menu_buttons:
             color = C_BUTTON_HOVER if btn["rect"].collidepoint(mouse_pos) else C_BUTTON_IDLE
             pygame.draw.rect(screen, color, btn["rect"], border_radius=10)
             pygame.draw.rect(screen, C_TEXT, btn["rect"], 2, border_radius=10)
-            text_surf = font_ui.render(btn["text"], True, C_TEXT)
+            text_surf = render_text(font_ui, btn["text"], C_TEXT)
             screen.blit(text_surf, text_surf.get_rect(center=btn["rect"].center))
     
         nav_text = "For easy navigation click SHIFT + [Level number]"
-        nav_surf = font_small.render(nav_text, True, (150, 150, 150))
+        nav_surf = render_text(font_small, nav_text, (150, 150, 150))
         screen.blit(nav_surf, nav_surf.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT - 50)))
 
 
@@ -903,23 +1823,23 @@ class Game:
         pygame.draw.line(screen, C_WALL, (SCREEN_WIDTH // 2, y_start), (SCREEN_WIDTH // 2, y_start + 400), 2)
         
         # Player 1 Header
-        p1_title = font_ui.render("Player 1 (Blue)", True, C_P1)
+        p1_title = render_text(font_ui, "Player 1 (Blue)", C_P1)
         screen.blit(p1_title, p1_title.get_rect(centerx=SCREEN_WIDTH // 4, top=y_start))
         
         # Player 2 Header
-        p2_title = font_ui.render("Player 2 (Green)", True, C_P2)
+        p2_title = render_text(font_ui, "Player 2 (Green)", C_P2)
         screen.blit(p2_title, p2_title.get_rect(centerx=3 * SCREEN_WIDTH // 4, top=y_start))
         
         y_offset_p1 = y_start + 60
         for line in self.briefing_p1:
-            text_surf = font_rules.render(line, True, C_TEXT)
+            text_surf = render_text(font_rules, line, C_TEXT)
             # Center text within the left half
             screen.blit(text_surf, text_surf.get_rect(centerx=SCREEN_WIDTH // 4, top=y_offset_p1))
             y_offset_p1 += 35
             
         y_offset_p2 = y_start + 60
         for line in self.briefing_p2:
-             text_surf = font_rules.render(line, True, C_TEXT)
+             text_surf = render_text(font_rules, line, C_TEXT)
              # Center text within the right half
              screen.blit(text_surf, text_surf.get_rect(centerx=3 * SCREEN_WIDTH // 4, top=y_offset_p2))
              y_offset_p2 += 35
@@ -928,54 +1848,119 @@ class Game:
 
 
 # MAIN LOOP EXECUTION
-async def main():
+def run_headless(game, ticks, on_tick=None):
+    """Step the simulation as fast as possible: no window, no clock, no drawing.
+
+    on_tick(game) runs before every update and may drive game.input or call
+    game.handle_keydown(). Returns the game for chaining.
+    """
+    for _ in range(ticks):
+        if on_tick: on_tick(game)
+        game.update()
+    return game
+
+async def main(record_path=None, profile=False, startup_report=False, connect=None, role="p2", telemetry_path=None):
+    global scheduler
+    if record_path and connect:
+        # The server runs the simulation; the client has nothing to replay
+        raise ValueError("--record cannot be combined with --connect")
+    game = None
     try:
+        startup.mark("module setup")
+        init_display()
         game = Game()
+        startup.mark("game")
+        net = None # netplay.Client when playing on a remote server
+        if connect:
+            import netplay
+            net = await netplay.connect(game, connect, role)
+        step = net.update if net else game.update
+        if record_path:
+            import replay
+            game.recorder = replay.Recorder()
+        if telemetry_path:
+            import telemetry
+            game.telemetry = telemetry.Telemetry(telemetry_path)
+            game.telemetry.start()
+        scheduler = make_scheduler()
+        prof = NULL_PROFILER
+        if profile:
+            import profiler
+            prof = game.profiler = profiler.FrameProfiler(pacing=scheduler.pacing)
         running = True
+        accumulator = 0.0
+        shown = None # screen_key() of the static screen on display
         while running:
+            prof.begin_frame()
+            prof.begin("events")
             for event in pygame.event.get():
                 if event.type == pygame.QUIT: running = False
-                
-                if event.type == pygame.KEYDOWN:
-                    mods = pygame.key.get_mods()
-                    if mods & pygame.KMOD_SHIFT:
-                        if event.key == pygame.K_0: game.load_level(0) 
-                        elif event.key == pygame.K_1: game.load_level(1) 
-                        elif event.key == pygame.K_2: game.load_level(2)
-                        elif event.key == pygame.K_3: game.load_level(3)
-
-                # --- M Key for Main Menu ---
-                if event.type == pygame.KEYDOWN and event.key == pygame.K_m:
-                    game.state = "MAIN_MENU" 
-
-                if event.type == pygame.MOUSEBUTTONDOWN and game.state == "MAIN_MENU":
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    game.invalidate_scene()
+                    shown = None
+
+                if event.type == pygame.MOUSEBUTTONDOWN and game.state == "MAIN_MENU" and not net:
                     game.handle_menu_click(event.pos)
                 if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_r: 
-                        if game.state == "PLAYING": game.restart_level()
-                        elif game.state == "VICTORY": game.restart_level()
-                        elif game.state == "CAMPAIGN_COMPLETE": game.restart_game()
-                    if event.key == pygame.K_RETURN:
-                         if game.state == "BRIEFING":
-                            game.state = "PLAYING"; game.start_ticks = pygame.time.get_ticks()
-                         elif game.state == "VICTORY":
-                            game.load_level(game.current_level_idx + 1)
+                    if net: net.keydown(event.key) # the server decides what it does
+                    else: game.handle_keydown(event.key, pygame.key.get_mods())
+                prof.handle_event(event)
+            prof.end()
             
-            game.update()
-            game.draw()
-            clock.tick(FPS)
-            
-
-            await asyncio.sleep(0) 
+            # Fixed-timestep simulation: render as fast as the device allows
+            # (capped at FPS) and run however many SIM_DT ticks that frame covered.
+            # Static screens idle: a few frames a second, woken early by input,
+            # still ticking so recordings and telemetry keep wall-clock time.
+            idle = game.state != "PLAYING" and not prof.overlay_visible
+            if scheduler.idle and not idle:
+                accumulator = 0.0 # back to full rate, no catch-up burst
+            scheduler.idle = idle
+            prof.begin("idle")
+            frame_time = await scheduler.next_frame()
+            prof.end()
+            accumulator += min(frame_time, MAX_FRAME_TIME)
+            while accumulator >= SIM_DT:
+                prof.begin("update")
+                step()
+                prof.end()
+                accumulator -= SIM_DT
+
+            # ...and are only redrawn when what they show changed
+            key = game.screen_key() if idle else None
+            if key is None or key != shown:
+                prof.begin("draw")
+                game.render(accumulator / SIM_DT)
+                if prof.overlay_visible:
+                    game.damage(prof.draw_overlay(screen))
+                prof.end()
+                game.present()
+            shown = key
+            prof.end_frame()
+            if not startup.done:
+                startup.mark("first frame")
+                startup.finish()
+                if startup_report: print(startup.report())
 
     except Exception as e:
         print(f"An unexpected error occurred during the game loop: {e}")
     
     finally:
-        if pygame.get_init():
-            pygame.quit()
+        if game is not None and game.recorder:
+            game.recorder.save(record_path)
+        if game is not None and game.telemetry:
+            game.end_frozen_span()
+            game.telemetry.close()
+        pygame.quit()
         sys.exit(0)
 
 # MAIN LOOP EXECUTION
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    # python main.py [--record FILE] [--telemetry FILE] [--profile] [--startup-report] [--connect HOST[:PORT] --role p1|p2]
+    # profiler.py / replay.py `import main`; make that this module rather than a second copy
+    sys.modules.setdefault("main", sys.modules[__name__])
+    def option(name):
+        return sys.argv[sys.argv.index(name) + 1] if name in sys.argv[1:-1] else None
+    if option("--record") and option("--connect"):
+        sys.exit("--record cannot be combined with --connect: the server runs the game, not this client")
+    asyncio.run(main(option("--record"), profile="--profile" in sys.argv, startup_report="--startup-report" in sys.argv,
+                     connect=option("--connect"), role=option("--role") or "p2", telemetry_path=option("--telemetry")))
\ No newline at end of file
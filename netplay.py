@@ -0,0 +1,519 @@
+"""Remote co-op: an authoritative server and predicting clients over UDP.
+
+The server runs the only real Game. Each client sends just its own
+player's inputs and draws what the server says, predicting its own
+player in between so its movement responds at once.
+
+Inputs (client -> server), one packet per client tick:
+    MSG_INPUT, role, last snapshot received, first seq, (mask, count)...
+Every packet repeats all inputs the server hasn't acknowledged yet (up to
+INPUT_WINDOW), so a lost packet costs nothing while the next one arrives.
+A mask holds the direction bits plus ENTER / RESTART for keydowns. The
+server applies one input per client per tick in sequence order; a missing
+input repeats the last directions without the keydowns. A role belongs
+to the first address that sends for it until that address has been silent
+for PEER_TIMEOUT; a client that comes back with a new address or counting
+from 1 again starts over. Malformed packets are dropped.
+
+Snapshots (server -> client) every SNAPSHOT_EVERY ticks:
+    MSG_SNAPSHOT, seq, baseline seq (0 = full), last input applied, fields
+The state is a flat list of ints (see capture()). A snapshot is sent as
+the fields that changed since the last snapshot the client acknowledged:
+a bitmask plus zigzag varint differences. Guards cost almost nothing.
+Their poses follow from their clocks (GuardStore.seek), and a moving
+guard's lag (level ticks minus its clock) only changes while it is
+switched off. A quiet tick is a few bytes.
+
+Clients reconcile: on each snapshot they take the server's state, then
+replay their unacknowledged inputs over it for their own player and the
+guards, so what they see runs ahead of the server by one round trip.
+
+Usage:
+    python netplay.py server [--port 7777] [--level 1]
+    python main.py --connect HOST[:PORT] --role p1|p2
+    python netplay.py loopback [--latency 80] [--jitter 20] [--loss 0.05] [--seconds 20]
+loopback runs a server and two scripted clients in one process over
+127.0.0.1 with simulated one-way latency (ms), jitter (ms) and loss
+(fraction of packets dropped each way), then reports bandwidth, how often
+the prediction was corrected and whether the clients ended in sync.
+"""
+import asyncio
+import random
+import sys
+import time
+
+import pygame
+
+import main
+from replay import read_varint, write_varint
+
+PORT = 7777
+MSG_INPUT = 1
+MSG_SNAPSHOT = 2
+ROLES = ("p1", "p2")
+STATES = ("MAIN_MENU", "BRIEFING", "PLAYING", "VICTORY", "CAMPAIGN_COMPLETE")
+SNAPSHOT_EVERY = 2   # ticks between snapshots (40 Hz at SIM_HZ 80)
+INPUT_WINDOW = 32    # most inputs a packet repeats
+HISTORY = 64         # snapshots kept as delta baselines (each side)
+MAX_BACKLOG = 8      # inputs queued on the server before the oldest are skipped
+PEER_TIMEOUT = 2.0   # seconds a silent client keeps its role from other addresses
+
+# Input mask bits
+UP, DOWN, LEFT, RIGHT, ENTER, RESTART = (1 << i for i in range(6))
+MOVE_BITS = UP | DOWN | LEFT | RIGHT
+EVENT_BITS = {pygame.K_RETURN: ENTER, pygame.K_r: RESTART}
+# Both key sets steer a remote client's own player
+LOCAL_KEYS = {UP: (pygame.K_w, pygame.K_UP), DOWN: (pygame.K_s, pygame.K_DOWN),
+              LEFT: (pygame.K_a, pygame.K_LEFT), RIGHT: (pygame.K_d, pygame.K_RIGHT)}
+
+
+def zigzag(n):
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+def unzigzag(n):
+    return -((n + 1) >> 1) if n & 1 else n >> 1
+
+def held_keys(mask, controls):
+    """Keys a player's mask holds, in that player's own controls."""
+    return main.HeldKeys(controls[name] for bit, name in ((UP, "up"), (DOWN, "down"), (LEFT, "left"), (RIGHT, "right"))
+                         if mask & bit)
+
+def capture(game, level_ticks):
+    """The state clients see, as a flat list of ints."""
+    p1, p2, guards = game.p1, game.p2, game.guards
+    flags = game.p1_has_key | p1.is_frozen << 1 | p1.is_trapped << 2 | p2.inverted_controls << 3
+    pressed = sum(1 << i for i in game.pressed)
+    active = sum(1 << i for i, on in enumerate(guards.active) if on)
+    fields = [STATES.index(game.state), game.current_level_idx, level_ticks,
+              p1.rect.x, p1.rect.y, p2.rect.x, p2.rect.y, flags, game.key_rect.x, game.key_rect.y, pressed, active]
+    fields += [level_ticks - guards.clock[i] for i, *_ in guards.motion]
+    for instr in game.tutorial_instructions:
+        fields += [instr.active | instr.completed << 1, instr.rect.centerx, instr.rect.centery]
+    return fields
+
+def apply(game, fields):
+    """Make a client's Game show a captured state. Returns level_ticks."""
+    state, level, level_ticks, p1x, p1y, p2x, p2y, flags, key_x, key_y, pressed, active = fields[:12]
+    if level != game.current_level_idx:
+        game.load_level(level)
+    game.state = STATES[state]
+    for player, pos in ((game.p1, (p1x, p1y)), (game.p2, (p2x, p2y))):
+        player.prev_x, player.prev_y = player.rect.topleft
+        player.rect.topleft = pos
+    game.p1_has_key = bool(flags & 1)
+    game.p1.is_frozen = bool(flags & 2)
+    game.p1.is_trapped = bool(flags & 4)
+    game.p2.inverted_controls = bool(flags & 8)
+    game.key_rect.topleft = (key_x, key_y)
+    game.pressed = frozenset(i for i in range(len(game.deactivators)) if pressed >> i & 1)
+    for i, d in enumerate(game.deactivators):
+        d.is_pressed = i in game.pressed
+    guards = game.guards
+    for i in range(len(guards)):
+        guards.active[i] = bool(active >> i & 1)
+    n = 12
+    for i, *_ in guards.motion:
+        guards.prev_x[i], guards.prev_y[i], guards.prev_angle[i] = guards.x[i], guards.y[i], guards.angle[i]
+        guards.seek(i, level_ticks - fields[n])
+        n += 1
+    for instr in game.tutorial_instructions:
+        state, cx, cy = fields[n:n + 3]
+        instr.active, instr.completed = bool(state & 1), bool(state & 2)
+        instr.rect.center = (cx, cy)
+        n += 3
+    return level_ticks
+
+def encode_input(role_id, snap_ack, inputs):
+    """Input packet for [(seq, mask)] with consecutive seqs, run-length encoded."""
+    buf = bytearray([MSG_INPUT, role_id])
+    write_varint(buf, snap_ack)
+    write_varint(buf, inputs[0][0])
+    run = 0
+    for i, (_, mask) in enumerate(inputs):
+        run += 1
+        if i + 1 == len(inputs) or inputs[i + 1][1] != mask:
+            buf.append(mask)
+            write_varint(buf, run)
+            run = 0
+    return bytes(buf)
+
+def decode_input(data):
+    """(role_id, snap_ack, first seq, [(mask, count)]). Raises ValueError
+    for anything a client wouldn't send; these packets come off the open
+    network."""
+    if len(data) < 2 or data[0] != MSG_INPUT or data[1] >= len(ROLES):
+        raise ValueError("not an input packet")
+    try:
+        snap_ack, pos = read_varint(data, 2)
+        seq, pos = read_varint(data, pos)
+        runs = []
+        total = 0
+        while pos < len(data):
+            mask = data[pos]
+            count, pos = read_varint(data, pos + 1)
+            total += count
+            if mask & ~(MOVE_BITS | ENTER | RESTART) or count == 0 or total > INPUT_WINDOW:
+                raise ValueError("bad input run")
+            runs.append((mask, count))
+    except IndexError:
+        raise ValueError("truncated input packet") from None
+    if seq == 0 or not runs:
+        raise ValueError("empty input packet")
+    return data[1], snap_ack, seq, runs
+
+def encode_snapshot(seq, base_seq, base, fields, ack):
+    """Snapshot packet: fields as a delta from base (the fields of snapshot
+    base_seq), or in full when there is no usable base."""
+    full = base is None or len(base) != len(fields)
+    buf = bytearray([MSG_SNAPSHOT])
+    for value in (seq, 0 if full else base_seq, ack):
+        write_varint(buf, value)
+    if full:
+        write_varint(buf, len(fields))
+        for value in fields:
+            write_varint(buf, zigzag(value))
+        return bytes(buf)
+    changed = 0
+    for i, (old, new) in enumerate(zip(base, fields)):
+        if old != new:
+            changed |= 1 << i
+    write_varint(buf, changed)
+    for old, new in zip(base, fields):
+        if old != new:
+            write_varint(buf, zigzag(new - old))
+    return bytes(buf)
+
+def decode_snapshot(data, baselines):
+    """(seq, ack, fields), or None if the baseline is gone."""
+    seq, pos = read_varint(data, 1)
+    base_seq, pos = read_varint(data, pos)
+    ack, pos = read_varint(data, pos)
+    if base_seq == 0:
+        count, pos = read_varint(data, pos)
+        fields = []
+        for _ in range(count):
+            value, pos = read_varint(data, pos)
+            fields.append(unzigzag(value))
+        return seq, ack, fields
+    base = baselines.get(base_seq)
+    if base is None:
+        return None
+    changed, pos = read_varint(data, pos)
+    fields = list(base)
+    i = 0
+    while changed:
+        if changed & 1:
+            value, pos = read_varint(data, pos)
+            fields[i] += unzigzag(value)
+        changed >>= 1
+        i += 1
+    return seq, ack, fields
+
+class Link:
+    """Outgoing datagrams, optionally through a simulated bad network:
+    fixed latency plus random jitter (seconds) and a drop probability."""
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.transport = None
+        self.sent = 0 # bytes, dropped packets included
+        self.packets = 0
+
+    def send(self, data, addr=None):
+        self.sent += len(data)
+        self.packets += 1
+        if self.loss and self.rng.random() < self.loss:
+            return
+        delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            asyncio.get_running_loop().call_later(delay, self._send, data, addr)
+        else:
+            self._send(data, addr)
+
+    def _send(self, data, addr):
+        if not self.transport.is_closing():
+            self.transport.sendto(data, addr)
+
+class Peer:
+    """Server-side view of one client."""
+    def __init__(self):
+        self.addr = None
+        self.pending = {}    # seq -> mask, not yet applied
+        self.next_seq = None # next input to apply
+        self.mask = 0        # last applied directions
+        self.ack = 0         # last input applied
+        self.snap_ack = 0    # last snapshot the client has
+        self.heard = 0.0     # time.monotonic() of the last packet
+
+    def take(self):
+        """Mask for this tick: the next input in order, else the last
+        directions again."""
+        if self.next_seq is None:
+            return 0
+        if self.pending and max(self.pending) - self.next_seq >= MAX_BACKLOG:
+            self.next_seq = max(self.pending) - MAX_BACKLOG + 1 # fell behind: skip ahead
+        mask = self.pending.pop(self.next_seq, None)
+        if mask is None:
+            return self.mask & MOVE_BITS
+        for seq in [s for s in self.pending if s < self.next_seq]:
+            del self.pending[seq]
+        self.ack = self.next_seq
+        self.next_seq += 1
+        self.mask = mask
+        return mask
+
+class Server(asyncio.DatagramProtocol):
+    """The authoritative Game. run() ticks it at SIM_HZ."""
+    def __init__(self, level=1, link=None):
+        self.game = main.Game(headless=True)
+        self.level = level
+        self.game.load_level(level)
+        self.link = link or Link()
+        self.peers = {role: Peer() for role in ROLES}
+        self.guards = self.game.guards
+        self.level_ticks = 0
+        self.seq = 0
+        self.history = {}
+
+    def connection_made(self, transport):
+        self.link.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            role_id, snap_ack, seq, runs = decode_input(data)
+        except ValueError:
+            return
+        role = ROLES[role_id]
+        peer = self.peers[role]
+        now = time.monotonic()
+        if peer.addr != addr:
+            if peer.addr is not None and now - peer.heard < PEER_TIMEOUT:
+                return # the role is taken
+            peer = self.peers[role] = Peer() # a new client (or the old one reconnecting)
+        elif peer.next_seq is not None and seq + sum(count for _, count in runs) + HISTORY < peer.next_seq:
+            peer = self.peers[role] = Peer() # far behind what it sent before: it restarted
+        peer.addr = addr
+        peer.heard = now
+        peer.snap_ack = max(peer.snap_ack, snap_ack)
+        if peer.next_seq is None:
+            peer.next_seq = seq
+        for mask, count in runs:
+            for n in range(max(seq, peer.next_seq), seq + count):
+                peer.pending[n] = mask
+            seq += count
+
+    def tick(self):
+        game = self.game
+        held = set()
+        pressed = set()
+        state = game.state
+        for role, peer in self.peers.items():
+            mask = peer.take()
+            held |= held_keys(mask, getattr(game, role).controls)
+            for key, bit in EVENT_BITS.items():
+                # Once per tick, and only for the screen both players saw: two
+                # ENTERs must not skip VICTORY -> BRIEFING -> PLAYING at once
+                if mask & bit and key not in pressed and game.state == state:
+                    pressed.add(key)
+                    game.handle_keydown(key)
+        if game.state == "MAIN_MENU":
+            game.load_level(self.level) # no menu over the network
+        game.input.set_keys(held)
+        playing = game.state == "PLAYING"
+        game.update()
+        if game.guards is not self.guards: # loaded or restarted a level
+            self.guards = game.guards
+            self.level_ticks = 0
+        elif playing:
+            self.level_ticks += 1
+        if game.tick % SNAPSHOT_EVERY == 0:
+            self.broadcast()
+
+    def broadcast(self):
+        self.seq += 1
+        fields = capture(self.game, self.level_ticks)
+        self.history[self.seq] = fields
+        self.history.pop(self.seq - HISTORY, None)
+        for peer in self.peers.values():
+            if peer.addr is not None:
+                base = self.history.get(peer.snap_ack)
+                self.link.send(encode_snapshot(self.seq, peer.snap_ack, base, fields, peer.ack), peer.addr)
+
+    async def run(self, ticks=None):
+        loop = asyncio.get_running_loop()
+        next_time = loop.time()
+        while ticks is None or self.game.tick < ticks:
+            self.tick()
+            next_time += main.SIM_DT
+            delay = next_time - loop.time()
+            if delay < -main.MAX_FRAME_TIME:
+                next_time = loop.time() # stalled: don't try to catch up
+            await asyncio.sleep(max(0.0, delay))
+
+class Client(asyncio.DatagramProtocol):
+    """Drives a local Game from the server's snapshots. Call update() once
+    per simulation tick instead of game.update(), and keydown() for key
+    presses instead of game.handle_keydown()."""
+    def __init__(self, game, role, link=None):
+        self.game = game
+        self.role = role
+        self.role_id = ROLES.index(role)
+        self.link = link or Link()
+        self.seq = 0
+        self.inputs = []     # [(seq, mask)] not yet applied by the server
+        self.events = 0      # keydown bits for the next input
+        self.predicted = {}  # seq -> own position predicted after it
+        self.baselines = {}  # snapshot seq -> fields
+        self.latest = 0      # newest snapshot applied
+        self.level_ticks = 0
+        self.corrections = 0 # predictions the server disagreed with
+        self.received = 0    # snapshot bytes
+
+    def connection_made(self, transport):
+        self.link.transport = transport
+
+    def keydown(self, key):
+        self.events |= EVENT_BITS.get(key, 0)
+
+    def read_mask(self):
+        keys = self.game.input.get_pressed()
+        mask = self.events
+        self.events = 0
+        for bit, codes in LOCAL_KEYS.items():
+            if any(keys[code] for code in codes):
+                mask |= bit
+        return mask
+
+    def update(self):
+        """Send this tick's input and predict its effect locally."""
+        game = self.game
+        mask = self.read_mask()
+        self.seq += 1
+        self.inputs.append((self.seq, mask))
+        del self.inputs[:-INPUT_WINDOW]
+        self.send_inputs()
+        game.tick += 1
+        self.predict(mask)
+        self.predicted[self.seq] = getattr(game, self.role).rect.topleft
+        self.predicted.pop(self.seq - HISTORY, None)
+
+    def send_inputs(self):
+        """Send every input the server hasn't acknowledged yet."""
+        if self.inputs:
+            self.link.send(encode_input(self.role_id, self.latest, self.inputs))
+
+    def predict(self, mask):
+        game = self.game
+        if game.state != "PLAYING":
+            return
+        player = getattr(game, self.role)
+        player.update(held_keys(mask, player.controls), game.wall_grid)
+        game.guards.update()
+        self.level_ticks += 1
+
+    def datagram_received(self, data, addr):
+        if not data or data[0] != MSG_SNAPSHOT:
+            return
+        try:
+            snapshot = decode_snapshot(data, self.baselines)
+        except IndexError:
+            return # truncated
+        if snapshot is None or snapshot[0] <= self.latest:
+            return # stale, or out of order
+        seq, ack, fields = snapshot
+        self.received += len(data)
+        self.baselines[seq] = fields
+        self.baselines.pop(seq - HISTORY, None)
+        self.latest = seq
+        self.level_ticks = apply(self.game, fields)
+        player = getattr(self.game, self.role)
+        if self.predicted.get(ack, player.rect.topleft) != player.rect.topleft:
+            self.corrections += 1
+        # Replay what the server hasn't seen yet over its state
+        self.inputs = [(s, m) for s, m in self.inputs if s > ack]
+        for _, mask in self.inputs:
+            self.predict(mask & MOVE_BITS)
+
+async def start_server(level=1, port=PORT, host="0.0.0.0", link=None):
+    loop = asyncio.get_running_loop()
+    server = Server(level, link)
+    await loop.create_datagram_endpoint(lambda: server, local_addr=(host, port))
+    return server
+
+async def connect(game, address, role, link=None):
+    """Client for game talking to address ("host" or "host:port")."""
+    host, _, port = address.partition(":")
+    loop = asyncio.get_running_loop()
+    client = Client(game, role, link)
+    await loop.create_datagram_endpoint(lambda: client, remote_addr=(host, int(port or PORT)))
+    return client
+
+async def loopback(latency=0.08, jitter=0.02, loss=0.05, seconds=20, port=PORT + 1, level=1):
+    """Server plus two scripted clients over 127.0.0.1; prints a report."""
+    def link(seed):
+        return Link(latency, jitter, loss, seed)
+    server = await start_server(level, port, "127.0.0.1", link(0))
+    clients = []
+    for i, role in enumerate(ROLES):
+        client = await connect(main.Game(headless=True), f"127.0.0.1:{port}", role, link(i + 1))
+        clients.append(client)
+    rng = random.Random(42)
+    ticks = int(seconds * main.SIM_HZ)
+
+    async def drive(client):
+        # Held directions change every half second; ENTER gets past briefings
+        source = client.game.input
+        loop = asyncio.get_running_loop()
+        next_time = loop.time()
+        for t in range(ticks):
+            if t % (main.SIM_HZ // 2) == 0:
+                source.set_keys(rng.sample([pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d], rng.randint(0, 2)))
+                client.keydown(pygame.K_RETURN)
+            client.update()
+            next_time += main.SIM_DT
+            await asyncio.sleep(max(0.0, next_time - loop.time()))
+        # A live client would keep sending; resend the tail until the server
+        # has it, or a lost last packet leaves an input predicted forever
+        while client.inputs and loop.time() < next_time + 1.0:
+            client.send_inputs()
+            await asyncio.sleep(main.SIM_DT)
+
+    start = time.perf_counter()
+    await asyncio.gather(server.run(ticks + main.SIM_HZ), *(drive(c) for c in clients))
+    # Let the last snapshots land, then compare what each client shows
+    await asyncio.sleep(latency + jitter + 2 * SNAPSHOT_EVERY * main.SIM_DT)
+    elapsed = time.perf_counter() - start
+    truth = capture(server.game, server.level_ticks)
+    print(f"{ticks} ticks over {elapsed:.1f}s, latency {latency * 1000:.0f} ms +{jitter * 1000:.0f} ms, "
+          f"loss {loss:.0%}; server state {truth[:3]}")
+    print(f"server -> clients: {server.link.sent / elapsed / len(clients):.0f} B/s per client "
+          f"({server.link.sent / max(server.link.packets, 1):.1f} B/snapshot)")
+    in_sync = True
+    for client in clients:
+        shown = capture(client.game, client.level_ticks)
+        in_sync &= shown == truth
+        print(f"{client.role}: sends {client.link.sent / elapsed:.0f} B/s, {client.corrections} corrections, "
+              f"{'in sync' if shown == truth else 'OUT OF SYNC'}")
+    return in_sync
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    def option(name, default):
+        return type(default)(args[args.index(name) + 1]) if name in args else default
+
+    if args[:1] == ["server"]:
+        async def serve():
+            server = await start_server(option("--level", 1), option("--port", PORT))
+            print(f"serving level {server.level} on UDP port {option('--port', PORT)}")
+            await server.run()
+        asyncio.run(serve())
+    elif args[:1] == ["loopback"]:
+        ok = asyncio.run(loopback(option("--latency", 80.0) / 1000, option("--jitter", 20.0) / 1000,
+                                  option("--loss", 0.05), option("--seconds", 20.0)))
+        sys.exit(0 if ok else 1)
+    else:
+        print(__doc__)
+        sys.exit(1)
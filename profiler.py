@@ -0,0 +1,145 @@
+"""Frame profiler: per-phase timings, on-screen overlay, CSV / Chrome trace export.
+
+Enable with `python main.py --profile`. In game:
+    F3  toggle the timing overlay
+    F4  write profile-<time>.csv and profile-<time>.json (open the JSON in
+        chrome://tracing or https://ui.perfetto.dev)
+
+main() times each frame's top-level phases (events, update, draw, present,
+idle) and Game adds sub-spans (update.players, update.deactivators,
+update.guards, draw.walls, draw.entities, draw.guards, draw.instructions,
+draw.hud). The last `capacity` frames are kept in a ring buffer.
+"""
+import json
+import time
+from collections import deque
+
+import pygame
+
+import main
+
+OVERLAY_PHASES = ["events", "update", "update.players", "update.deactivators", "update.guards",
+                  "draw", "draw.walls", "draw.entities", "draw.guards", "draw.instructions", "draw.hud",
+                  "present", "idle"]
+OVERLAY_WINDOW = 120       # frames averaged in the overlay
+OVERLAY_REFRESH = 15       # frames between overlay text refreshes
+OVERLAY_POS = (10, main.HUD_OFFSET + 10)
+
+
+class FrameProfiler:
+    """Same begin()/end() interface as main.NullProfiler, but records spans."""
+    def __init__(self, capacity=600, pacing=None):
+        self.frames = deque(maxlen=capacity) # (frame start, duration, [(name, depth, start, duration)])
+        self.pacing = pacing # main.FramePacing of the frame scheduler, shown in the overlay
+        self.spans = None
+        self.stack = []
+        self.frame_start = 0.0
+        self.frame_count = 0
+        self.overlay_visible = False
+        self.overlay = None
+
+    # Recording
+    def begin_frame(self):
+        self.frame_start = time.perf_counter()
+        self.spans = []
+        self.stack = []
+
+    def end_frame(self):
+        now = time.perf_counter()
+        self.frames.append((self.frame_start, now - self.frame_start, self.spans))
+        self.frame_count += 1
+
+    def begin(self, name):
+        if self.spans is None:
+            return # outside a frame
+        self.stack.append((name, time.perf_counter()))
+
+    def end(self):
+        if not self.stack:
+            return
+        name, start = self.stack.pop()
+        self.spans.append((name, len(self.stack), start - self.frame_start, time.perf_counter() - start))
+
+    # Reporting
+    def phase_stats(self, window=OVERLAY_WINDOW):
+        """{phase: (mean ms per frame, max ms)} over the last `window` frames.
+        Phases that run several times in a frame (update) are summed per frame."""
+        frames = list(self.frames)[-window:]
+        totals = {}
+        for _, _, spans in frames:
+            per_frame = {}
+            for name, _, _, duration in spans:
+                per_frame[name] = per_frame.get(name, 0.0) + duration
+            for name, duration in per_frame.items():
+                totals.setdefault(name, []).append(duration)
+        n = max(len(frames), 1)
+        return {name: (sum(v) / n * 1000, max(v) * 1000) for name, v in totals.items()}
+
+    def frame_stats(self, window=OVERLAY_WINDOW):
+        durations = [d for _, d, _ in list(self.frames)[-window:]]
+        if not durations:
+            return 0.0, 0.0
+        return sum(durations) / len(durations) * 1000, max(durations) * 1000
+
+    def export_csv(self, path):
+        with open(path, "w") as f:
+            f.write("frame,phase,depth,start_ms,duration_ms\n")
+            first = len(self.frames) and self.frames[0][0]
+            for i, (frame_start, duration, spans) in enumerate(self.frames):
+                f.write(f"{i},frame,0,{(frame_start - first) * 1000:.4f},{duration * 1000:.4f}\n")
+                for name, depth, start, span_duration in spans:
+                    f.write(f"{i},{name},{depth + 1},{(frame_start - first + start) * 1000:.4f},{span_duration * 1000:.4f}\n")
+
+    def export_chrome_trace(self, path):
+        """Trace Event Format ("X" complete events, microseconds)."""
+        events = []
+        first = len(self.frames) and self.frames[0][0]
+        for i, (frame_start, duration, spans) in enumerate(self.frames):
+            base = (frame_start - first) * 1e6
+            events.append({"name": "frame", "ph": "X", "ts": base, "dur": duration * 1e6,
+                           "pid": 1, "tid": 1, "args": {"frame": i}})
+            for name, _, start, span_duration in spans:
+                events.append({"name": name, "ph": "X", "ts": base + start * 1e6, "dur": span_duration * 1e6,
+                               "pid": 1, "tid": 1})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def export(self, stem=None):
+        stem = stem or time.strftime("profile-%Y%m%d-%H%M%S")
+        self.export_csv(stem + ".csv")
+        self.export_chrome_trace(stem + ".json")
+        return stem
+
+    # Overlay
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_F3:
+            self.overlay_visible = not self.overlay_visible
+        elif event.key == pygame.K_F4:
+            print(f"Profile written to {self.export()}.csv/.json")
+
+    def build_overlay(self):
+        stats = self.phase_stats()
+        mean, worst = self.frame_stats()
+        lines = [f"frame {mean:6.2f} ms (max {worst:6.2f})  {1000 / mean if mean else 0:5.1f} fps"]
+        if self.pacing:
+            pace = self.pacing.stats()
+            lines.append(f"pacing p95 {pace['p95_ms']:5.1f} ms  jank {pace['jank']}  busy {pace['busy']:4.0%}")
+        for name in OVERLAY_PHASES:
+            if name in stats:
+                avg, peak = stats[name]
+                indent = "  " if "." in name else ""
+                lines.append(f"{indent}{name:<22}{avg:6.2f} {peak:6.2f}")
+        # Numbers change every refresh, so render directly instead of through text_cache
+        texts = [main.font_small.render(line, True, main.C_TEXT) for line in lines]
+        width = max(t.get_width() for t in texts) + 20
+        height = len(texts) * 20 + 16
+        return main.compose_panel((width, height), (0, 0, 0, 190), main.C_TUTORIAL_BORDER,
+                                  [(t, (10, 8 + i * 20)) for i, t in enumerate(texts)])
+
+    def draw_overlay(self, surface):
+        """Paint the overlay, returning the rect it covers."""
+        if self.overlay is None or self.frame_count % OVERLAY_REFRESH == 0:
+            self.overlay = self.build_overlay()
+        return surface.blit(self.overlay, OVERLAY_POS)
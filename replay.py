@@ -0,0 +1,227 @@
+"""Session recording and fast-forward replay.
+
+A recording is the per-tick stream of held keys plus the discrete inputs
+main() hands to Game (R, M, Enter, Shift+digit, menu level loads). Held
+keys are stored as a bitmask and run-length encoded, so an hour of play
+is a few kilobytes.
+
+File layout: MAGIC, format version, SIM_HZ, then a zlib-compressed stream
+of records made of unsigned varints:
+    OP_HOLD mask count   - `count` ticks with these keys held
+    OP_KEY  code         - keydown; low bits index KEYDOWN_KEYS, SHIFT_BIT if shift held
+    OP_LOAD level        - level loaded from the main menu
+
+Usage:
+    python main.py --record session.ddr
+    python replay.py play session.ddr             # max speed, no rendering
+    python replay.py play session.ddr --realtime  # watch it
+    python replay.py info session.ddr
+"""
+import sys
+import time
+import zlib
+
+import pygame
+
+import main
+
+MAGIC = b"DDRP"
+VERSION = 1
+
+OP_HOLD = 0
+OP_KEY = 1
+OP_LOAD = 2
+
+# Bit i of a held mask is HELD_KEYS[i]
+HELD_KEYS = [
+    pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d,
+    pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT,
+    pygame.K_r, pygame.K_m, pygame.K_RETURN, pygame.K_LSHIFT,
+]
+# Keydowns Game.handle_keydown reacts to
+KEYDOWN_KEYS = [pygame.K_r, pygame.K_m, pygame.K_RETURN, pygame.K_0, pygame.K_1, pygame.K_2, pygame.K_3]
+SHIFT_BIT = 0x80
+
+
+def mask_from_keys(keys):
+    mask = 0
+    for bit, key in enumerate(HELD_KEYS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+
+def keys_from_mask(mask):
+    return main.HeldKeys(key for bit, key in enumerate(HELD_KEYS) if mask >> bit & 1)
+
+
+def write_varint(buf, value):
+    while value >= 0x80:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class Recorder:
+    """Attach to Game.recorder; Game reports every tick, keydown and menu load."""
+    def __init__(self):
+        self.buf = bytearray()
+        self.mask = None
+        self.run = 0
+        self.ticks = 0
+
+    def _flush_run(self):
+        if self.run:
+            self.buf.append(OP_HOLD)
+            write_varint(self.buf, self.mask)
+            write_varint(self.buf, self.run)
+            self.run = 0
+
+    def on_tick(self, keys):
+        mask = mask_from_keys(keys)
+        if mask != self.mask:
+            self._flush_run()
+            self.mask = mask
+        self.run += 1
+        self.ticks += 1
+
+    def on_key(self, key, mods):
+        if key not in KEYDOWN_KEYS:
+            return # nothing in Game reacts to it
+        self._flush_run()
+        code = KEYDOWN_KEYS.index(key)
+        if mods & pygame.KMOD_SHIFT:
+            code |= SHIFT_BIT
+        self.buf.append(OP_KEY)
+        write_varint(self.buf, code)
+
+    def on_load(self, level_idx):
+        self._flush_run()
+        self.buf.append(OP_LOAD)
+        write_varint(self.buf, level_idx)
+
+    def to_bytes(self):
+        self._flush_run()
+        header = bytearray(MAGIC)
+        header.append(VERSION)
+        write_varint(header, main.SIM_HZ)
+        return bytes(header) + zlib.compress(bytes(self.buf), 9)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+
+class Replay:
+    """A decoded recording: a list of (op, value[, count]) records."""
+    def __init__(self, records, sim_hz):
+        self.records = records
+        self.sim_hz = sim_hz
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:4] != MAGIC:
+            raise ValueError("not a Duos & Don'ts recording")
+        if data[4] != VERSION:
+            raise ValueError(f"unsupported recording version {data[4]}")
+        sim_hz, pos = read_varint(data, 5)
+        body = zlib.decompress(data[pos:])
+        records = []
+        pos = 0
+        while pos < len(body):
+            op = body[pos]
+            value, pos = read_varint(body, pos + 1)
+            if op == OP_HOLD:
+                count, pos = read_varint(body, pos)
+                records.append((op, value, count))
+            elif op in (OP_KEY, OP_LOAD):
+                records.append((op, value))
+            else:
+                raise ValueError(f"corrupt recording: unknown op {op}")
+        return cls(records, sim_hz)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    @property
+    def ticks(self):
+        return sum(r[2] for r in self.records if r[0] == OP_HOLD)
+
+
+def play(replay, game=None, realtime=False, on_tick=None):
+    """Feed a recording into a Game.
+
+    realtime=False runs headless at maximum speed with rendering skipped;
+    realtime=True opens a window and plays back at SIM_HZ.
+    on_tick(game) runs after every simulated tick. Returns the game.
+    """
+    if replay.sim_hz != main.SIM_HZ:
+        raise ValueError(f"recorded at {replay.sim_hz} Hz, engine runs at {main.SIM_HZ} Hz")
+    source = main.ScriptedInput()
+    if game is None:
+        if realtime:
+            main.init_display()
+        game = main.Game(input_source=source, headless=not realtime)
+    else:
+        game.input = source
+
+    clock = pygame.time.Clock()
+    for record in replay.records:
+        op, value = record[0], record[1]
+        if op == OP_KEY:
+            mods = pygame.KMOD_SHIFT if value & SHIFT_BIT else 0
+            game.handle_keydown(KEYDOWN_KEYS[value & ~SHIFT_BIT], mods)
+        elif op == OP_LOAD:
+            game.load_level(value)
+        else:
+            source.held = keys_from_mask(value)
+            for _ in range(record[2]):
+                game.update()
+                if on_tick: on_tick(game)
+                if realtime:
+                    if pygame.event.peek(pygame.QUIT):
+                        return game
+                    game.draw()
+                    clock.tick(main.SIM_HZ)
+    return game
+
+
+def summary(game):
+    """Outcome fields worth diffing between engine versions."""
+    return {
+        "ticks": game.tick,
+        "state": game.state,
+        "level": game.current_level_idx,
+        "p1": tuple(game.p1.rect),
+        "p2": tuple(game.p2.rect),
+        "p1_has_key": game.p1_has_key,
+    }
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ("play", "info"):
+        print(__doc__)
+        sys.exit(1)
+    rec = Replay.load(args[1])
+    if args[0] == "info":
+        print(f"{len(rec.records)} records, {rec.ticks} ticks ({rec.ticks / rec.sim_hz:.1f}s at {rec.sim_hz} Hz)")
+    else:
+        start = time.perf_counter()
+        result = play(rec, realtime="--realtime" in args)
+        elapsed = time.perf_counter() - start
+        print(summary(result))
+        print(f"replayed {result.tick} ticks in {elapsed:.2f}s")
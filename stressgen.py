@@ -0,0 +1,211 @@
+"""Procedural stress levels for scaling tests.
+
+generate() builds a random level file (the JSON shape in levels/) from a
+seed and entity counts; stress_level() returns it compiled, in the shape
+get_levels() returns, ready for Game.levels.append() + Game.load_level().
+The same seed and counts always give the same level.
+
+Walls go on both sides of the divider, guards patrol or sweep on P1's side,
+and real and fake switches sit on P2's side. A walk search over each side
+checks the layout: the key, the chest and every switch are placed only
+where that player can walk to (guards aside, they can be switched off).
+
+Usage:
+    python stressgen.py --seed 3 --guards 200 --walls 80            # print JSON
+    python stressgen.py --seed 3 --guards 200 --out levels/90-stress.json
+Other counts: --switches N (real, one guard link each), --fakes N.
+"""
+import json
+import random
+import sys
+
+import pygame
+
+import leveldata
+import main
+
+P1_START = (50, 50)
+P2_START = (750, 50)
+DIVIDER = (635, 645)       # x range of the centre wall (base_walls)
+PLAYER_SIZE = 32
+ITEM_SIZE = 40             # key, chest and switch rects
+WALK_STEP = 10             # walk search lattice (px); below the thinnest wall
+WALL_THICKNESS = 20
+WALL_LENGTH = (40, 200)
+START_CLEARANCE = 40       # walls keep this far from the start positions
+GUARD_CLEARANCE = 150      # guard bodies keep this far from P1's start
+MIN_ROOM = 200             # reachable walk positions a side needs, else reroll the walls
+MAX_ATTEMPTS = 100
+
+# Guard parameters, picked uniformly (same ranges as bench.crowd_level)
+GUARD_SPEEDS = [0, 6, 12]
+GUARD_FOVS = [45, 60, 90]
+GUARD_LENGTHS = [100, 150, 200]
+GUARD_SWEEPS = [0, 2.5, 5]
+
+
+def walkable(start, blocked, size=PLAYER_SIZE, step=WALK_STEP):
+    """{top-left: steps from start} for every lattice position a size x size
+    player can walk to from start without touching a blocked rect.
+
+    Players move 5 px at a time, and two free positions `step` apart along
+    one axis have every position between them free as well, so each lattice
+    path is walkable in game."""
+    def free(pos):
+        return pygame.Rect(pos, (size, size)).collidelist(blocked) == -1
+
+    if not free(start):
+        return {}
+    dist = {start: 0}
+    frontier = [start]
+    while frontier:
+        nxt = []
+        for x, y in frontier:
+            for pos in ((x + step, y), (x - step, y), (x, y + step), (x, y - step)):
+                if pos not in dist and free(pos):
+                    dist[pos] = dist[(x, y)] + 1
+                    nxt.append(pos)
+        frontier = nxt
+    return dist
+
+def _placements(reach, blocked, taken, rng, count, what):
+    """Pick `count` ITEM_SIZE rects at walkable positions that touch no wall
+    and overlap nothing in `taken` (which they are added to)."""
+    spots = [p for p in reach if pygame.Rect(p, (ITEM_SIZE, ITEM_SIZE)).collidelist(blocked) == -1]
+    rng.shuffle(spots)
+    chosen = []
+    for pos in spots:
+        if len(chosen) == count:
+            break
+        rect = pygame.Rect(pos, (ITEM_SIZE, ITEM_SIZE))
+        if rect.inflate(20, 20).collidelist(taken) == -1:
+            taken.append(rect)
+            chosen.append(pos)
+    if len(chosen) < count:
+        raise ValueError(f"no room for {count} {what} (placed {len(chosen)})")
+    return chosen
+
+def _wall(rng, x_range, height, keep_clear):
+    """A random bar inside x_range that stays off the start positions."""
+    while True:
+        length = rng.randint(*WALL_LENGTH)
+        w, h = rng.choice([(length, WALL_THICKNESS), (WALL_THICKNESS, length)])
+        x = rng.randint(x_range[0], max(x_range[0], x_range[1] - w))
+        y = rng.randint(10, height - 10 - h)
+        if pygame.Rect(x, y, w, h).collidelist(keep_clear) == -1:
+            return [x, y, w, h]
+
+def _patrol(rng, start, reach, p1_center):
+    """Back-and-forth path of 1-3 straight legs over walkable ground."""
+    points = [start]
+    pos = start
+    for _ in range(rng.randint(1, 3)):
+        dx, dy = rng.choice([(WALK_STEP, 0), (-WALK_STEP, 0), (0, WALK_STEP), (0, -WALK_STEP)])
+        for _ in range(rng.randint(5, 40)):
+            nxt = (pos[0] + dx, pos[1] + dy)
+            if nxt not in reach or _near(nxt, p1_center):
+                break
+            pos = nxt
+        if pos != points[-1]:
+            points.append(pos)
+    # PatrolPath closes the loop last -> first, so walk the legs back
+    return points + points[-2:0:-1]
+
+def _near(pos, p1_center):
+    half = PLAYER_SIZE // 2
+    return (pos[0] + half - p1_center[0]) ** 2 + (pos[1] + half - p1_center[1]) ** 2 < GUARD_CLEARANCE ** 2
+
+def generate(seed=0, guards=16, walls=32, switches=4, fakes=2, settings=None):
+    """A random, validated level file dict (raw map coordinates)."""
+    settings = settings or main.LEVEL_SETTINGS
+    width, screen_height = settings["screen"]
+    hud = settings["hud_offset"]
+    height = screen_height - hud # play area, raw coordinates
+    rng = random.Random(seed)
+    sides = [(10, DIVIDER[0]), (DIVIDER[1], width - 10)]
+    keep_clear = [pygame.Rect(p, (PLAYER_SIZE, PLAYER_SIZE)).inflate(2 * START_CLEARANCE, 2 * START_CLEARANCE)
+                  for p in (P1_START, P2_START)]
+
+    level = {
+        "name": f"Stress {seed}: {guards} guards, {walls} walls",
+        "briefing_p1": ["Generated stress level.", "", f"Seed {seed}"],
+        "briefing_p2": [f"{switches} real switches, {fakes} fake."],
+        "p1_start": list(P1_START),
+        "p2_start": list(P2_START),
+        "key": [0, 0, ITEM_SIZE, ITEM_SIZE],
+        "chest": [0, 0, ITEM_SIZE, ITEM_SIZE],
+        "base_walls": True,
+    }
+    error = "walkable area too small"
+    for _ in range(MAX_ATTEMPTS):
+        # Half the walls on each side of the divider
+        level["walls"] = [_wall(rng, sides[i % 2], height, keep_clear) for i in range(walls)]
+        # The compiler adds the border and divider; walk in raw coordinates
+        blocked = [pygame.Rect(x, y - hud, w, h) for x, y, w, h in leveldata.compile_level(level, settings)["walls"]]
+        p1_reach = walkable(P1_START, blocked)
+        p2_reach = walkable(P2_START, blocked)
+        if len(p1_reach) < MIN_ROOM or len(p2_reach) < MIN_ROOM:
+            continue
+        try:
+            # Key in the far third of P1's reachable area, chest anywhere else
+            taken = [pygame.Rect(p, (PLAYER_SIZE, PLAYER_SIZE)) for p in (P1_START, P2_START)]
+            order = sorted(p1_reach, key=p1_reach.get)
+            (key,) = _placements(order[len(order) * 2 // 3:], blocked, taken, rng, 1, "key")
+            (chest,) = _placements(order, blocked, taken, rng, 1, "chest")
+            spots = _placements(sorted(p2_reach), blocked, taken, rng, switches + fakes, "switches")
+            break
+        except ValueError as e:
+            error = e # walls boxed in too much; reroll them
+    else:
+        raise ValueError(f"seed {seed}: no layout with {walls} walls fits in {MAX_ATTEMPTS} attempts ({error})")
+    level["key"] = [key[0], key[1], ITEM_SIZE, ITEM_SIZE]
+    level["chest"] = [chest[0], chest[1], ITEM_SIZE, ITEM_SIZE]
+
+    # Switches: link ids 1..switches are real, fakes get ids no guard uses
+    level["deactivators"] = [{"x": x, "y": y, "id": i + 1, "color": "guard"} for i, (x, y) in enumerate(spots)]
+    for d in level["deactivators"][switches:]:
+        d["fake"] = True
+
+    p1_center = (P1_START[0] + PLAYER_SIZE // 2, P1_START[1] + PLAYER_SIZE // 2)
+    posts = [p for p in order if not _near(p, p1_center)]
+    level["guards"] = []
+    for _ in range(guards):
+        start = rng.choice(posts)
+        speed = rng.choice(GUARD_SPEEDS)
+        path = _patrol(rng, start, p1_reach, p1_center) if speed else [start]
+        level["guards"].append({"path": [list(p) for p in path], "angle": rng.randint(0, 359),
+                                "id": rng.randint(1, max(switches, 1)), "speed": speed if len(path) > 1 else 0,
+                                "fov": rng.choice(GUARD_FOVS), "len": rng.choice(GUARD_LENGTHS),
+                                "sweep_speed": rng.choice(GUARD_SWEEPS)})
+    return level
+
+def dumps(level):
+    """JSON laid out like the hand-written level files: one wall, guard or
+    switch per line."""
+    lines = []
+    for name, value in level.items():
+        if isinstance(value, list) and value and isinstance(value[0], (list, dict)):
+            items = ",\n".join("    " + json.dumps(v) for v in value)
+            lines.append(f"  {json.dumps(name)}: [\n{items}\n  ]")
+        else:
+            lines.append(f"  {json.dumps(name)}: {json.dumps(value)}")
+    return "{\n" + ",\n".join(lines) + "\n}\n"
+
+def stress_level(seed=0, settings=None, **counts):
+    """generate() compiled into an engine level dict (see generate for counts)."""
+    settings = settings or main.LEVEL_SETTINGS
+    return leveldata.compile_level(generate(seed, settings=settings, **counts), settings, where=f"stress-{seed}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    def option(name, default):
+        return int(args[args.index(name) + 1]) if name in args else default
+    raw = generate(seed=option("--seed", 0), guards=option("--guards", 16), walls=option("--walls", 32),
+                   switches=option("--switches", 4), fakes=option("--fakes", 2))
+    text = dumps(raw)
+    if "--out" in args:
+        with open(args[args.index("--out") + 1], "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
@@ -0,0 +1,237 @@
+"""Session telemetry: timestamped gameplay events in a compact rotating log.
+
+Game calls emit(tick, kind, a, b) from inside update() when game.telemetry
+is set. That stores one tuple in a preallocated ring buffer and returns;
+nothing is encoded or written on the game's side. A flusher (a daemon
+thread, or an asyncio task where threads are unavailable, e.g. the web
+build) wakes every FLUSH_INTERVAL seconds, encodes what is new and appends
+it to the log in one write. If the flusher falls a whole ring behind, the
+oldest events are dropped and counted, never waited for.
+
+Events (a, b):
+    level     level index          -      a level was loaded
+    restart   level index          -      R pressed
+    complete  level index          -      chest reached
+    respawn   guard row            had key  P1 spotted
+    key       -                    -      key picked up
+    key_drop  -                    -      key lost on a respawn
+    switch / fake / trap / cure  switch index  -  P2 stepped on a switch
+    frozen    -                    -      P1 frozen by a trap
+    thawed    ticks frozen         -      P1 free again (cure, respawn), or the
+                                          freeze ended by a restart, level change or quit
+    stage     stage index          -      stage progression (zones)
+
+File layout: MAGIC, version, SIM_HZ, session start (unix seconds), then
+batches of varint-length-prefixed records. Each record is
+kind, tick delta, a, b as varints (a and b zigzag), and the first record
+of a batch carries an absolute tick. A cut-off last batch (crash) is
+ignored by the reader. When a file passes max_bytes it is rotated like
+logging.RotatingFileHandler: log -> log.1 -> log.2 ..., keeping `backups`.
+
+Usage:
+    python main.py --telemetry session.ddt
+    python telemetry.py dump session.ddt       # one event per line
+    python telemetry.py summary session.ddt    # per-level counts and frozen time
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import main
+from replay import read_varint, write_varint
+
+MAGIC = b"DDTL"
+VERSION = 1
+KINDS = ("level", "restart", "complete", "respawn", "key", "key_drop",
+         "switch", "fake", "trap", "cure", "frozen", "thawed", "stage")
+CODES = {kind: code for code, kind in enumerate(KINDS)}
+CAPACITY = 4096        # ring slots; a power of two
+FLUSH_INTERVAL = 0.5   # seconds
+MAX_BYTES = 1 << 20    # rotate past this
+BACKUPS = 5
+
+
+def zigzag(n):
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+def unzigzag(n):
+    return -((n + 1) >> 1) if n & 1 else n >> 1
+
+class Telemetry:
+    """Attach to Game.telemetry, then start(); close() on exit."""
+    def __init__(self, path, capacity=CAPACITY, max_bytes=MAX_BYTES, backups=BACKUPS):
+        if capacity & (capacity - 1):
+            raise ValueError("capacity must be a power of two")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.slots = [None] * capacity
+        self.mask = capacity - 1
+        self.head = 0    # events emitted (the game's side writes only this)
+        self.tail = 0    # events flushed (the flusher's side writes only this)
+        self.dropped = 0
+        self.errors = 0  # failed writes; telemetry never raises into the game
+        self.started = time.time()
+        self.file = None
+        self.stop = threading.Event()
+        self.worker = None
+
+    def emit(self, tick, kind, a=0, b=0):
+        head = self.head
+        self.slots[head & self.mask] = (kind, tick, a, b)
+        self.head = head + 1
+
+    def start(self):
+        """Flush in the background: a thread, or a task on the running
+        asyncio loop where threads aren't available."""
+        if sys.platform == "emscripten":
+            self.worker = asyncio.get_running_loop().create_task(self.run_async())
+        else:
+            self.worker = threading.Thread(target=self.run, name="telemetry", daemon=True)
+            self.worker.start()
+
+    def run(self):
+        while not self.stop.wait(FLUSH_INTERVAL):
+            self.flush()
+
+    async def run_async(self):
+        while not self.stop.is_set():
+            await asyncio.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def close(self):
+        """Stop the flusher and write everything left."""
+        self.stop.set()
+        if isinstance(self.worker, threading.Thread):
+            self.worker.join()
+        elif self.worker is not None:
+            self.worker.cancel()
+        self.flush()
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def take(self):
+        """Events emitted since the last call, oldest first."""
+        head, tail = self.head, self.tail
+        capacity = self.mask + 1
+        if head - tail > capacity:
+            self.dropped += head - tail - capacity
+            tail = head - capacity
+        events = [self.slots[i & self.mask] for i in range(tail, head)]
+        # emit() may have lapped the ring during the copy; it fills a slot
+        # before moving head, so the slot for index self.head may be new too
+        overwritten = min(self.head + 1 - capacity - tail, len(events))
+        if overwritten > 0:
+            self.dropped += overwritten
+            del events[:overwritten]
+        self.tail = head
+        return events
+
+    def encode(self, events):
+        body = bytearray()
+        last = 0
+        for kind, tick, a, b in events:
+            write_varint(body, CODES[kind])
+            write_varint(body, zigzag(tick - last))
+            write_varint(body, zigzag(a))
+            write_varint(body, zigzag(b))
+            last = tick
+        batch = bytearray()
+        write_varint(batch, len(body))
+        return bytes(batch + body)
+
+    def flush(self):
+        events = self.take()
+        if not events:
+            return
+        try:
+            data = self.encode(events)
+            if self.file is None:
+                self.open()
+            elif self.file.tell() + len(data) > self.max_bytes:
+                self.rotate()
+            self.file.write(data)
+            self.file.flush()
+        except OSError:
+            self.errors += 1
+
+    def open(self):
+        self.file = open(self.path, "ab")
+        if self.file.tell() == 0:
+            header = bytearray(MAGIC)
+            header.append(VERSION)
+            write_varint(header, main.SIM_HZ)
+            write_varint(header, int(self.started))
+            self.file.write(header)
+
+    def rotate(self):
+        self.file.close()
+        for n in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{n}"):
+                os.replace(f"{self.path}.{n}", f"{self.path}.{n + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.open()
+
+def read(path):
+    """(header dict, [(kind, tick, a, b)]) from one log file."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != MAGIC:
+        raise ValueError("not a Duos & Don'ts telemetry log")
+    if data[4] != VERSION:
+        raise ValueError(f"unsupported telemetry version {data[4]}")
+    sim_hz, pos = read_varint(data, 5)
+    started, pos = read_varint(data, pos)
+    events = []
+    while pos < len(data):
+        try:
+            size, start = read_varint(data, pos)
+        except IndexError:
+            break
+        if start + size > len(data):
+            break # cut off mid-batch
+        pos, tick = start, 0
+        while pos < start + size:
+            code, pos = read_varint(data, pos)
+            delta, pos = read_varint(data, pos)
+            a, pos = read_varint(data, pos)
+            b, pos = read_varint(data, pos)
+            tick += unzigzag(delta)
+            events.append((KINDS[code], tick, unzigzag(a), unzigzag(b)))
+    return {"sim_hz": sim_hz, "started": started}, events
+
+def summary(events, sim_hz):
+    """Per-level totals: {level: {kind: count, "frozen_s": seconds}}."""
+    levels = {}
+    level = None
+    for kind, tick, a, b in events:
+        if kind == "level":
+            level = a
+        totals = levels.setdefault(level, {"frozen_s": 0.0})
+        totals[kind] = totals.get(kind, 0) + 1
+        if kind == "thawed":
+            totals["frozen_s"] += a / sim_hz
+    return levels
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ("dump", "summary"):
+        print(__doc__)
+        sys.exit(1)
+    header, events = read(args[1])
+    hz = header["sim_hz"]
+    if args[0] == "dump":
+        print(f"session started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(header['started']))}, {hz} Hz")
+        for kind, tick, a, b in events:
+            print(f"{tick / hz:9.2f}s  {kind:9} {a} {b}")
+    else:
+        for level, totals in summary(events, hz).items():
+            counts = ", ".join(f"{k} {v}" for k, v in totals.items() if k != "frozen_s")
+            print(f"level {level}: {counts}; frozen {totals['frozen_s']:.1f}s")
@@ -0,0 +1,34 @@
+import autoplay
+import batch
+import main
+import replay
+
+
+class Session:
+    """Just enough of a Game for replay.play: every tick is a respawn and
+    a trap, and load_level starts a new attempt at zero."""
+    def __init__(self):
+        self.load_level(0)
+
+    def load_level(self, idx):
+        self.p1 = object()
+        self.respawns = self.trap_triggers = 0
+
+    def update(self):
+        self.respawns += 1
+        self.trap_triggers += 1
+
+
+def test_replay_totals_count_every_attempt():
+    records = [(replay.OP_HOLD, 0, 3), (replay.OP_LOAD, 0), (replay.OP_HOLD, 0, 2), (replay.OP_LOAD, 1)]
+    assert batch._replay_totals(Session(), replay.Replay(records, main.SIM_HZ)) == (5, 5)
+
+
+def test_autoplay_gives_up_at_the_time_limit():
+    report = autoplay.solve_level(0, main.Game(headless=True), time_limit=0)
+    assert not report["solved"] and report["timed_out"]
+
+
+def test_unsolved_autoplay_episode():
+    result = batch.run_episode({"level": 0, "time_limit": 0})
+    assert result["outcome"] == "UNSOLVED" and result["ticks"] == 0
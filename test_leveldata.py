@@ -0,0 +1,55 @@
+import os
+import shutil
+
+import pytest
+
+import leveldata
+import main
+
+
+@pytest.fixture
+def level_file(tmp_path):
+    path = tmp_path / "01-easy.json"
+    shutil.copy(os.path.join(main.LEVEL_DIR, "01-easy.json"), path)
+    return str(path)
+
+
+def test_compiled_cache_round_trip(level_file, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    compiled = leveldata.load_level(level_file, main.LEVEL_SETTINGS, cache_dir)
+    assert os.listdir(cache_dir) == ["01-easy.lvl"]
+
+    def compile_level(*args, **kwargs):
+        raise AssertionError("recompiled a cached level")
+    monkeypatch.setattr(leveldata, "compile_level", compile_level)
+    assert leveldata.load_level(level_file, main.LEVEL_SETTINGS, cache_dir) == compiled
+
+
+def test_stale_or_corrupt_cache_recompiles(level_file, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    settings = main.LEVEL_SETTINGS
+    compiled = leveldata.load_level(level_file, settings, cache_dir)
+    cache_path = os.path.join(cache_dir, "01-easy.lvl")
+
+    with open(cache_path, "rb") as f:
+        blob = f.read()
+    with open(cache_path, "wb") as f:
+        f.write(blob[:-8] + b"\xff" * 8)
+    assert leveldata.load_level(level_file, settings, cache_dir) == compiled
+    with open(cache_path, "rb") as f:
+        assert f.read() == blob # rewritten
+
+    # Layout settings are part of the key
+    moved = dict(settings, hud_offset=settings["hud_offset"] + 10)
+    assert leveldata.load_level(level_file, moved, cache_dir)["p1_start"][1] == compiled["p1_start"][1] + 10
+    with open(cache_path, "rb") as f:
+        assert f.read() != blob
+
+
+def test_malformed_level_names_the_field(level_file):
+    with open(level_file) as f:
+        source = f.read()
+    with open(level_file, "w") as f:
+        f.write(source.replace('"fov"', '"fvo"', 1))
+    with pytest.raises(leveldata.LevelError, match=r"guards\[0\]"):
+        leveldata.load_level(level_file, main.LEVEL_SETTINGS)
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import pygame
+import pytest
+
+import main
+
+
+def idle_frames(scheduler, count):
+    async def run():
+        for _ in range(count):
+            await scheduler.next_frame()
+    asyncio.run(run())
+
+
+def test_idle_wait_keeps_posted_events_intact(display):
+    scheduler = main.DesktopScheduler()
+    scheduler.idle = True
+    idle_frames(scheduler, 1)
+    pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(640, 365), button=1))
+    idle_frames(scheduler, 5)
+    # An attribute dict freed while still queued gets reused by new dicts
+    reuse = [{"x": i, "y": i, "path": i} for i in range(10000)]
+    [event] = pygame.event.get(pygame.MOUSEBUTTONDOWN)
+    assert event.pos == (640, 365) and event.button == 1
+
+
+def test_idle_wait_wakes_early_on_input(display):
+    for scheduler in (main.DesktopScheduler(), main.WebScheduler()):
+        scheduler.idle = True
+        idle_frames(scheduler, 1)
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN, mod=0))
+        start = time.perf_counter()
+        idle_frames(scheduler, 3)
+        assert time.perf_counter() - start < 1.0 / main.IDLE_FPS
+        [event] = pygame.event.get(pygame.KEYDOWN)
+        assert event.key == pygame.K_RETURN
+        assert scheduler.pacing.idle == 4 and not scheduler.pacing.intervals
+
+
+def test_idle_frames_run_at_idle_rate(display):
+    scheduler = main.DesktopScheduler()
+    scheduler.idle = True
+    idle_frames(scheduler, 1)
+    start = time.perf_counter()
+    idle_frames(scheduler, 3)
+    assert time.perf_counter() - start >= 2.5 / main.IDLE_FPS
+
+
+def test_guards_see_with_the_cone_they_draw():
+    # angle 29 draws the 28 degree sprite; rays at 58-59 degrees are
+    # inside the exact 60 degree cone but outside the drawn one
+    guard = main.Guard(100, 300, None, 29, 1, fov=60, vision_len=180)
+    cx, cy = guard.rect.center
+    assert main.snap_angle(29) == 28
+    assert not guard.store.sees(0, pygame.Rect(cx + 52, cy - 86, 1, 1))
+    assert guard.store.sees(0, pygame.Rect(cx + 52, cy - 80, 1, 1))
+    guard.store.angle[0] = 30
+    assert guard.store.sees(0, pygame.Rect(cx + 52, cy - 86, 1, 1))
+
+
+def test_fire_flickers_under_web_scheduler(display):
+    # The browser build only waits through WebScheduler, which never ticks
+    # a pygame Clock
+    scheduler = main.WebScheduler()
+    frames = set()
+    async def run():
+        end = time.perf_counter() + 0.35
+        while time.perf_counter() < end:
+            await scheduler.next_frame()
+            frames.add(main.flicker_frame())
+    asyncio.run(run())
+    assert len(frames) > 1
+
+
+def test_networked_sessions_are_not_recorded():
+    with pytest.raises(ValueError):
+        asyncio.run(main.main(record_path="session.ddr", connect="localhost"))
@@ -0,0 +1,111 @@
+import pygame
+import pytest
+
+import main
+import netplay
+from replay import write_varint
+from netplay import ENTER, INPUT_WINDOW, LEFT, UP
+
+
+def test_input_packet_round_trip():
+    inputs = [(5, UP), (6, UP), (7, UP | LEFT), (8, 0), (9, 0)]
+    role, snap_ack, seq, runs = netplay.decode_input(netplay.encode_input(1, 42, inputs))
+    assert (role, snap_ack, seq) == (1, 42, 5)
+    assert runs == [(UP, 2), (UP | LEFT, 1), (0, 2)]
+
+
+@pytest.mark.parametrize("packet", [
+    b"",
+    bytes([netplay.MSG_SNAPSHOT, 0, 0, 1, UP, 1]),      # wrong type
+    bytes([netplay.MSG_INPUT, 2, 0, 1, UP, 1]),         # no such role
+    bytes([netplay.MSG_INPUT, 0, 0, 1, UP]),            # cut off mid-run
+    bytes([netplay.MSG_INPUT, 0, 0x80]),                # cut off mid-varint
+    bytes([netplay.MSG_INPUT, 0, 0, 1]),                # no inputs
+    bytes([netplay.MSG_INPUT, 0, 0, 1, 0x80, 1]),       # unknown mask bit
+])
+def test_malformed_input_packets_are_rejected(packet):
+    with pytest.raises(ValueError):
+        netplay.decode_input(packet)
+
+def test_input_runs_are_bounded():
+    packet = bytearray([netplay.MSG_INPUT, 0, 0, 1, UP])
+    write_varint(packet, 1 << 40)
+    with pytest.raises(ValueError):
+        netplay.decode_input(bytes(packet))
+    ok = netplay.encode_input(0, 0, [(n, UP) for n in range(1, INPUT_WINDOW + 1)])
+    assert netplay.decode_input(ok)[3] == [(UP, INPUT_WINDOW)]
+
+
+def test_snapshot_full_and_delta_round_trip():
+    base = [2, 1, 300, 115, 675, -4, 0, 7]
+    fields = [2, 1, 302, 117, 675, -9, 0, 7]
+    full = netplay.encode_snapshot(1, 0, None, base, 3)
+    assert netplay.decode_snapshot(full, {}) == (1, 3, base)
+    delta = netplay.encode_snapshot(2, 1, base, fields, 4)
+    assert len(delta) < len(full)
+    assert netplay.decode_snapshot(delta, {1: base}) == (2, 4, fields)
+    assert netplay.decode_snapshot(delta, {}) is None # baseline gone
+
+
+def test_capture_apply_round_trip():
+    server, client = main.Game(headless=True), main.Game(headless=True)
+    server.load_level(1)
+    server.state = "PLAYING"
+    server.input.set_keys({pygame.K_d, pygame.K_UP})
+    for _ in range(30):
+        server.update()
+    fields = netplay.capture(server, 30)
+    assert netplay.apply(client, fields) == 30
+    assert netplay.capture(client, 30) == fields
+
+
+class Sent:
+    """Transport that keeps what the server sends."""
+    def __init__(self):
+        self.datagrams = []
+    def is_closing(self):
+        return False
+    def sendto(self, data, addr):
+        self.datagrams.append((data, addr))
+
+@pytest.fixture
+def server():
+    server = netplay.Server(level=1)
+    server.connection_made(Sent())
+    return server
+
+def send(server, addr, seq, masks, role=0):
+    server.datagram_received(netplay.encode_input(role, 0, [(seq + i, m) for i, m in enumerate(masks)]), addr)
+
+def test_server_keeps_a_role_from_other_addresses(server):
+    send(server, ("10.0.0.1", 5000), 1, [UP])
+    send(server, ("10.0.0.2", 5000), 1, [ENTER])
+    peer = server.peers["p1"]
+    assert peer.addr == ("10.0.0.1", 5000) and peer.pending == {1: UP}
+
+def test_server_hands_a_silent_role_to_a_new_address(server):
+    send(server, ("10.0.0.1", 5000), 1, [UP])
+    server.peers["p1"].heard -= netplay.PEER_TIMEOUT + 1
+    send(server, ("10.0.0.2", 5000), 1, [LEFT])
+    peer = server.peers["p1"]
+    assert peer.addr == ("10.0.0.2", 5000) and peer.pending == {1: LEFT}
+
+def test_server_accepts_a_restarted_client(server):
+    addr = ("10.0.0.1", 5000)
+    for seq in range(1, 201):
+        send(server, addr, seq, [UP])
+        server.tick()
+    send(server, addr, 1, [LEFT]) # same address, counting from 1 again
+    assert server.peers["p1"].take() == LEFT
+
+def test_server_survives_truncated_packets(server):
+    server.datagram_received(bytes([netplay.MSG_INPUT, 0, 0x80]), ("10.0.0.1", 5000))
+    assert server.peers["p1"].addr is None
+
+
+def test_double_enter_does_not_skip_the_briefing(server):
+    server.game.state = "VICTORY"
+    send(server, ("10.0.0.1", 5000), 1, [ENTER], role=0)
+    send(server, ("10.0.0.2", 5000), 1, [ENTER], role=1)
+    server.tick()
+    assert server.game.state == "BRIEFING"
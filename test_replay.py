@@ -0,0 +1,58 @@
+import pygame
+import pytest
+
+import main
+import replay
+
+
+@pytest.mark.parametrize("value", [0, 1, 0x7F, 0x80, 0x3FFF, 0x4000, 1 << 35])
+def test_varint_round_trip(value):
+    buf = bytearray(b"\xff")
+    replay.write_varint(buf, value)
+    assert replay.read_varint(buf, 1) == (value, len(buf))
+
+
+def test_held_keys_are_run_length_encoded():
+    recorder = replay.Recorder()
+    for keys, ticks in [((pygame.K_d,), 30), ((pygame.K_d, pygame.K_UP), 1), ((), 500)]:
+        for _ in range(ticks):
+            recorder.on_tick(main.HeldKeys(keys))
+    recorder.on_key(pygame.K_r, 0)
+    recorder.on_key(pygame.K_x, 0) # nothing reacts to it: not recorded
+    recorder.on_key(pygame.K_2, pygame.KMOD_LSHIFT)
+    recorder.on_load(3)
+    recorder.on_tick(main.HeldKeys())
+
+    d, up = replay.mask_from_keys(main.HeldKeys([pygame.K_d])), replay.mask_from_keys(main.HeldKeys([pygame.K_UP]))
+    two = replay.KEYDOWN_KEYS.index(pygame.K_2) | replay.SHIFT_BIT
+    assert replay.Replay.from_bytes(recorder.to_bytes()).records == [
+        (replay.OP_HOLD, d, 30), (replay.OP_HOLD, d | up, 1), (replay.OP_HOLD, 0, 500),
+        (replay.OP_KEY, replay.KEYDOWN_KEYS.index(pygame.K_r)), (replay.OP_KEY, two),
+        (replay.OP_LOAD, 3), (replay.OP_HOLD, 0, 1)]
+
+
+def test_corrupt_recordings_are_rejected():
+    data = replay.Recorder().to_bytes()
+    with pytest.raises(ValueError):
+        replay.Replay.from_bytes(b"XXXX" + data[4:])
+    with pytest.raises(ValueError):
+        replay.Replay.from_bytes(data[:4] + bytes([replay.VERSION + 1]) + data[5:])
+
+
+def test_replay_reproduces_the_session():
+    source = main.ScriptedInput()
+    game = main.Game(input_source=source, headless=True)
+    game.recorder = replay.Recorder()
+    game.load_level(1)
+    game.handle_keydown(pygame.K_RETURN) # past the briefing
+    for keys, ticks in [((pygame.K_d, pygame.K_LEFT), 40), ((pygame.K_s,), 25), ((pygame.K_UP,), 30)]:
+        source.set_keys(keys)
+        for _ in range(ticks):
+            game.update()
+
+    copy = main.Game(headless=True)
+    copy.load_level(1)
+    replay.play(replay.Replay.from_bytes(game.recorder.to_bytes()), copy)
+    assert copy.state == game.state == "PLAYING"
+    assert copy.p1.rect == game.p1.rect and copy.p2.rect == game.p2.rect
+    assert copy.p1.rect.topleft != copy.p1.start_pos
@@ -0,0 +1,39 @@
+import telemetry
+
+
+class Lapping(list):
+    """Ring slots that let the game emit `burst` events just before the
+    flusher's first read, as if its thread ran during take()."""
+    def __init__(self, slots, log, burst):
+        super().__init__(slots)
+        self.log = log
+        self.burst = burst
+
+    def __getitem__(self, i):
+        while self.burst:
+            self.burst -= 1
+            self.log.emit(self.log.head, "key")
+        return super().__getitem__(i)
+
+
+def test_take_drops_events_overwritten_during_the_copy(tmp_path):
+    log = telemetry.Telemetry(str(tmp_path / "session.ddt"), capacity=8)
+    for tick in range(8):
+        log.emit(tick, "key")
+    log.slots = Lapping(log.slots, log, burst=2)
+    # Slots 0 and 1 now hold ticks 8 and 9; slot 2 may be next
+    assert [tick for _, tick, _, _ in log.take()] == [3, 4, 5, 6, 7]
+    assert log.dropped == 3
+    assert [tick for _, tick, _, _ in log.take()] == [8, 9]
+
+
+def test_flushed_log_reads_back(tmp_path):
+    path = str(tmp_path / "session.ddt")
+    log = telemetry.Telemetry(path)
+    log.emit(5, "level", 2)
+    log.emit(90, "respawn", 3, 1)
+    log.flush()
+    log.emit(91, "thawed", -4)
+    log.close()
+    header, events = telemetry.read(path)
+    assert events == [("level", 5, 2, 0), ("respawn", 90, 3, 1), ("thawed", 91, -4, 0)]
@@ -0,0 +1,148 @@
+"""Batched guard vision checks with NumPy.
+
+Guard.check_collision() tests one guard against one rect in Python. The
+functions here test every corner of every target rect against every guard in
+one vectorized pass, and accept any number of leading "episode" dimensions so
+many simulations can be checked together.
+
+The math mirrors Guard.check_collision exactly: body overlap is
+Rect.colliderect, distance is compared as an integer square (same result as
+math.hypot(dx, dy) <= length for pixel coordinates), and the angle wrap is
+(angle_to_point - current_angle + 180) % 360 - 180 with Python modulo
+semantics, which np.mod shares. Guards look along their angle snapped to
+the cone sprite step (main.snap_angle); snap_angles() does the same, and
+both round halves to even.
+
+Walls are not considered here: main.py uses these results to pick the
+guards that need Guard.check_collision's occlusion test.
+
+NumPy is optional; main.py falls back to the per-guard path without it.
+"""
+import numpy as np
+
+# Guard fields stored per guard. Shapes are (..., G) or (..., G, 2 / 4).
+FIELDS = ("centers", "angles", "fovs", "lengths", "active", "bodies")
+
+
+def snap_angles(angles, step):
+    """Round an angle array to multiples of step in place."""
+    np.multiply(np.round(angles / step), step, out=angles)
+    return angles
+
+
+def guard_arrays(guards, angle_step=None):
+    """Snapshot a list of Guard objects (or a GuardStore) into arrays (one episode).
+    angle_step: snap the angles like main.snap_angle."""
+    n = len(guards)
+    arrays = {
+        "centers": np.empty((n, 2), dtype=np.float64),
+        "angles": np.empty(n, dtype=np.float64),
+        "fovs": np.empty(n, dtype=np.float64),
+        "lengths": np.empty(n, dtype=np.float64),
+        "active": np.empty(n, dtype=bool),
+        "bodies": np.empty((n, 4), dtype=np.float64),
+    }
+    for i, g in enumerate(guards):
+        arrays["centers"][i] = g.rect.center
+        arrays["angles"][i] = g.current_angle
+        arrays["fovs"][i] = g.fov
+        arrays["lengths"][i] = g.vision_length
+        arrays["active"][i] = g.active
+        arrays["bodies"][i] = g.rect
+    if angle_step:
+        snap_angles(arrays["angles"], angle_step)
+    return arrays
+
+
+def stack_episodes(episodes):
+    """Stack per-episode guard arrays into (E, G, ...) arrays.
+
+    Episodes with fewer guards are padded with inactive guards, which never
+    detect anything.
+    """
+    width = max((len(e["angles"]) for e in episodes), default=0)
+    stacked = {}
+    for field in FIELDS:
+        parts = []
+        for e in episodes:
+            arr = e[field]
+            pad = [(0, width - len(arr))] + [(0, 0)] * (arr.ndim - 1)
+            parts.append(np.pad(arr, pad))
+        stacked[field] = np.stack(parts)
+    return stacked
+
+
+def detect(guards, targets):
+    """Which guards see which targets.
+
+    guards: dict of arrays as returned by guard_arrays() / stack_episodes().
+    targets: (..., T, 4) array of x, y, w, h rects with the same leading
+             dimensions as the guard arrays.
+    Returns a (..., G, T) bool array.
+    """
+    targets = np.asarray(targets, dtype=np.float64)
+    tx, ty, tw, th = np.moveaxis(targets, -1, 0)              # (..., T)
+    bx, by, bw, bh = np.moveaxis(guards["bodies"], -1, 0)     # (..., G)
+
+    # Body contact (Rect.colliderect)
+    body = ((bx[..., :, None] < (tx + tw)[..., None, :]) &
+            (by[..., :, None] < (ty + th)[..., None, :]) &
+            ((bx + bw)[..., :, None] > tx[..., None, :]) &
+            ((by + bh)[..., :, None] > ty[..., None, :]) &
+            (bw > 0)[..., :, None] & (bh > 0)[..., :, None] &
+            (tw > 0)[..., None, :] & (th > 0)[..., None, :])
+
+    # Corners in Rect order: topleft, topright, bottomleft, bottomright -> (..., T, 4)
+    px = np.stack([tx, tx + tw, tx, tx + tw], axis=-1)
+    py = np.stack([ty, ty, ty + th, ty + th], axis=-1)
+
+    cx = guards["centers"][..., 0][..., :, None, None]        # (..., G, 1, 1)
+    cy = guards["centers"][..., 1][..., :, None, None]
+    dx = px[..., None, :, :] - cx                             # (..., G, T, 4)
+    dy = py[..., None, :, :] - cy
+
+    length = guards["lengths"][..., :, None, None]
+    in_range = dx * dx + dy * dy <= length * length
+
+    angle_to_point = -np.degrees(np.arctan2(dy, dx))
+    diff = (angle_to_point - guards["angles"][..., :, None, None] + 180) % 360 - 180
+    in_fov = np.abs(diff) < guards["fovs"][..., :, None, None] / 2
+
+    seen = (in_range & in_fov).any(axis=-1)
+    return guards["active"][..., :, None] & (body | seen)
+
+
+class VisionBatch:
+    """Reusable arrays for one level's GuardStore, refreshed every tick.
+
+    FOV and vision length are fixed per guard, so only position, angle and
+    active state are copied in sync(), straight from the store's columns.
+    """
+    def __init__(self, guards, angle_step=None):
+        self.angle_step = angle_step
+        self.arrays = guard_arrays(guards, angle_step)
+        self.half = self.arrays["bodies"][:, 2] / 2 # body center offset
+
+    def sync(self, guards):
+        # Bulk list assignment; per-element numpy writes are far slower
+        bodies, centers = self.arrays["bodies"], self.arrays["centers"]
+        bodies[:, 0] = guards.x
+        bodies[:, 1] = guards.y
+        np.add(bodies[:, 0], self.half, out=centers[:, 0])
+        np.add(bodies[:, 1], self.half, out=centers[:, 1])
+        self.arrays["angles"][:] = guards.angle
+        if self.angle_step:
+            snap_angles(self.arrays["angles"], self.angle_step)
+        self.arrays["active"][:] = guards.active
+
+    def any_hit(self, guards, rect):
+        """True if any guard sees rect, ignoring walls (same answer as
+        any(g.check_collision(rect)) for guards without a SightMap)."""
+        self.sync(guards)
+        return bool(detect(self.arrays, [tuple(rect)]).any())
+
+    def hits(self, guards, rect):
+        """Indices of guards that see rect, ignoring walls. Walls only ever
+        hide a target, so these are the only guards worth an occlusion check."""
+        self.sync(guards)
+        return np.flatnonzero(detect(self.arrays, [tuple(rect)])[:, 0]).tolist()